@@ -0,0 +1,122 @@
+"""
+Mapeamento de arquivos alterados (git diff) para expressões de query do Bazel.
+
+Usado pelo modo "affected" de `Bazel.build`/`Bazel.test`: cada arquivo vira o
+label do source file no pacote dono, o pacote inteiro (BUILD alterado ou arquivo
+removido) ou uma consulta `rbuildfiles` (arquivos .bzl). Mudanças em arquivos
+globais (MODULE.bazel, WORKSPACE, .bazelrc...) invalidam o grafo inteiro.
+"""
+import posixpath
+import re
+from dataclasses import dataclass, field
+
+# Arquivos que alteram a resolução de dependências ou flags de todo o workspace.
+GLOBAL_FILES = {
+    "MODULE.bazel",
+    "MODULE.bazel.lock",
+    "WORKSPACE",
+    "WORKSPACE.bazel",
+    "WORKSPACE.bzlmod",
+    ".bazelrc",
+    ".bazelversion",
+}
+BUILD_FILES = {"BUILD", "BUILD.bazel"}
+
+# "<status>\t<path>" de cada arquivo alterado (commits + working tree) desde o merge-base com
+# $BASE_REF. Precisa do checkout sem o filtro de .gitignore/.bazelignore: num tree filtrado,
+# todo arquivo versionado dentro de um diretório ignorado apareceria como removido.
+CHANGED_FILES_CMD = (
+    'git -c safe.directory="*" diff --name-status --no-renames '
+    '"$(git -c safe.directory="*" merge-base "$BASE_REF" HEAD)"'
+)
+
+# `import`/`try-import` de outros rc do workspace (ex: try-import %workspace%/user.bazelrc)
+_RC_IMPORT = re.compile(r"^\s*(?:try-)?import\s+%workspace%/(\S+)", re.MULTILINE)
+
+
+def rc_imports(text: str) -> list[str]:
+    """Caminhos (relativos à raiz) importados por um arquivo .bazelrc."""
+    return [posixpath.normpath(path) for path in _RC_IMPORT.findall(text)]
+
+
+@dataclass
+class ChangeSet:
+    """Resultado da classificação dos arquivos alterados."""
+
+    full_rebuild: bool = False
+    reason: str = ""
+    labels: set[str] = field(default_factory=set)
+    packages: set[str] = field(default_factory=set)
+    bzl_files: set[str] = field(default_factory=set)
+
+    @property
+    def empty(self) -> bool:
+        return not (self.full_rebuild or self.labels or self.packages or self.bzl_files)
+
+
+def parse_name_status(output: str) -> tuple[list[str], set[str]]:
+    """Saída do CHANGED_FILES_CMD -> (arquivos alterados, arquivos removidos)."""
+    changed, deleted = [], set()
+    for line in output.splitlines():
+        status, _, path = line.partition("\t")
+        if not path:
+            continue
+        changed.append(path)
+        if status.startswith("D"):
+            deleted.add(path)
+    return changed, deleted
+
+
+def owning_package(path: str, packages: set[str]) -> str | None:
+    """Retorna o pacote mais próximo (diretório com BUILD) que contém `path`."""
+    directory = posixpath.dirname(path)
+    while True:
+        if directory in packages:
+            return directory
+        if not directory:
+            return None
+        directory = posixpath.dirname(directory)
+
+
+def classify_changes(changed: list[str], deleted: set[str], packages: set[str]) -> ChangeSet:
+    """
+    Classifica os arquivos alterados.
+
+    `packages` são os nomes de pacote retornados por `bazel query --output package`
+    ("" representa o pacote raiz) e `deleted` os arquivos removidos no diff.
+    """
+    changes = ChangeSet()
+    for path in changed:
+        name = posixpath.basename(path)
+        directory = posixpath.dirname(path)
+
+        if path in GLOBAL_FILES or (name.startswith("WORKSPACE") and not directory):
+            changes.full_rebuild = True
+            changes.reason = f"{path} alterado"
+            return changes
+
+        if name in BUILD_FILES:
+            if path in deleted:
+                # O pacote deixou de existir: os rdeps não podem mais ser calculados.
+                changes.full_rebuild = True
+                changes.reason = f"{path} removido"
+                return changes
+            changes.packages.add(directory)
+            continue
+
+        if name.endswith(".bzl"):
+            changes.bzl_files.add(path)
+
+        package = owning_package(path, packages)
+        if package is None:
+            continue
+        if path in deleted:
+            changes.packages.add(package)
+        else:
+            relative = posixpath.relpath(path, package) if package else path
+            changes.labels.add(f"//{package}:{relative}")
+    return changes
+
+
+def package_pattern(package: str) -> str:
+    return f"//{package}:all"
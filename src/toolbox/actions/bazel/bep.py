@@ -0,0 +1,318 @@
+"""
+Parser incremental do Build Event Protocol (BEP) do Bazel.
+
+Os eventos são consumidos um a um (uma linha JSON por vez) e apenas agregados
+por target são mantidos em memória, então o custo não depende do tamanho do
+arquivo `--build_event_json_file`.
+"""
+import base64
+import datetime
+import json
+from dataclasses import dataclass, field, asdict
+from typing import Iterable, Optional
+
+
+def _int(value) -> int:
+    """Campos int64 do BEP chegam como string no JSON (mapeamento proto3)."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _duration_ms(value) -> int:
+    """Converte um `google.protobuf.Duration` em JSON (ex: '1.250s') para milissegundos."""
+    if not value:
+        return 0
+    try:
+        return int(float(str(value).rstrip("s")) * 1000)
+    except ValueError:
+        return 0
+
+
+def _timestamp_ms(value) -> Optional[int]:
+    """Converte um `google.protobuf.Timestamp` em JSON (RFC 3339) para epoch em ms."""
+    if not value:
+        return None
+    try:
+        return int(datetime.datetime.fromisoformat(value).timestamp() * 1000)
+    except ValueError:
+        return None
+
+
+@dataclass(slots=True)
+class TargetStats:
+    label: str
+    status: str = "SKIPPED"  # SUCCESS | FAILED | SKIPPED
+    kind: str = ""
+    actions: int = 0
+    failed_actions: int = 0
+    test_status: Optional[str] = None
+    test_attempts: int = 0
+    test_duration_ms: int = 0
+    start_ms: Optional[int] = None
+    end_ms: Optional[int] = None
+
+    @property
+    def wall_time_ms(self) -> int:
+        """Tempo de parede: janela das actions do target, ou duração do teste."""
+        if self.start_ms is not None and self.end_ms is not None:
+            return max(self.end_ms - self.start_ms, self.test_duration_ms)
+        return self.test_duration_ms
+
+
+@dataclass
+class BepReport:
+    """Agregador de eventos BEP. Alimente com `feed_line`/`feed_event` e leia `to_dict()`."""
+
+    targets: dict[str, TargetStats] = field(default_factory=dict)
+    command: str = ""
+    exit_code: Optional[str] = None
+    start_ms: Optional[int] = None
+    finish_ms: Optional[int] = None
+    actions_created: int = 0
+    actions_executed: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    cache_miss_reasons: dict[str, int] = field(default_factory=dict)
+    runners: dict[str, int] = field(default_factory=dict)
+    mnemonics: dict[str, int] = field(default_factory=dict)
+    timing: dict[str, int] = field(default_factory=dict)
+    critical_path: list[str] = field(default_factory=list)
+    invalid_lines: int = 0
+
+    def target(self, label: str) -> TargetStats:
+        stats = self.targets.get(label)
+        if stats is None:
+            stats = self.targets[label] = TargetStats(label)
+        return stats
+
+    def feed_lines(self, lines: Iterable[str]) -> "BepReport":
+        for line in lines:
+            self.feed_line(line)
+        return self
+
+    def feed_line(self, line: str) -> None:
+        line = line.strip()
+        if not line:
+            return
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError:
+            self.invalid_lines += 1
+            return
+        if isinstance(event, dict):
+            self.feed_event(event)
+
+    def feed_event(self, event: dict) -> None:
+        event_id = event.get("id", {})
+
+        if "started" in event:
+            started = event["started"]
+            self.command = started.get("command", self.command)
+            self.start_ms = _int(started.get("startTimeMillis")) or _timestamp_ms(started.get("startTime"))
+
+        elif "targetConfigured" in event_id:
+            label = event_id["targetConfigured"]["label"]
+            self.target(label).kind = event.get("configured", {}).get("targetKind", "")
+
+        elif "targetCompleted" in event_id:
+            label = event_id["targetCompleted"]["label"]
+            success = event.get("completed", {}).get("success", False)
+            stats = self.target(label)
+            # Um target pode aparecer em mais de uma configuração; falha prevalece.
+            if stats.status != "FAILED":
+                stats.status = "SUCCESS" if success else "FAILED"
+
+        elif "actionCompleted" in event_id:
+            self._feed_action(event_id["actionCompleted"], event.get("action", {}))
+
+        elif "testResult" in event_id:
+            label = event_id["testResult"]["label"]
+            result = event.get("testResult", {})
+            stats = self.target(label)
+            stats.test_attempts += 1
+            stats.test_duration_ms += (
+                _int(result.get("testAttemptDurationMillis"))
+                or _duration_ms(result.get("testAttemptDuration"))
+            )
+
+        elif "testSummary" in event_id:
+            label = event_id["testSummary"]["label"]
+            summary = event.get("testSummary", {})
+            stats = self.target(label)
+            stats.test_status = summary.get("overallStatus", "NO_STATUS")
+            total = _int(summary.get("totalRunDurationMillis")) or _duration_ms(summary.get("totalRunDuration"))
+            if total:
+                stats.test_duration_ms = total
+
+        elif "buildMetrics" in event:
+            self._feed_metrics(event["buildMetrics"])
+
+        elif "buildToolLogs" in event:
+            for log in event["buildToolLogs"].get("log", []):
+                if log.get("name") == "critical path" and log.get("contents"):
+                    text = base64.b64decode(log["contents"]).decode("utf-8", "replace")
+                    self.critical_path = [l.rstrip() for l in text.splitlines() if l.strip()]
+
+        elif "buildFinished" in event:
+            finished = event["buildFinished"]
+            self.exit_code = finished.get("exitCode", {}).get("name", "SUCCESS")
+            self.finish_ms = _int(finished.get("finishTimeMillis")) or _timestamp_ms(finished.get("finishTime"))
+
+    def _feed_action(self, action_id: dict, action: dict) -> None:
+        # Só agregamos actions de targets já configurados (ignora externos/aspects).
+        stats = self.targets.get(action.get("label") or action_id.get("label", ""))
+        if stats is None:
+            return
+        stats.actions += 1
+        if not action.get("success", True):
+            stats.failed_actions += 1
+        start = _timestamp_ms(action.get("startTime"))
+        end = _timestamp_ms(action.get("endTime"))
+        if start is not None:
+            stats.start_ms = start if stats.start_ms is None else min(stats.start_ms, start)
+        if end is not None:
+            stats.end_ms = end if stats.end_ms is None else max(stats.end_ms, end)
+
+    def _feed_metrics(self, metrics: dict) -> None:
+        summary = metrics.get("actionSummary", {})
+        self.actions_created = _int(summary.get("actionsCreated"))
+        self.actions_executed = _int(summary.get("actionsExecuted"))
+
+        for data in summary.get("actionData", []):
+            self.mnemonics[data.get("mnemonic", "?")] = _int(data.get("actionsExecuted"))
+        for runner in summary.get("runnerCount", []):
+            self.runners[runner.get("name", "?")] = _int(runner.get("count"))
+
+        cache = summary.get("actionCacheStatistics", {})
+        self.cache_hits = _int(cache.get("hits"))
+        self.cache_misses = _int(cache.get("misses"))
+        for miss in cache.get("missDetails", []):
+            self.cache_miss_reasons[miss.get("reason", "UNKNOWN")] = _int(miss.get("count"))
+
+        for key, value in metrics.get("timingMetrics", {}).items():
+            self.timing[key] = _int(value)
+
+    # --- Saídas ---
+
+    @property
+    def cache_hit_ratio(self) -> Optional[float]:
+        total = self.cache_hits + self.cache_misses
+        return self.cache_hits / total if total else None
+
+    @property
+    def remote_cache_hits(self) -> int:
+        return self.runners.get("remote cache hit", 0)
+
+    @property
+    def remote_cache_hit_ratio(self) -> Optional[float]:
+        """Hits do remote cache sobre as actions cacheáveis (exclui actions 'internal')."""
+        total = self.runners.get("total") or sum(
+            count for name, count in self.runners.items() if name != "total"
+        )
+        cacheable = total - self.runners.get("internal", 0)
+        return self.remote_cache_hits / cacheable if cacheable > 0 else None
+
+    def cache_summary(self) -> str:
+        """Resumo de uma linha do uso de cache, para anexar ao stdout do Bazel."""
+        ratio = self.remote_cache_hit_ratio
+        ratio_str = f"{ratio:.1%}" if ratio is not None else "n/a"
+        action_ratio = self.cache_hit_ratio
+        action_str = f"{action_ratio:.1%}" if action_ratio is not None else "n/a"
+        return (
+            f"Remote cache: {self.remote_cache_hits} hits ({ratio_str}) | "
+            f"Action cache: {self.cache_hits} hits / {self.cache_misses} misses ({action_str})"
+        )
+
+    @property
+    def wall_time_ms(self) -> Optional[int]:
+        if self.start_ms and self.finish_ms:
+            return self.finish_ms - self.start_ms
+        return self.timing.get("wallTimeInMs")
+
+    def to_dict(self, order: Optional[list[str]] = None) -> dict:
+        """Representação JSON do relatório. `order` define a ordem (ex: saída do query)."""
+        return {
+            "command": self.command,
+            "exit_code": self.exit_code,
+            "wall_time_ms": self.wall_time_ms,
+            "actions": {
+                "created": self.actions_created,
+                "executed": self.actions_executed,
+                "by_mnemonic": self.mnemonics,
+                "by_runner": self.runners,
+            },
+            "action_cache": {
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+                "hit_ratio": self.cache_hit_ratio,
+                "miss_reasons": self.cache_miss_reasons,
+            },
+            "remote_cache": {
+                "hits": self.remote_cache_hits,
+                "hit_ratio": self.remote_cache_hit_ratio,
+            },
+            "timing": self.timing,
+            "critical_path": self.critical_path,
+            "targets": [
+                dict(asdict(self.target(label)), wall_time_ms=self.target(label).wall_time_ms)
+                for label in self._ordered_labels(order)
+            ],
+        }
+
+    def to_markdown(self, order: Optional[list[str]] = None) -> str:
+        md_lines = []
+        md_lines.append("## Bazel Build Report")
+        md_lines.append(f"**Date:** {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        if self.exit_code:
+            md_lines.append(f"**Result:** {self.exit_code}")
+        if self.wall_time_ms:
+            md_lines.append(f"**Wall time:** {self.wall_time_ms / 1000:.1f}s")
+        md_lines.append("")
+        md_lines.append("| Target | Status | Wall time | Actions | Test | Details |")
+        md_lines.append("| :--- | :--- | ---: | ---: | :--- | :--- |")
+
+        for label in self._ordered_labels(order):
+            stats = self.target(label)
+            if stats.status == "SUCCESS":
+                status, detail = "✅ SUCCESS", "Build successful"
+            elif stats.status == "FAILED":
+                status, detail = "❌ FAILED", "Compilation or Test failed"
+            else:
+                status, detail = "⚪ SKIPPED", "Dependency failed or not attempted"
+            if stats.test_status == "FLAKY":
+                detail = f"Flaky test ({stats.test_attempts} attempts)"
+            wall = f"{stats.wall_time_ms / 1000:.2f}s" if stats.wall_time_ms else "-"
+            test = stats.test_status or "-"
+            md_lines.append(f"| {label} | {status} | {wall} | {stats.actions} | {test} | {detail} |")
+
+        md_lines.append("")
+        md_lines.append("### Actions & Cache")
+        md_lines.append(f"- **Actions created / executed:** {self.actions_created} / {self.actions_executed}")
+        ratio = self.cache_hit_ratio
+        ratio_str = f"{ratio:.1%}" if ratio is not None else "n/a"
+        md_lines.append(f"- **Action cache:** {self.cache_hits} hits / {self.cache_misses} misses ({ratio_str})")
+        remote_ratio = self.remote_cache_hit_ratio
+        remote_str = f"{remote_ratio:.1%}" if remote_ratio is not None else "n/a"
+        md_lines.append(f"- **Remote cache:** {self.remote_cache_hits} hits ({remote_str})")
+        for name, count in sorted(self.runners.items(), key=lambda kv: -kv[1]):
+            md_lines.append(f"- **Runner `{name}`:** {count}")
+        for key in ("analysisPhaseTimeInMs", "executionPhaseTimeInMs", "cpuTimeInMs"):
+            if key in self.timing:
+                md_lines.append(f"- **{key}:** {self.timing[key]}")
+
+        if self.critical_path:
+            md_lines.append("")
+            md_lines.append("### Critical Path")
+            md_lines.append("```")
+            md_lines.extend(self.critical_path)
+            md_lines.append("```")
+
+        return "\n".join(md_lines)
+
+    def _ordered_labels(self, order: Optional[list[str]]) -> list[str]:
+        labels = list(order or [])
+        seen = set(labels)
+        labels.extend(label for label in self.targets if label not in seen)
+        return labels
@@ -0,0 +1,323 @@
+"""
+Índice compacto do grafo de dependências do Bazel.
+
+Ingere a saída de `bazel query --output=graph|label|proto|streamed_jsonproto`
+num índice com labels internados (cada label vira um inteiro) e adjacências em
+formato CSR (`array` de offsets + `array` de vizinhos), nos dois sentidos.
+Consultas de deps/rdeps/caminhos rodam em memória, sem chamar o Bazel de novo.
+"""
+import json
+import re
+from array import array
+from collections import deque
+from typing import Iterable, Iterator, Optional
+
+# Linha de aresta/nó do formato dot gerado por `--output=graph`
+_DOT_EDGE = re.compile(r'^\s*"(?P<src>[^"]+)"\s*->\s*"(?P<dst>[^"]+)"')
+_DOT_NODE = re.compile(r'^\s*"(?P<node>[^"]+)"\s*(\[.*\])?\s*;?\s*$')
+# Nome canônico de repositório no bzlmod: @@rules_jvm_external~~maven~maven// ou @@rules_foo++ext+foo//
+_CANONICAL_REPO = re.compile(r"^@@?([^/]*)//")
+
+
+def normalize_label(label: str) -> str:
+    """
+    Converte labels canônicos do bzlmod para o nome aparente do repositório
+    (`@@rules_jvm_external~~maven~maven//:x` -> `@maven//:x`, `@@//:x` -> `//:x`),
+    permitindo comparar grafos bzlmod com grafos do WORKSPACE.
+    """
+    match = _CANONICAL_REPO.match(label)
+    if not match:
+        return label
+    repo = re.split(r"[~+]", match.group(1))[-1]
+    rest = label[match.end():]
+    return f"//{rest}" if not repo else f"@{repo}//{rest}"
+
+
+class GraphIndex:
+    """Grafo imutável com labels internados e adjacência CSR (forward e reverse)."""
+
+    def __init__(self, labels: list[str], edges_src: array, edges_dst: array):
+        self.labels = labels
+        self.ids = {label: i for i, label in enumerate(labels)}
+        self.edge_count = len(edges_src)
+        self.fwd_offsets, self.fwd = self._csr(len(labels), edges_src, edges_dst)
+        self.rev_offsets, self.rev = self._csr(len(labels), edges_dst, edges_src)
+
+    @staticmethod
+    def _csr(size: int, src: array, dst: array) -> tuple[array, array]:
+        """Counting sort das arestas por origem: vizinhos de `n` em `adj[off[n]:off[n+1]]`."""
+        offsets = array("I", bytes(4 * (size + 1)))
+        for s in src:
+            offsets[s + 1] += 1
+        for i in range(size):
+            offsets[i + 1] += offsets[i]
+        adjacency = array("I", bytes(4 * len(src)))
+        cursor = array("I", offsets[:-1])
+        for s, d in zip(src, dst):
+            adjacency[cursor[s]] = d
+            cursor[s] += 1
+        return offsets, adjacency
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def id_of(self, label: str) -> int:
+        try:
+            return self.ids[label]
+        except KeyError:
+            raise Exception(f"Label não encontrado no grafo: {label}")
+
+    def neighbors(self, node: int, reverse: bool = False) -> array:
+        offsets, adjacency = (self.rev_offsets, self.rev) if reverse else (self.fwd_offsets, self.fwd)
+        return adjacency[offsets[node]:offsets[node + 1]]
+
+    def closure(self, label: str, reverse: bool = False, depth: Optional[int] = None) -> list[str]:
+        """deps(label, depth) ou rdeps(label, depth), incluindo o próprio label."""
+        start = self.id_of(label)
+        seen = bytearray(len(self.labels))
+        seen[start] = 1
+        frontier, result, level = [start], [start], 0
+        while frontier and (depth is None or level < depth):
+            next_frontier = []
+            for node in frontier:
+                for n in self.neighbors(node, reverse):
+                    if not seen[n]:
+                        seen[n] = 1
+                        next_frontier.append(n)
+            result.extend(next_frontier)
+            frontier, level = next_frontier, level + 1
+        return [self.labels[n] for n in result]
+
+    def shortest_path(self, source: str, target: str) -> Optional[list[str]]:
+        """Menor caminho de dependência source -> target (BFS), ou None."""
+        start, goal = self.id_of(source), self.id_of(target)
+        parent = array("i", [-1]) * len(self.labels)
+        parent[start] = start
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            if node == goal:
+                return self._unwind(parent, start, goal)
+            for n in self.neighbors(node):
+                if parent[n] == -1:
+                    parent[n] = node
+                    queue.append(n)
+        return None
+
+    def some_path(self, source: str, target: str) -> Optional[list[str]]:
+        """Um caminho qualquer source -> target (DFS, como `somepath` do bazel query)."""
+        start, goal = self.id_of(source), self.id_of(target)
+        parent = array("i", [-1]) * len(self.labels)
+        parent[start] = start
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            if node == goal:
+                return self._unwind(parent, start, goal)
+            for n in self.neighbors(node):
+                if parent[n] == -1:
+                    parent[n] = node
+                    stack.append(n)
+        return None
+
+    def _unwind(self, parent: array, start: int, goal: int) -> list[str]:
+        path = [goal]
+        while path[-1] != start:
+            path.append(parent[path[-1]])
+        return [self.labels[n] for n in reversed(path)]
+
+    def edges(self) -> Iterator[tuple[str, str]]:
+        for node in range(len(self.labels)):
+            for n in self.neighbors(node):
+                yield self.labels[node], self.labels[n]
+
+
+class GraphBuilder:
+    """Acumula nós e arestas internando labels; `build()` gera o `GraphIndex`."""
+
+    def __init__(self, normalize: bool = False):
+        self.normalize = normalize
+        self.labels: list[str] = []
+        self.ids: dict[str, int] = {}
+        self.src = array("I")
+        self.dst = array("I")
+
+    def node(self, label: str) -> int:
+        if self.normalize:
+            label = normalize_label(label)
+        node = self.ids.get(label)
+        if node is None:
+            node = self.ids[label] = len(self.labels)
+            self.labels.append(label)
+        return node
+
+    def edge(self, src: str, dst: str) -> None:
+        s, d = self.node(src), self.node(dst)
+        if s != d:
+            self.src.append(s)
+            self.dst.append(d)
+
+    def build(self) -> GraphIndex:
+        # Arestas duplicadas (ex: labels normalizados que colidem) são removidas
+        unique = sorted({(s << 32) | d for s, d in zip(self.src, self.dst)})
+        return GraphIndex(
+            self.labels,
+            array("I", (e >> 32 for e in unique)),
+            array("I", (e & 0xFFFFFFFF for e in unique)),
+        )
+
+    # --- Formatos de entrada ---
+
+    def feed_lines(self, lines: Iterable[str], fmt: str) -> "GraphBuilder":
+        for line in lines:
+            self.feed_line(line, fmt)
+        return self
+
+    def feed_line(self, line: str, fmt: str) -> None:
+        """Ingere uma linha de `--output=graph`, `label`/`label_kind` ou `streamed_jsonproto`."""
+        if fmt == "graph":
+            # Nós fatorados ("a\\nb" no dot) são expandidos
+            edge = _DOT_EDGE.match(line)
+            if edge:
+                for src in edge.group("src").split("\\n"):
+                    for dst in edge.group("dst").split("\\n"):
+                        self.edge(src, dst)
+                return
+            node = _DOT_NODE.match(line)
+            if node:
+                for label in node.group("node").split("\\n"):
+                    self.node(label)
+        elif fmt == "label":
+            line = line.strip()
+            if line:
+                self.node(line.rsplit(" ", 1)[-1])
+        elif fmt == "streamed_jsonproto":
+            line = line.strip()
+            if line:
+                self._feed_target_dict(json.loads(line))
+        else:
+            raise Exception(f"Formato de grafo não suportado: {fmt}")
+
+    def _feed_target_dict(self, target: dict) -> None:
+        if "rule" in target:
+            rule = target["rule"]
+            self.node(rule["name"])
+            for dep in rule.get("ruleInput", []):
+                self.edge(rule["name"], dep)
+        elif "generatedFile" in target:
+            generated = target["generatedFile"]
+            self.edge(generated["name"], generated["generatingRule"])
+        else:
+            for key in ("sourceFile", "packageGroup", "environmentGroup"):
+                if key in target:
+                    self.node(target[key]["name"])
+
+    def feed_proto(self, data: bytes) -> "GraphBuilder":
+        """`--output=proto`: `blaze_query.QueryResult` binário (decodificação mínima do wire format)."""
+        for field, value in _proto_fields(data):
+            if field == 1:  # QueryResult.target
+                self._feed_target_proto(value)
+        return self
+
+    def _feed_target_proto(self, data: bytes) -> None:
+        for field, value in _proto_fields(data):
+            if field == 2:  # Target.rule
+                name, inputs = "", []
+                for f, v in _proto_fields(value):
+                    if f == 1:
+                        name = v.decode()
+                    elif f == 5:  # Rule.rule_input
+                        inputs.append(v.decode())
+                self.node(name)
+                for dep in inputs:
+                    self.edge(name, dep)
+            elif field == 4:  # Target.generated_file
+                fields = {f: v.decode() for f, v in _proto_fields(value) if f in (1, 2)}
+                self.edge(fields[1], fields[2])
+            elif field in (3, 5, 6):  # source_file, package_group, environment_group
+                for f, v in _proto_fields(value):
+                    if f == 1:
+                        self.node(v.decode())
+
+
+def _varint(data: bytes, pos: int) -> tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _proto_fields(data: bytes) -> Iterator[tuple[int, bytes]]:
+    """Itera os campos length-delimited de uma mensagem protobuf; os demais são pulados."""
+    pos, end = 0, len(data)
+    while pos < end:
+        key, pos = _varint(data, pos)
+        field, wire = key >> 3, key & 0x7
+        if wire == 0:
+            _, pos = _varint(data, pos)
+        elif wire == 1:
+            pos += 8
+        elif wire == 2:
+            length, pos = _varint(data, pos)
+            yield field, data[pos:pos + length]
+            pos += length
+        elif wire == 5:
+            pos += 4
+        else:
+            raise Exception(f"Wire type protobuf não suportado: {wire}")
+
+
+def detect_format(head: str) -> str:
+    """Detecta o formato a partir do início do arquivo."""
+    stripped = head.lstrip()
+    if stripped.startswith("digraph"):
+        return "graph"
+    if stripped.startswith("{"):
+        return "streamed_jsonproto"
+    if stripped.startswith(("//", "@")):
+        return "label"
+    return "proto"
+
+
+def diff_graphs(left: GraphIndex, right: GraphIndex) -> dict:
+    """
+    Diferença estrutural entre dois grafos. As arestas são comparadas como
+    inteiros (id_esquerda << 32 | id_direita) no espaço de ids do grafo da esquerda.
+    """
+    only_left_nodes = [l for l in left.labels if l not in right.ids]
+    only_right_nodes = [l for l in right.labels if l not in left.ids]
+
+    # Traduz ids da direita para a esquerda; nós só da direita ganham ids novos
+    translate = array("I", bytes(4 * len(right)))
+    extra: list[str] = []
+    for i, label in enumerate(right.labels):
+        node = left.ids.get(label)
+        if node is None:
+            node = len(left) + len(extra)
+            extra.append(label)
+        translate[i] = node
+
+    def key(s: int, d: int) -> int:
+        return (s << 32) | d
+
+    left_edges = {key(s, d) for s in range(len(left)) for d in left.neighbors(s)}
+    right_edges = {key(translate[s], translate[d]) for s in range(len(right)) for d in right.neighbors(s)}
+
+    def label(node: int) -> str:
+        return left.labels[node] if node < len(left) else extra[node - len(left)]
+
+    def unpack(edges: set[int]) -> list[tuple[str, str]]:
+        return sorted((label(e >> 32), label(e & 0xFFFFFFFF)) for e in edges)
+
+    return {
+        "left": {"nodes": len(left), "edges": left.edge_count},
+        "right": {"nodes": len(right), "edges": right.edge_count},
+        "only_left_nodes": sorted(only_left_nodes),
+        "only_right_nodes": sorted(only_right_nodes),
+        "only_left_edges": unpack(left_edges - right_edges),
+        "only_right_edges": unpack(right_edges - left_edges),
+    }
@@ -0,0 +1,227 @@
+"""
+Agregação dos JUnit XML gerados pelo Bazel (`bazel-testlogs`) e histórico de testes.
+
+Os arquivos chegam num único tar e são lidos com `iterparse`, descartando cada
+`<testsuite>` depois de processado: a memória depende do número de casos de
+teste, não do tamanho dos XMLs. Os `<testsuite>` do junit.xml consolidado vão
+direto para um arquivo temporário. Tentativas falhas (`test_attempts/attempt_N.xml`,
+geradas com `--flaky_test_attempts`) marcam casos que passaram no retry como flaky.
+"""
+import heapq
+import posixpath
+import shutil
+import tarfile
+import tempfile
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass
+from typing import IO, Optional
+
+
+@dataclass(slots=True)
+class CaseResult:
+    target: str
+    name: str
+    status: str = "passed"  # passed | failed | error | skipped
+    duration_ms: int = 0
+    failed_attempts: int = 0
+
+    @property
+    def flaky(self) -> bool:
+        return self.status == "passed" and self.failed_attempts > 0
+
+
+def target_from_path(path: str) -> tuple[str, bool]:
+    """
+    Converte um caminho relativo a `bazel-testlogs` no label do teste.
+    Retorna (label, is_attempt). Ex: 'pkg/sub/my_test/shard_1_of_2/test.xml' -> '//pkg/sub:my_test'.
+    """
+    parts = [p for p in posixpath.normpath(path).split("/") if p not in ("", ".")]
+    is_attempt = "test_attempts" in parts
+    if is_attempt:
+        parts = parts[: parts.index("test_attempts")]
+    else:
+        parts = parts[:-1]  # remove 'test.xml'
+    if parts and parts[-1].startswith("shard_") and "_of_" in parts[-1]:
+        parts = parts[:-1]
+    if not parts:
+        return "//:unknown", is_attempt
+    return f"//{'/'.join(parts[:-1])}:{parts[-1]}", is_attempt
+
+
+def _case_status(case: ET.Element) -> str:
+    for child in case:
+        if child.tag in ("failure", "error", "skipped"):
+            return "failed" if child.tag == "failure" else child.tag
+    if case.get("result") == "skipped" or case.get("status") == "notrun":
+        return "skipped"
+    return "passed"
+
+
+class JUnitAggregator:
+    """Consolida casos de teste de vários XMLs e gera um único JUnit."""
+
+    def __init__(self):
+        self.cases: dict[str, CaseResult] = {}
+        self._suites = tempfile.TemporaryFile("w+", encoding="utf-8")  # <testsuite> serializados
+        self.files = 0
+        self.invalid_files: list[str] = []
+
+    def feed_tar(self, path: str) -> "JUnitAggregator":
+        """Lê um tar (sequencialmente) com os XMLs de `bazel-testlogs`."""
+        with tarfile.open(path, "r|*") as tar:
+            for member in tar:
+                if member.isfile() and member.name.endswith(".xml"):
+                    self.feed_file(member.name, tar.extractfile(member))
+        return self
+
+    def feed_file(self, path: str, fileobj: Optional[IO[bytes]]) -> None:
+        if fileobj is None:
+            return
+        target, is_attempt = target_from_path(path)
+        self.files += 1
+        try:
+            for _, element in ET.iterparse(fileobj, events=("end",)):
+                if element.tag != "testsuite":
+                    continue
+                for case in element.iter("testcase"):
+                    self._feed_case(target, case, is_attempt)
+                if not is_attempt:
+                    element.set("package", target)
+                    self._suites.write(ET.tostring(element, encoding="unicode") + "\n")
+                element.clear()
+        except ET.ParseError:
+            self.invalid_files.append(path)
+
+    def _feed_case(self, target: str, case: ET.Element, is_attempt: bool) -> None:
+        name = f"{case.get('classname', '')}.{case.get('name', '')}".strip(".")
+        key = f"{target}::{name}"
+        result = self.cases.get(key)
+        if result is None:
+            result = self.cases[key] = CaseResult(target, name)
+        status = _case_status(case)
+        if is_attempt:
+            if status in ("failed", "error"):
+                result.failed_attempts += 1
+            return
+        result.status = status
+        try:
+            result.duration_ms = int(float(case.get("time") or 0) * 1000)
+        except ValueError:
+            result.duration_ms = 0
+
+    # --- Saídas ---
+
+    def counts(self) -> dict[str, int]:
+        totals = {"passed": 0, "failed": 0, "error": 0, "skipped": 0, "flaky": 0}
+        for case in self.cases.values():
+            totals[case.status] += 1
+            if case.flaky:
+                totals["flaky"] += 1
+        return totals
+
+    def flaky(self) -> list[CaseResult]:
+        return sorted((c for c in self.cases.values() if c.flaky), key=lambda c: (c.target, c.name))
+
+    def failed(self) -> list[CaseResult]:
+        return sorted((c for c in self.cases.values() if c.status in ("failed", "error")), key=lambda c: (c.target, c.name))
+
+    def slowest(self, n: int) -> list[CaseResult]:
+        return heapq.nlargest(n, self.cases.values(), key=lambda c: c.duration_ms)
+
+    def write_junit_xml(self, out: IO[str]) -> None:
+        """Escreve o junit.xml consolidado copiando os `<testsuite>` do arquivo temporário."""
+        totals = self.counts()
+        out.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<testsuites tests="{len(self.cases)}" failures="{totals["failed"]}" '
+            f'errors="{totals["error"]}" skipped="{totals["skipped"]}">\n'
+        )
+        self._suites.seek(0)
+        shutil.copyfileobj(self._suites, out)
+        out.write("</testsuites>\n")
+
+    def close(self) -> None:
+        self._suites.close()
+
+    def to_dict(self, top_n: int = 20, unstable: Optional[list[tuple[str, float]]] = None) -> dict:
+        def case(c: CaseResult) -> dict:
+            return {"target": c.target, "name": c.name, "status": c.status,
+                    "duration_ms": c.duration_ms, "failed_attempts": c.failed_attempts}
+
+        return {
+            "files": self.files,
+            "invalid_files": self.invalid_files,
+            "totals": self.counts(),
+            "failed": [case(c) for c in self.failed()],
+            "flaky": [case(c) for c in self.flaky()],
+            "slowest": [case(c) for c in self.slowest(top_n)],
+            "unstable_history": [{"test": t, "failure_rate": round(r, 2)} for t, r in (unstable or [])[:top_n]],
+        }
+
+    def to_markdown(self, top_n: int = 20, unstable: Optional[list[tuple[str, float]]] = None) -> str:
+        totals = self.counts()
+        passed = totals["failed"] == 0 and totals["error"] == 0
+        md_lines = [
+            "## Bazel Test Report",
+            f"**Result:** {'✅ PASSED' if passed else '❌ FAILED'}",
+            f"**Tests:** {len(self.cases)} | ✅ {totals['passed']} | ❌ {totals['failed'] + totals['error']} "
+            f"| ⏭️ {totals['skipped']} | ⚠️ flaky {totals['flaky']}",
+        ]
+        if self.invalid_files:
+            md_lines += ["", f"Aviso: {len(self.invalid_files)} XML(s) inválido(s) ignorado(s)."]
+
+        for title, cases in (("Failed", self.failed()), ("Flaky (passed on retry)", self.flaky())):
+            if cases:
+                md_lines += ["", f"### {title}", "", "| Target | Test | Failed attempts |", "| :--- | :--- | ---: |"]
+                md_lines += [f"| {c.target} | {c.name} | {c.failed_attempts} |" for c in cases]
+
+        md_lines += ["", f"### Top {top_n} Slowest Tests", "", "| Time | Target | Test |", "| ---: | :--- | :--- |"]
+        md_lines += [f"| {c.duration_ms / 1000:.2f}s | {c.target} | {c.name} |" for c in self.slowest(top_n)]
+
+        if unstable:
+            md_lines += ["", "### Unstable in Recent History", "", "| Failure rate | Test |", "| ---: | :--- |"]
+            md_lines += [f"| {rate:.0%} | {test} |" for test, rate in unstable[:top_n]]
+        return "\n".join(md_lines)
+
+
+class TestHistory:
+    """
+    Histórico das últimas `max_runs` execuções por caso de teste e por target.
+    Formato persistido: {"tests": {id: [[status, ms], ...]}, "targets": {label: [ms, ...]}}.
+    """
+
+    def __init__(self, data: Optional[dict] = None, max_runs: int = 20):
+        data = data or {}
+        self.tests: dict[str, list] = data.get("tests", {})
+        self.targets: dict[str, list] = data.get("targets", {})
+        self.max_runs = max_runs
+
+    def record_cases(self, cases: dict[str, CaseResult]) -> None:
+        for key, case in cases.items():
+            status = "flaky" if case.flaky else case.status
+            runs = self.tests.setdefault(key, [])
+            runs.append([status, case.duration_ms])
+            del runs[: -self.max_runs]
+
+    def record_target(self, label: str, duration_ms: int) -> None:
+        runs = self.targets.setdefault(label, [])
+        runs.append(duration_ms)
+        del runs[: -self.max_runs]
+
+    def target_durations(self) -> dict[str, int]:
+        """Mediana das durações recentes por target (entrada do balanceamento de shards)."""
+        return {label: sorted(runs)[len(runs) // 2] for label, runs in self.targets.items() if runs}
+
+    def unstable(self, min_runs: int = 3) -> list[tuple[str, float]]:
+        """Casos que alternaram entre sucesso e falha na janela: (id, taxa de falha)."""
+        result = []
+        for key, runs in self.tests.items():
+            if len(runs) < min_runs:
+                continue
+            bad = sum(1 for status, _ in runs if status in ("failed", "error", "flaky"))
+            if 0 < bad < len(runs):
+                result.append((key, bad / len(runs)))
+        return sorted(result, key=lambda item: -item[1])
+
+    def to_dict(self) -> dict:
+        return {"tests": self.tests, "targets": self.targets}
@@ -1,6 +1,68 @@
 import dagger
-from dagger import object_type, function, Directory, Container, dag, File, Doc, Secret
+from dagger import object_type, function, Directory, Container, dag, File, Doc, Ignore, Secret, ReturnType, Service, CacheSharingMode
 from typing import Annotated, Optional
+import asyncio
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+
+from ...common.sources import BAZEL_GIT_IGNORE, BAZEL_IGNORE, prepare_source
+from ...common.streaming import iter_lines
+from .affected import BUILD_FILES, CHANGED_FILES_CMD, GLOBAL_FILES, classify_changes, package_pattern, parse_name_status, rc_imports
+from .bep import BepReport
+from .graph import GraphBuilder, GraphIndex, detect_format, diff_graphs
+from .junit import JUnitAggregator, TestHistory
+from .profile import ProfileReport
+from .sharding import balance_shards, estimated_ms
+
+AFFECTED_TARGETS_FILE = "/tmp/affected_targets.txt"
+REMOTE_CACHE_HOST = "bazel-remote"
+WARM_SERVER_PORT = 8080
+TEST_HISTORY_DIR = "/history"
+QUERY_CACHE_DIR = "/query-cache"
+QUERY_CACHE_MAX_ENTRIES = 200
+VENDOR_CACHE_DIR = "/home/developer/.cache/bazel-vendor"
+VENDOR_MOUNT = "/opt/bazel-vendor"
+REPOSITORY_CACHE_DIR = "/home/developer/.cache/bazel-repo"
+DISK_CACHE_DIR = "/home/developer/.cache/bazel-disk"
+
+# ~/.bazelrc do container: aponta para os caches compartilhados (fora do output base)
+CACHE_BAZELRC = f"""common --repository_cache={REPOSITORY_CACHE_DIR}
+build --disk_cache={DISK_CACHE_DIR}
+"""
+BAZELISK_VERSION = "v1.20.0"
+# sha256 dos binários da release BAZELISK_VERSION por arquitetura do engine. Arquiteturas sem
+# entrada exigem --bazelisk-checksum (ou um dos opt-ins de base)
+BAZELISK_SHA256 = {
+    "amd64": "d9af1fa808c0529753c3befda75123236a711d971d3485a390507122148773a3",
+}
+BAZELISK_MODULE = "github.com/bazelbuild/bazelisk"
+GO_IMAGE = "golang:1.22"
+APT_PACKAGES = ["ca-certificates", "curl", "git", "build-essential", "python3", "python3-pip", "openssh-client", "jq"]
+# Copia test.xml e as tentativas falhas (--flaky_test_attempts) de bazel-testlogs para /tmp/junit
+TESTLOGS_COLLECT_CMD = (
+    "mkdir -p /tmp/junit; "
+    "(cd bazel-testlogs 2>/dev/null && find -L . \\( -name test.xml -o -path '*/test_attempts/*.xml' \\) "
+    "-exec cp --parents {} /tmp/junit \\;)"
+)
+RELEASE_VERSION = re.compile(r"^\d+\.\d+\.\d+$")
+
+# Resolve a versão (USE_BAZEL_VERSION ou .bazelversion) e usa o binário pré-carregado
+# quando existir; caso contrário delega ao bazelisk, a menos que o modo offline esteja ativo.
+BAZEL_WRAPPER = """#!/bin/sh
+V="${USE_BAZEL_VERSION:-}"
+if [ -z "$V" ] && [ -f .bazelversion ]; then V=$(tr -d '[:space:]' < .bazelversion); fi
+if [ -n "$V" ] && [ -x "/opt/bazel/$V/bazel" ]; then exec "/opt/bazel/$V/bazel" "$@"; fi
+if [ "${BAZEL_OFFLINE:-0}" = "1" ]; then
+    echo "bazel: versão '${V:-latest}' não pré-carregada e BAZEL_OFFLINE=1; abortando sem acessar a rede" >&2
+    exit 2
+fi
+exec /usr/local/bin/bazelisk "$@"
+"""
 
 @object_type
 class Bazel:
@@ -10,64 +72,206 @@ class Bazel:
     """
 
     @function
-    def base(self) -> Container:
+    async def base(
+        self,
+        bazelisk_version: Annotated[str, Doc("Versão do bazelisk")] = BAZELISK_VERSION,
+        bazelisk_checksum: Annotated[Optional[str], Doc("Checksum fixo do binário do bazelisk para a arquitetura do engine (sha256:<hex>)")] = None,
+        allow_unpinned_bazelisk: Annotated[bool, Doc("Baixa o binário do bazelisk sem verificação quando não há checksum fixo")] = False,
+        build_bazelisk_from_source: Annotated[bool, Doc("Compila o bazelisk do módulo Go (verificado pelo sum.golang.org) em vez de baixar a release")] = False,
+        bazel_versions: Annotated[list[str], Doc("Versões do Bazel pré-carregadas na imagem (ex: 7.1.1)")] = [],
+        offline: Annotated[bool, Doc("Falha imediatamente se a versão pedida não estiver pré-carregada")] = False
+    ) -> Container:
         """
         Retorna container base com usuário 'developer'.
+        Cada camada é instalada uma única vez; pacotes apt vêm de cache volumes e os
+        binários (bazelisk e Bazel) são arquivos dag.http endereçados por conteúdo.
+        O bazelisk da release é fixado por checksum (--bazelisk-checksum ou BAZELISK_SHA256);
+        sem checksum a chamada falha, salvo com --allow-unpinned-bazelisk ou
+        --build-bazelisk-from-source.
         """
-        bazelisk_version = "v1.20.0"
-        
-        install_script = f"""
-        ARCH=$(uname -m)
-        case $ARCH in
-            x86_64)  BAZEL_ARCH="amd64" ;;
-            aarch64) BAZEL_ARCH="arm64" ;;
-            *)       echo "Arquitetura não suportada: $ARCH"; exit 1 ;;
-        esac
-        
-        curl -L "https://github.com/bazelbuild/bazelisk/releases/download/{bazelisk_version}/bazelisk-linux-$BAZEL_ARCH" \
-             -o /usr/local/bin/bazel
-        chmod +x /usr/local/bin/bazel
-        apt-get update && apt-get install -y curl git build-essential python3 python3-pip openssh-client jq
-        """
+        platform = await dag.default_platform()
+        arch = str(platform).split("/")[1]
+        if arch not in ("amd64", "arm64"):
+            raise Exception(f"Arquitetura não suportada: {arch}")
+        bazel_arch = "x86_64" if arch == "amd64" else "arm64"
 
-        return (
+        release_url = f"https://github.com/bazelbuild/bazelisk/releases/download/{bazelisk_version}/bazelisk-linux-{arch}"
+        checksum = bazelisk_checksum
+        if not checksum and bazelisk_version == BAZELISK_VERSION and arch in BAZELISK_SHA256:
+            checksum = f"sha256:{BAZELISK_SHA256[arch]}"
+        if build_bazelisk_from_source:
+            bazelisk = self._verified_bazelisk(bazelisk_version)
+        elif checksum:
+            bazelisk = dag.http(release_url, checksum=checksum)
+        elif allow_unpinned_bazelisk:
+            bazelisk = dag.http(release_url)
+        else:
+            raise Exception(
+                f"Sem checksum fixo para o bazelisk {bazelisk_version} ({arch}): passe --bazelisk-checksum, "
+                "--build-bazelisk-from-source ou --allow-unpinned-bazelisk"
+            )
+
+        ctr = (
             dag.container()
             .from_("ubuntu:22.04")
-            .with_exec(["apt-get", "update"])
+            # apt em uma única camada; listas e .debs ficam em cache volumes entre execuções
+            .with_mounted_cache("/var/cache/apt", dag.cache_volume("bazel-base-apt-cache"), sharing=CacheSharingMode.LOCKED)
+            .with_mounted_cache("/var/lib/apt/lists", dag.cache_volume("bazel-base-apt-lists"), sharing=CacheSharingMode.LOCKED)
             # Adicionei 'openssh-client' explicitamente para o Git funcionar via SSH
-            .with_exec(["sh", "-c", install_script])
+            .with_exec(["sh", "-c", f"rm -f /etc/apt/apt.conf.d/docker-clean && apt-get update && apt-get install -y --no-install-recommends {' '.join(APT_PACKAGES)}"])
+            .without_mount("/var/cache/apt")
+            .without_mount("/var/lib/apt/lists")
             .with_exec(["useradd", "-m", "-s", "/bin/bash", "developer"])
-            .with_env_variable("BAZELISK_HOME", "/home/developer/.cache/bazelisk")
             .with_exec(["sh", "-c", "echo '    StrictHostKeyChecking no' >> /etc/ssh/ssh_config"])
-            .with_exec(["sh", "-c", install_script])
+            .with_file("/usr/local/bin/bazelisk", bazelisk, permissions=0o755)
+            .with_new_file("/usr/local/bin/bazel", BAZEL_WRAPPER, permissions=0o755)
+            .with_env_variable("BAZELISK_HOME", "/home/developer/.cache/bazelisk")
+        )
+
+        # Binários do Bazel pré-carregados: o wrapper usa /opt/bazel/<versão>/bazel sem rede.
+        # O .sha256 vem do mesmo host que o binário: detecta download corrompido, não adulteração
+        for version in dict.fromkeys(bazel_versions):
+            url = f"https://releases.bazel.build/{version}/release/bazel-{version}-linux-{bazel_arch}"
+            ctr = (
+                ctr
+                .with_file(f"/opt/bazel/{version}/bazel", dag.http(url), permissions=0o755)
+                .with_file(f"/opt/bazel/{version}/bazel.sha256", dag.http(f"{url}.sha256"))
+                .with_exec(["sh", "-c", f"cd /opt/bazel/{version} && echo \"$(cut -d' ' -f1 bazel.sha256)  bazel\" | sha256sum -c -"])
+            )
+
+        if offline:
+            ctr = ctr.with_env_variable("BAZEL_OFFLINE", "1")
+
+        return (
+            ctr
             .with_env_variable("HOME", "/home/developer")
             .with_user("developer")
             .with_workdir("/home/developer")
         )
 
+    def _verified_bazelisk(self, bazelisk_version: str) -> File:
+        """Compila o bazelisk do módulo Go; o go install rejeita módulos que divergem do sum.golang.org."""
+        return (
+            dag.container()
+            .from_(GO_IMAGE)
+            .with_mounted_cache("/go/pkg/mod", dag.cache_volume("bazel-bazelisk-gomod"))
+            .with_env_variable("CGO_ENABLED", "0")
+            .with_env_variable("GOBIN", "/out")
+            .with_env_variable("GOSUMDB", "sum.golang.org")
+            .with_env_variable("GONOSUMDB", "")
+            .with_env_variable("GOFLAGS", "-mod=readonly")
+            .with_exec(["go", "install", f"{BAZELISK_MODULE}@{bazelisk_version}"])
+            .file("/out/bazelisk")
+        )
+
+    @function
+    def remote_cache_service(
+        self,
+        max_size_gb: Annotated[int, Doc("Tamanho máximo do cache em GB (LRU)")] = 20
+    ) -> Service:
+        """
+        Serviço bazel-remote (HTTP :8080 / gRPC :9092) com os dados num cache volume.
+        Usado automaticamente por build/test/build_with_report com --remote-cache.
+        """
+        return (
+            dag.container()
+            .from_("buchgr/bazel-remote-cache:v2.4.4")
+            .with_mounted_cache("/data", dag.cache_volume("bazel-remote-cache"))
+            .with_exposed_port(8080)
+            .with_exposed_port(9092)
+            .as_service(
+                args=["--dir=/data", f"--max_size={max_size_gb}", "--http_address=0.0.0.0:8080", "--grpc_address=0.0.0.0:9092"],
+                use_entrypoint=True,
+            )
+        )
+
+    @function
+    async def prefetch_deps(
+        self,
+        source: Annotated[Directory, Doc("Repo raiz"), Ignore(BAZEL_IGNORE)],
+        targets: Annotated[list[str], Doc("Targets cujas dependências externas são baixadas")] = ["//..."],
+        bzlmod: Annotated[bool, Doc("Bzlmod flag")] = True,
+        bazel_version: Annotated[Optional[str], Doc("Versão específica")] = None,
+        ssh_dir: Annotated[Optional[Directory], Doc("Full .ssh directory to mount")] = None,
+        ssh_key: Annotated[Optional[Secret], Doc("Chave privada SSH")] = None,
+        netrc: Annotated[Optional[Secret], Doc("Arquivo .netrc")] = None
+    ) -> Directory:
+        """
+        Baixa as dependências externas uma única vez por digest do MODULE.bazel(.lock)
+        (ou WORKSPACE + .bzl) e retorna o snapshot: repository_cache/, vendor/ (bzlmod,
+        Bazel >= 7.1) e manifest.json. Use com --vendor-snapshot/--offline em build/test.
+        """
+        version = await self._resolve_version(source, bazel_version)
+        key = await self._vendor_key(source, version, bzlmod)
+        flags = " ".join(self._bzlmod_flags(bzlmod, bazel_version))
+        dest = f"{VENDOR_CACHE_DIR}/{key}"
+        use_vendor = bzlmod and self._supports_vendor(version)
+        manifest = json.dumps({"key": key, "bazel_version": version, "bzlmod": bzlmod, "vendor": use_vendor})
+
+        fetch = f"bazel fetch {' '.join(targets)} --repository_cache=$tmp/repository_cache {flags}"
+        if use_vendor:
+            # 'bazel vendor' sem targets copia todos os repositórios do grafo de módulos
+            fetch += f" && bazel vendor --vendor_dir=$tmp/vendor --repository_cache=$tmp/repository_cache {flags}"
+        script = f"""
+        set -e
+        if [ -f {dest}/.complete ]; then
+            echo "Snapshot {key} já existe, reutilizando"
+        else
+            tmp={dest}.tmp; rm -rf $tmp; mkdir -p $tmp/repository_cache
+            {fetch}
+            echo '{manifest}' > $tmp/manifest.json
+            touch $tmp/.complete; rm -rf {dest}; mv $tmp {dest}
+        fi
+        rm -rf /tmp/bazel-vendor; cp -a {dest} /tmp/bazel-vendor
+        """
+        ctr = await self._setup_env(source, bazel_version, ssh_key, ssh_dir, netrc, bzlmod=bzlmod)
+        return (
+            ctr
+            # LOCKED: dois pipelines com o mesmo digest não baixam o snapshot ao mesmo tempo
+            .with_mounted_cache(VENDOR_CACHE_DIR, dag.cache_volume("bazel-vendor-snapshots"), sharing=CacheSharingMode.LOCKED, owner="developer")
+            .with_exec(["bash", "-c", script])
+            .directory("/tmp/bazel-vendor")
+        )
+
     @function
     async def build(
         self, 
-        source: Annotated[Directory, Doc("Repo raiz")], 
+        source: Annotated[Directory, Doc("Repo raiz (com .git para --affected-since)"), Ignore(BAZEL_GIT_IGNORE)], 
         targets: Annotated[list[str], Doc("Targets")] = ["//..."], 
         bzlmod: Annotated[bool, Doc("Bzlmod flag")] = True,
         bazel_version: Annotated[Optional[str], Doc("Versão específica")] = None,
         # NOVOS ARGUMENTOS DE AUTH
         ssh_dir: Annotated[Optional[Directory], Doc("Full .ssh directory to mount")] = None,
         ssh_key: Annotated[Optional[Secret], Doc("Chave privada SSH")] = None,
-        netrc: Annotated[Optional[Secret], Doc("Arquivo .netrc para autenticação HTTP")] = None
+        netrc: Annotated[Optional[Secret], Doc("Arquivo .netrc para autenticação HTTP")] = None,
+        affected_since: Annotated[Optional[str], Doc("Ref base (ex: origin/main): builda só os targets afetados pelo diff")] = None,
+        remote_cache: Annotated[bool, Doc("Usa o remote cache embutido (bazel-remote) e reporta o hit rate")] = False,
+        offline: Annotated[bool, Doc("Roda sem rede usando o snapshot de dependências (prefetch_deps)")] = False,
+        vendor_snapshot: Annotated[Optional[Directory], Doc("Snapshot gerado por prefetch_deps (padrão: o do cache volume)")] = None
     ) -> str:
-        """Executa 'bazel build' com suporte a autenticação."""
-        flags = ["build"] + targets
-        if not bzlmod and self._is_version_ge_7(bazel_version):
-            flags.append("--noenable_bzlmod")
+        """Executa 'bazel build' com suporte a autenticação, modo 'affected' e modo offline."""
+        extra_flags = self._bzlmod_flags(bzlmod, bazel_version)
+        snapshot = await self._offline_snapshot(source, bzlmod, bazel_version, ssh_key, ssh_dir, netrc, vendor_snapshot, offline)
+        ctr = await self._setup_env(
+            source, bazel_version, ssh_key, ssh_dir, netrc, remote_cache=remote_cache, offline=offline, bzlmod=bzlmod, vendor_snapshot=snapshot
+        )
+
+        if affected_since:
+            affected = await self._affected_targets(ctr, source, affected_since, targets, extra_flags, tests_only=False)
+            if affected is not None:
+                if not affected:
+                    return f"✅ Nenhum target afetado desde '{affected_since}'."
+                ctr = ctr.with_new_file(AFFECTED_TARGETS_FILE, "\n".join(affected))
+                targets = [f"--target_pattern_file={AFFECTED_TARGETS_FILE}"]
 
-        return await self._run_bazel(source, flags, bazel_version, ssh_key, netrc)
+        return await self._run_bazel(
+            ctr, ["build"] + targets + extra_flags + self._remote_cache_flags(remote_cache), cache_report=remote_cache
+        )
 
     @function
     async def test(
         self, 
-        source: Annotated[Directory, Doc("Repo raiz")], 
+        source: Annotated[Directory, Doc("Repo raiz (com .git para --affected-since)"), Ignore(BAZEL_GIT_IGNORE)], 
         targets: Annotated[list[str], Doc("Targets")] = ["//..."],
         bzlmod: Annotated[bool, Doc("Bzlmod flag")] = True,
         bazel_version: Annotated[Optional[str], Doc("Versão específica")] = None,
@@ -75,19 +279,212 @@ class Bazel:
         # NOVOS ARGUMENTOS DE AUTH
         ssh_dir: Annotated[Optional[Directory], Doc("Full .ssh directory to mount")] = None,
         ssh_key: Annotated[Optional[Secret], Doc("Chave privada SSH")] = None,
+        netrc: Annotated[Optional[Secret], Doc("Arquivo .netrc")] = None,
+        affected_since: Annotated[Optional[str], Doc("Ref base (ex: origin/main): testa só os targets afetados pelo diff")] = None,
+        remote_cache: Annotated[bool, Doc("Usa o remote cache embutido (bazel-remote) e reporta o hit rate")] = False,
+        offline: Annotated[bool, Doc("Roda sem rede usando o snapshot de dependências (prefetch_deps)")] = False,
+        vendor_snapshot: Annotated[Optional[Directory], Doc("Snapshot gerado por prefetch_deps (padrão: o do cache volume)")] = None
+    ) -> str:
+        """Executa 'bazel test' com suporte a autenticação, modo 'affected' e modo offline."""
+        extra_flags = self._bzlmod_flags(bzlmod, bazel_version)
+        snapshot = await self._offline_snapshot(source, bzlmod, bazel_version, ssh_key, ssh_dir, netrc, vendor_snapshot, offline)
+        ctr = await self._setup_env(
+            source, bazel_version, ssh_key, ssh_dir, netrc, remote_cache=remote_cache, offline=offline, bzlmod=bzlmod, vendor_snapshot=snapshot
+        )
+
+        if affected_since:
+            affected = await self._affected_targets(ctr, source, affected_since, targets, extra_flags, tests_only=True)
+            if affected is not None:
+                if not affected:
+                    return f"✅ Nenhum teste afetado desde '{affected_since}'."
+                ctr = ctr.with_new_file(AFFECTED_TARGETS_FILE, "\n".join(affected))
+                targets = [f"--target_pattern_file={AFFECTED_TARGETS_FILE}"]
+
+        return await self._run_bazel(
+            ctr,
+            ["test", f"--test_output={test_output}"] + targets + extra_flags + self._remote_cache_flags(remote_cache),
+            cache_report=remote_cache,
+        )
+
+    @function
+    async def test_with_report(
+        self,
+        source: Annotated[Directory, Doc("Repo raiz"), Ignore(BAZEL_IGNORE)],
+        targets: Annotated[list[str], Doc("Targets")] = ["//..."],
+        bzlmod: Annotated[bool, Doc("Bzlmod flag")] = True,
+        bazel_version: Annotated[Optional[str], Doc("Versão específica")] = None,
+        test_output: Annotated[str, Doc("Nível de log")] = "errors",
+        flaky_test_attempts: Annotated[int, Doc("Tentativas por teste (>1 detecta testes flaky)")] = 1,
+        history_key: Annotated[Optional[str], Doc("Nome do histórico de testes no cache volume (vazio desativa)")] = "default",
+        top_n: Annotated[int, Doc("Quantidade de testes mais lentos/instáveis no relatório")] = 20,
+        ssh_dir: Annotated[Optional[Directory], Doc("Full .ssh directory to mount")] = None,
+        ssh_key: Annotated[Optional[Secret], Doc("Chave privada SSH")] = None,
+        netrc: Annotated[Optional[Secret], Doc("Arquivo .netrc")] = None,
+        remote_cache: Annotated[bool, Doc("Usa o remote cache embutido (bazel-remote)")] = False
+    ) -> Directory:
+        """
+        Executa 'bazel test' e consolida os JUnit XML num único junit.xml.
+        Retorna também test_report.md/json com falhas, testes flaky, os mais lentos
+        e os instáveis no histórico (persistido num cache volume entre execuções).
+        """
+        extra_flags = self._bzlmod_flags(bzlmod, bazel_version)
+        ctr = await self._setup_env(source, bazel_version, ssh_key, ssh_dir, netrc, remote_cache=remote_cache, bzlmod=bzlmod)
+
+        bep_file = "/tmp/test_bep.json"
+        cmd = (
+            f"bazel test {' '.join(targets)} --test_output={test_output} "
+            f"--flaky_test_attempts={flaky_test_attempts} {' '.join(extra_flags + self._remote_cache_flags(remote_cache))} "
+            f"--build_event_json_file={bep_file} --curses=no; rc=$?; "
+            f"{TESTLOGS_COLLECT_CMD}; exit $rc"
+        )
+        ctr = ctr.with_exec(["sh", "-c", cmd], expect=ReturnType.ANY)
+        exit_code = await ctr.exit_code()
+
+        aggregator = JUnitAggregator()
+        await self._aggregate_junit(ctr, aggregator)
+
+        unstable = []
+        if history_key:
+            history = await self._load_test_history(history_key)
+            history.record_cases(aggregator.cases)
+            report = await self._read_bep(ctr.file(bep_file))
+            if report is not None:
+                for label, stats in report.targets.items():
+                    if stats.test_duration_ms:
+                        history.record_target(label, stats.test_duration_ms)
+            await self._save_test_history(history_key, history)
+            unstable = history.unstable()
+
+        summary = aggregator.to_dict(top_n, unstable)
+        summary["exit_code"] = exit_code
+        return (
+            dag.directory()
+            .with_file("junit.xml", self._junit_file(aggregator))
+            .with_new_file("test_report.md", f"{aggregator.to_markdown(top_n, unstable)}\n\n**Exit code:** {exit_code}\n")
+            .with_new_file("test_report.json", json.dumps(summary, indent=2))
+        )
+
+    @function
+    async def affected_targets(
+        self,
+        source: Annotated[Directory, Doc("Repo raiz (com .git)"), Ignore(BAZEL_GIT_IGNORE)],
+        base_ref: Annotated[str, Doc("Ref base para o diff (ex: origin/main)")],
+        targets: Annotated[list[str], Doc("Universo de targets")] = ["//..."],
+        tests_only: Annotated[bool, Doc("Retorna apenas targets de teste")] = False,
+        bzlmod: Annotated[bool, Doc("Bzlmod flag")] = True,
+        bazel_version: Annotated[Optional[str], Doc("Versão específica")] = None,
+        ssh_dir: Annotated[Optional[Directory], Doc("Full .ssh directory to mount")] = None,
+        ssh_key: Annotated[Optional[Secret], Doc("Chave privada SSH")] = None,
         netrc: Annotated[Optional[Secret], Doc("Arquivo .netrc")] = None
     ) -> str:
-        """Executa 'bazel test' com suporte a autenticação."""
-        flags = ["test", f"--test_output={test_output}"] + targets
-        if not bzlmod and self._is_version_ge_7(bazel_version):
-            flags.append("--noenable_bzlmod")
+        """
+        Lista os targets impactados pelas mudanças desde 'base_ref' (um por linha).
+        Mudanças em MODULE.bazel/WORKSPACE/.bazelrc retornam o universo inteiro.
+        """
+        extra_flags = self._bzlmod_flags(bzlmod, bazel_version)
+        ctr = await self._setup_env(source, bazel_version, ssh_key, ssh_dir, netrc, bzlmod=bzlmod)
+        affected = await self._affected_targets(ctr, source, base_ref, targets, extra_flags, tests_only)
+        return "\n".join(targets if affected is None else affected)
+
+    @function
+    async def test_sharded(
+        self,
+        source: Annotated[Directory, Doc("Repo raiz"), Ignore(BAZEL_IGNORE)],
+        targets: Annotated[list[str], Doc("Targets")] = ["//..."],
+        shards: Annotated[int, Doc("Número de shards executados em paralelo")] = 4,
+        history: Annotated[Optional[File], Doc("test_durations.json de uma execução anterior ({label: ms})")] = None,
+        history_key: Annotated[Optional[str], Doc("Histórico no cache volume, usado quando 'history' não é informado (vazio desativa)")] = "default",
+        bzlmod: Annotated[bool, Doc("Bzlmod flag")] = True,
+        bazel_version: Annotated[Optional[str], Doc("Versão específica")] = None,
+        test_output: Annotated[str, Doc("Nível de log")] = "errors",
+        ssh_dir: Annotated[Optional[Directory], Doc("Full .ssh directory to mount")] = None,
+        ssh_key: Annotated[Optional[Secret], Doc("Chave privada SSH")] = None,
+        netrc: Annotated[Optional[Secret], Doc("Arquivo .netrc")] = None
+    ) -> Directory:
+        """
+        Executa 'bazel test' dividido em N shards concorrentes (um container por shard).
+        Retorna um diretório com summary.md, test_durations.json, o junit.xml consolidado e os JUnit XML em junit/.
+        """
+        extra_flags = self._bzlmod_flags(bzlmod, bazel_version)
+        ctr = await self._setup_env(source, bazel_version, ssh_key, ssh_dir, netrc, bzlmod=bzlmod)
+
+        # 1. Descobrir os testes
+        query = f"tests(set({' '.join(targets)}))"
+        raw = await ctr.with_exec(["bazel", "query", query, "--output=label"] + extra_flags).stdout()
+        test_targets = [t.strip() for t in raw.splitlines() if t.strip()]
+        if not test_targets:
+            return dag.directory().with_new_file("summary.md", "## Bazel Sharded Test Report\n\nNenhum teste encontrado.\n")
+
+        # 2. Balancear pelos tempos históricos (ou pela contagem de targets)
+        durations: dict[str, int] = {}
+        store = await self._load_test_history(history_key) if history_key else None
+        if history:
+            durations = {k: int(v) for k, v in json.loads(await history.contents()).items()}
+        elif store:
+            durations = store.target_durations()
+        plan = balance_shards(test_targets, durations, shards)
+        print(f"Running {len(test_targets)} tests in {len(plan)} shards...")
 
-        return await self._run_bazel(source, flags, bazel_version, ssh_key, netrc)
+        # 3. Executar os shards em paralelo
+        results = await asyncio.gather(*[
+            self._run_test_shard(ctr, index, shard, test_output, extra_flags)
+            for index, shard in enumerate(plan)
+        ])
+
+        # 4. Consolidar resultados
+        output = dag.directory()
+        passed = True
+        shard_lines, target_lines = [], []
+        aggregator = JUnitAggregator()
+        for index, (exit_code, report, shard_ctr) in enumerate(results):
+            # 0 = sucesso, 4 = nenhum teste executado; qualquer outro código é falha
+            shard_ok = exit_code in (0, 4)
+            passed = passed and shard_ok
+            estimate = estimated_ms(plan[index], durations) / 1000
+            shard_lines.append(f"| {index} | {len(plan[index])} | {exit_code} | {estimate:.1f}s |")
+            output = output.with_directory("junit", shard_ctr.directory("/tmp/junit"))
+            await self._aggregate_junit(shard_ctr, aggregator)
+            for label in plan[index]:
+                stats = report.target(label)
+                if stats.test_duration_ms:
+                    durations[label] = stats.test_duration_ms
+                    if store:
+                        store.record_target(label, stats.test_duration_ms)
+                status = stats.test_status or ("NO_STATUS" if shard_ok else "FAILED")
+                icon = "✅" if status == "PASSED" else ("⚠️" if status == "FLAKY" else "❌")
+                target_lines.append(f"| {label} | {icon} {status} | {stats.test_duration_ms / 1000:.2f}s | {index} |")
+
+        if store:
+            store.record_cases(aggregator.cases)
+
+        md_lines = [
+            "## Bazel Sharded Test Report",
+            f"**Result:** {'✅ PASSED' if passed else '❌ FAILED'}",
+            f"**Shards:** {len(plan)} | **Tests:** {len(test_targets)}",
+            "",
+            "| Shard | Targets | Exit code | Estimated |",
+            "| ---: | ---: | ---: | ---: |",
+            *shard_lines,
+            "",
+            "| Target | Status | Duration | Shard |",
+            "| :--- | :--- | ---: | ---: |",
+            *sorted(target_lines),
+            "",
+            aggregator.to_markdown(unstable=store.unstable() if store else None),
+        ]
+        if store:
+            await self._save_test_history(history_key, store)
+        return (
+            output
+            .with_file("junit.xml", self._junit_file(aggregator))
+            .with_new_file("summary.md", "\n".join(md_lines))
+            .with_new_file("test_durations.json", json.dumps(durations, indent=2, sort_keys=True))
+        )
 
     @function
     async def build_with_report(
         self,
-        source: Annotated[Directory, Doc("Repo raiz")],
+        source: Annotated[Directory, Doc("Repo raiz"), Ignore(BAZEL_IGNORE)],
         targets: Annotated[list[str], Doc("Targets")] = ["//..."],
         # NOVO: Separamos configs (como --config=gcc9) dos targets para não quebrar o 'bazel query'
         build_args: Annotated[list[str], Doc("Flags extras de build (ex: --config=gcc9)")] = [],
@@ -95,32 +492,48 @@ class Bazel:
         bazel_version: Annotated[Optional[str], Doc("Versão específica")] = None,
         ssh_dir: Annotated[Optional[Directory], Doc("Full .ssh directory to mount")] = None,
         ssh_key: Annotated[Optional[Secret], Doc("Chave privada SSH")] = None,
-        netrc: Annotated[Optional[Secret], Doc("Arquivo .netrc")] = None
+        netrc: Annotated[Optional[Secret], Doc("Arquivo .netrc")] = None,
+        report_format: Annotated[str, Doc("Formato do relatório: 'markdown' ou 'json'")] = "markdown",
+        remote_cache: Annotated[bool, Doc("Usa o remote cache embutido (bazel-remote)")] = False,
+        query_cache: Annotated[bool, Doc("Reutiliza a lista de targets se nenhum arquivo de build mudou")] = True,
+        offline: Annotated[bool, Doc("Roda sem rede usando o snapshot de dependências (prefetch_deps)")] = False,
+        vendor_snapshot: Annotated[Optional[Directory], Doc("Snapshot gerado por prefetch_deps (padrão: o do cache volume)")] = None
     ) -> File:
         """
-        Executa build e retorna relatório Markdown. 
-        Processa o JSON internamente no Dagger SDK (host), sem scripts injetados no container.
+        Executa build e retorna relatório Markdown (ou JSON). 
+        Processa o BEP em streaming no Dagger SDK (host), sem scripts injetados no container.
+        Inclui tempo por target, contagem de actions, cache hit/miss e critical path.
         """
         
         # 1. Preparar Strings
         target_str = " ".join(targets)      # ex: "//..."
-        build_args_str = " ".join(build_args) # ex: "--config=gcc9"
+        build_args_str = " ".join(build_args + self._remote_cache_flags(remote_cache)) # ex: "--config=gcc9"
         
-        extra_flags = ""
-        if not bzlmod and self._is_version_ge_7(bazel_version):
-            extra_flags = "--noenable_bzlmod"
+        extra_flags = " ".join(self._bzlmod_flags(bzlmod, bazel_version))
 
         # 2. Configurar Container
-        ctr = self._setup_env(source, bazel_version, ssh_key, ssh_dir, netrc)
+        snapshot = await self._offline_snapshot(source, bzlmod, bazel_version, ssh_key, ssh_dir, netrc, vendor_snapshot, offline)
+        ctr = await self._setup_env(
+            source, bazel_version, ssh_key, ssh_dir, netrc,
+            remote_cache=remote_cache, offline=offline, bzlmod=bzlmod, config_flags=build_args, vendor_snapshot=snapshot,
+        )
         
         # 3. Executar Query (SOMENTE TARGETS)
         # Importante: Não passamos 'build_args' aqui, pois 'bazel query' não suporta --config
         print("1. Querying targets...")
-        query_cmd = f"bazel query '{target_str}' {extra_flags} --output label > /tmp/query_output.txt"
-        ctr = ctr.with_exec(["sh", "-c", query_cmd])
-        
+        key = await self._query_cache_key(source, bazel_version, bzlmod, [target_str, "--output=label", extra_flags]) if query_cache else None
+        query_file = await self._cached_query(key, "query_output.txt") if key else None
+        if query_file is None:
+            query_cmd = f"bazel query '{target_str}' {extra_flags} --output label > /tmp/query_output.txt"
+            ctr = ctr.with_exec(["sh", "-c", query_cmd])
+            query_file = ctr.file("/tmp/query_output.txt")
+            if key:
+                await self._store_query(key, query_file)
+        else:
+            print(f"   Query cache hit ({key[:12]})")
+
         # Trazemos o resultado para a memória do Python (Host)
-        raw_query = await ctr.file("/tmp/query_output.txt").contents()
+        raw_query = await query_file.contents()
         all_targets = [t.strip() for t in raw_query.splitlines() if t.strip()]
 
         # 4. Executar Build (TARGETS + BUILD_ARGS)
@@ -132,85 +545,401 @@ class Bazel:
         build_cmd = (
             f"bazel build {target_str} {build_args_str} {extra_flags} "
             f"--build_event_json_file={json_log_path} "
+            "--build_event_publish_all_actions "
             "--color=yes --curses=no || true"
         )
         
         ctr = ctr.with_exec(["sh", "-c", build_cmd])
         
-        # Ler o JSON gerado
-        try:
-            json_content = await ctr.file(json_log_path).contents()
-        except Exception:
-            print("Aviso: Arquivo JSON não encontrado (Build falhou antes de iniciar?)")
-            json_content = ""
-
         # 5. Processamento Lógico (Python Puro no Host)
+        # O BEP é lido em blocos de linhas e agregado evento a evento: a memória
+        # usada depende do número de targets, não do tamanho do arquivo JSON.
         print("3. Processing report...")
-        successful_targets = set()
-        failed_targets = set()
+        report = await self._read_bep(ctr.file(json_log_path))
+        if report is None:
+            print("Aviso: Arquivo JSON não encontrado (Build falhou antes de iniciar?)")
+            report = BepReport()
 
-        for line in json_content.splitlines():
-            if not line.strip(): continue
-            try:
-                event = json.loads(line)
-                if 'id' in event and 'targetCompleted' in event['id']:
-                    label = event['id']['targetCompleted']['label']
-                    success = event.get('completed', {}).get('success', False)
-                    if success:
-                        successful_targets.add(label)
-                    else:
-                        failed_targets.add(label)
-            except json.JSONDecodeError:
-                continue
-
-        # 6. Gerar Markdown
-        md_lines = []
-        md_lines.append(f"## Bazel Build Report")
-        md_lines.append(f"**Date:** {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        md_lines.append("")
-        md_lines.append("| Target | Status | Details |")
-        md_lines.append("| :--- | :--- | :--- |")
-
-        for target in all_targets:
-            if target in successful_targets:
-                status = "✅ SUCCESS"
-                detail = "Build successful"
-            elif target in failed_targets:
-                status = "❌ FAILED"
-                detail = "Compilation or Test failed"
-            else:
-                status = "⚪ SKIPPED"
-                detail = "Dependency failed or not attempted"
-            
-            md_lines.append(f"| {target} | {status} | {detail} |")
+        # 6. Gerar Relatório
+        if report_format == "json":
+            name = "build_report.json"
+            contents = json.dumps(report.to_dict(all_targets), indent=2)
+        else:
+            name = "build_report.md"
+            contents = report.to_markdown(all_targets)
 
         # Retornar arquivo
-        return ctr.with_new_file("build_report.md", contents="\n".join(md_lines)).file("build_report.md")
+        return ctr.with_new_file(name, contents=contents).file(name)
         
     @function
-    def query_to_file(
+    async def profile_build(
+        self,
+        source: Annotated[Directory, Doc("Repo raiz"), Ignore(BAZEL_IGNORE)],
+        targets: Annotated[list[str], Doc("Targets")] = ["//..."],
+        build_args: Annotated[list[str], Doc("Flags extras de build (ex: --config=gcc9)")] = [],
+        bzlmod: Annotated[bool, Doc("Bzlmod flag")] = True,
+        bazel_version: Annotated[Optional[str], Doc("Versão específica")] = None,
+        top_n: Annotated[int, Doc("Quantidade de actions/mnemonics mais lentos no relatório")] = 20,
+        ssh_dir: Annotated[Optional[Directory], Doc("Full .ssh directory to mount")] = None,
+        ssh_key: Annotated[Optional[Secret], Doc("Chave privada SSH")] = None,
+        netrc: Annotated[Optional[Secret], Doc("Arquivo .netrc")] = None,
+        remote_cache: Annotated[bool, Doc("Usa o remote cache embutido (bazel-remote)")] = False
+    ) -> Directory:
+        """
+        Executa 'bazel build' com --profile e retorna o trace (profile.json, abre no
+        Perfetto/chrome://tracing) junto com profile_report.md e profile_report.json.
+        """
+        extra_flags = self._bzlmod_flags(bzlmod, bazel_version)
+        ctr = await self._setup_env(source, bazel_version, ssh_key, ssh_dir, netrc, remote_cache=remote_cache, bzlmod=bzlmod, config_flags=build_args)
+
+        profile_path = "/tmp/profile.json"
+        flags = (
+            ["build"] + targets + build_args + extra_flags + self._remote_cache_flags(remote_cache)
+            + [f"--profile={profile_path}", "--generate_json_trace_profile", "--experimental_profile_include_target_label"]
+        )
+        # O relatório é gerado mesmo se o build falhar
+        ctr = ctr.with_exec(["bazel"] + flags, expect=ReturnType.ANY)
+        exit_code = await ctr.exit_code()
+
+        trace = ctr.file(profile_path)
+        report = ProfileReport(top_n=top_n)
+        async for line in iter_lines(trace):
+            report.feed_line(line)
+
+        summary = report.to_dict()
+        summary["exit_code"] = exit_code
+        return (
+            dag.directory()
+            .with_file("profile.json", trace)
+            .with_new_file("profile_report.md", report.to_markdown())
+            .with_new_file("profile_report.json", json.dumps(summary, indent=2))
+        )
+
+    @function
+    async def analyze_profile(
+        self,
+        trace: Annotated[File, Doc("JSON trace profile do Bazel (.json ou .json.gz)")],
+        top_n: Annotated[int, Doc("Quantidade de actions/mnemonics mais lentos no relatório")] = 20,
+        report_format: Annotated[str, Doc("Formato do relatório: 'markdown' ou 'json'")] = "markdown"
+    ) -> str:
+        """Analisa um trace profile existente: critical path, hotspots e breakdown por fase."""
+        if (await trace.name()).endswith(".gz"):
+            trace = (
+                dag.container()
+                .from_("alpine:latest")
+                .with_file("/tmp/profile.json.gz", trace)
+                .with_exec(["gunzip", "/tmp/profile.json.gz"])
+                .file("/tmp/profile.json")
+            )
+
+        report = ProfileReport(top_n=top_n)
+        async for line in iter_lines(trace):
+            report.feed_line(line)
+        if report_format == "json":
+            return json.dumps(report.to_dict(), indent=2)
+        return report.to_markdown()
+
+    @function
+    async def matrix(
+        self,
+        source: Annotated[Directory, Doc("Repo raiz"), Ignore(BAZEL_IGNORE)],
+        bazel_versions: Annotated[list[str], Doc("Versões do Bazel (ex: 6.4.0, 7.1.1)")],
+        bzlmod_modes: Annotated[list[bool], Doc("Modos bzlmod a testar")] = [True, False],
+        targets: Annotated[list[str], Doc("Targets")] = ["//..."],
+        build_args: Annotated[list[str], Doc("Flags extras de build (ex: --config=gcc9)")] = [],
+        max_parallel: Annotated[int, Doc("Máximo de combinações executando ao mesmo tempo")] = 4,
+        ssh_dir: Annotated[Optional[Directory], Doc("Full .ssh directory to mount")] = None,
+        ssh_key: Annotated[Optional[Secret], Doc("Chave privada SSH")] = None,
+        netrc: Annotated[Optional[Secret], Doc("Arquivo .netrc")] = None,
+        report_format: Annotated[str, Doc("Formato do relatório: 'markdown' ou 'json'")] = "markdown"
+    ) -> str:
+        """
+        Builda todas as combinações versão x bzlmod em paralelo (limitado por max_parallel)
+        e retorna uma tabela comparativa: resultado, tempo total, tempo de análise e targets com falha.
+        """
+        semaphore = asyncio.Semaphore(max(1, max_parallel))
+
+        async def run_cell(version: str, bzlmod: bool) -> dict:
+            async with semaphore:
+                print(f"Matrix: Bazel {version} / bzlmod={bzlmod}...")
+                flags = self._bzlmod_flags(bzlmod, version)
+                if bzlmod and not self._is_version_ge_7(version):
+                    # Antes do Bazel 7 o bzlmod vem desligado: habilitamos explicitamente
+                    flags.append("--enable_bzlmod")
+                ctr = await self._setup_env(
+                    source, version, ssh_key, ssh_dir, netrc, bzlmod=bzlmod, config_flags=build_args
+                )
+                bep_file = "/tmp/matrix_bep.json"
+                ctr = ctr.with_exec(
+                    ["bazel", "build"] + targets + build_args + flags
+                    + [f"--build_event_json_file={bep_file}", "--keep_going", "--curses=no"],
+                    expect=ReturnType.ANY,
+                )
+                exit_code = await ctr.exit_code()
+                report = await self._read_bep(ctr.file(bep_file)) or BepReport()
+                return {
+                    "bazel_version": version,
+                    "bzlmod": bzlmod,
+                    "exit_code": exit_code,
+                    "passed": exit_code == 0,
+                    "wall_time_ms": report.wall_time_ms,
+                    "analysis_time_ms": report.timing.get("analysisPhaseTimeInMs"),
+                    "failed_targets": sorted(l for l, t in report.targets.items() if t.status == "FAILED"),
+                }
+
+        cells = await asyncio.gather(*[
+            run_cell(version, bzlmod) for version in bazel_versions for bzlmod in bzlmod_modes
+        ])
+
+        if report_format == "json":
+            return json.dumps(cells, indent=2)
+
+        def seconds(ms: Optional[int]) -> str:
+            return f"{ms / 1000:.1f}s" if ms else "-"
+
+        md_lines = [
+            "## Bazel Compatibility Matrix",
+            "",
+            "| Bazel | Bzlmod | Result | Wall time | Analysis | Failing targets |",
+            "| :--- | :--- | :--- | ---: | ---: | :--- |",
+        ]
+        for cell in cells:
+            failed = cell["failed_targets"]
+            shown = "<br>".join(failed[:10]) + (f"<br>… +{len(failed) - 10}" if len(failed) > 10 else "")
+            result = "✅ PASS" if cell["passed"] else f"❌ FAIL (exit {cell['exit_code']})"
+            md_lines.append(
+                f"| {cell['bazel_version']} | {'on' if cell['bzlmod'] else 'off'} | {result} | "
+                f"{seconds(cell['wall_time_ms'])} | {seconds(cell['analysis_time_ms'])} | {shown or '-'} |"
+            )
+        return "\n".join(md_lines)
+
+    @function
+    async def server(
+        self,
+        source: Annotated[Directory, Doc("Repo raiz (snapshot servido)"), Ignore(BAZEL_IGNORE)],
+        bzlmod: Annotated[bool, Doc("Bzlmod flag")] = True,
+        bazel_version: Annotated[Optional[str], Doc("Versão específica")] = None,
+        warmup_query: Annotated[Optional[str], Doc("Query executada na subida para carregar os pacotes (ex: //...)")] = "//...",
+        ssh_dir: Annotated[Optional[Directory], Doc("Full .ssh directory to mount")] = None,
+        ssh_key: Annotated[Optional[Secret], Doc("Chave privada SSH")] = None,
+        netrc: Annotated[Optional[Secret], Doc("Arquivo .netrc")] = None
+    ) -> Service:
+        """
+        Bazel server aquecido como serviço Dagger (HTTP :8080). Mantém a JVM e o
+        analysis cache vivos entre chamadas de build/test/query contra o mesmo snapshot.
+
+        Exemplo:
+            dagger call bazel server --source . up --ports 8080:8080
+            curl -d '{"command":"query","args":["deps(//src:app)"]}' localhost:8080/run
+        """
+        ctr = await self._setup_env(source, bazel_version, ssh_key, ssh_dir, netrc, bzlmod=bzlmod)
+        script = Path(__file__).with_name("warm_server.py").read_text()
+        ctr = (
+            ctr
+            .with_new_file("/opt/warm_server.py", script)
+            .with_env_variable("BAZEL_EXTRA_FLAGS", " ".join(self._bzlmod_flags(bzlmod, bazel_version)))
+            .with_env_variable("BAZEL_WORKSPACE", "/src")
+        )
+        if warmup_query:
+            ctr = ctr.with_env_variable("WARMUP_QUERY", warmup_query)
+        return ctr.with_exposed_port(WARM_SERVER_PORT).as_service(args=["python3", "/opt/warm_server.py"])
+
+    @function
+    async def server_run(
         self,
-        source: Annotated[Directory, Doc("Repo raiz")],
+        server: Annotated[Service, Doc("Serviço retornado por 'server'")],
+        command: Annotated[str, Doc("build, test, query, cquery, aquery ou info")],
+        args: Annotated[list[str], Doc("Argumentos do comando (targets, expressão de query, flags)")] = []
+    ) -> str:
+        """Envia um comando ao Bazel server aquecido e retorna o stdout (falha se exit code != 0)."""
+        payload = json.dumps({"command": command, "args": args})
+        raw = await (
+            dag.container()
+            .from_("alpine:latest")
+            .with_service_binding("bazel-server", server)
+            .with_new_file("/tmp/request.json", payload)
+            # Comandos de build/test têm efeito colateral: nunca reutilizar o resultado do engine
+            .with_env_variable("CACHE_BUSTER", str(time.time()))
+            .with_exec([
+                "wget", "-qO-", "--header=Content-Type: application/json",
+                "--post-file=/tmp/request.json", f"http://bazel-server:{WARM_SERVER_PORT}/run",
+            ])
+            .stdout()
+        )
+        result = json.loads(raw)
+        print(f"bazel {command}: exit {result['exit_code']} em {result['duration_ms']} ms")
+        if result["exit_code"] != 0:
+            raise Exception(f"bazel {command} falhou (exit {result['exit_code']}):\n{result['stderr']}")
+        return result["stdout"]
+
+    @function
+    async def query_to_file(
+        self,
+        source: Annotated[Directory, Doc("Repo raiz"), Ignore(BAZEL_IGNORE)],
         output_name: str = "bazel_query_output.txt",
         query: str = "//...",
         bzlmod: bool = True,
         bazel_version: Optional[str] = None,
         ssh_dir: Annotated[Optional[Directory], Doc("Full .ssh directory to mount")] = None,
         ssh_key: Annotated[Optional[Secret], Doc("Chave privada SSH")] = None,
-        netrc: Annotated[Optional[Secret], Doc("Arquivo .netrc")] = None
+        netrc: Annotated[Optional[Secret], Doc("Arquivo .netrc")] = None,
+        output: Annotated[str, Doc("Formato do --output (label, graph, proto, streamed_jsonproto...)")] = "label",
+        query_cache: Annotated[bool, Doc("Reutiliza o resultado se nenhum arquivo de build mudou")] = True
     ) -> File:
-        """Executa query com suporte a autenticação."""
-        extra_flags = ""
-        if not bzlmod and self._is_version_ge_7(bazel_version):
-            extra_flags = "--noenable_bzlmod"
+        """
+        Executa query com suporte a autenticação.
+        O resultado fica em cache, chaveado pelo digest dos arquivos de build + versão + expressão.
+        """
+        extra_flags = " ".join(self._bzlmod_flags(bzlmod, bazel_version))
+        if output == "graph":
+            # Sem fatoração os nós do dot são labels únicos (mais fácil de indexar)
+            extra_flags += " --nograph:factored"
 
-        cmd = f"bazel query '{query}' {extra_flags} > /tmp/{output_name}"
+        key = None
+        if query_cache:
+            key = await self._query_cache_key(source, bazel_version, bzlmod, [query, f"--output={output}", extra_flags])
+            cached = await self._cached_query(key, output_name)
+            if cached is not None:
+                print(f"Query cache hit ({key[:12]})")
+                return cached
 
-        return (
-            self._setup_env(source, bazel_version, ssh_key, ssh_dir, netrc)
+        cmd = f"bazel query '{query}' --output={output} {extra_flags} > /tmp/{output_name}"
+        result = (
+            (await self._setup_env(source, bazel_version, ssh_key, ssh_dir, netrc, bzlmod=bzlmod))
             .with_exec(["sh", "-c", cmd])
             .file(f"/tmp/{output_name}")
         )
+        if key:
+            await self._store_query(key, result)
+        return result
+
+    @function
+    async def graph_query(
+        self,
+        graph: Annotated[File, Doc("Saída do query-to-file (--output graph, label, proto ou streamed_jsonproto)")],
+        kind: Annotated[str, Doc("deps, rdeps, path (menor caminho), somepath ou stats")] = "stats",
+        label: Annotated[Optional[str], Doc("Label de origem")] = None,
+        to_label: Annotated[Optional[str], Doc("Label de destino (path/somepath)")] = None,
+        depth: Annotated[Optional[int], Doc("Profundidade máxima (deps/rdeps)")] = None,
+        input_format: Annotated[str, Doc("Formato do arquivo ou 'auto'")] = "auto",
+        normalize_repos: Annotated[bool, Doc("Converte nomes canônicos do bzlmod (@@repo~...) para o nome aparente")] = False
+    ) -> str:
+        """
+        Responde deps/rdeps/caminhos sobre um grafo exportado, sem reexecutar o Bazel.
+        O grafo é carregado num índice compacto (labels internados + adjacência CSR).
+        """
+        index = await self._load_graph(graph, input_format, normalize_repos)
+
+        if kind == "stats":
+            fan_in = sorted(range(len(index)), key=lambda n: -len(index.neighbors(n, reverse=True)))[:10]
+            lines = [f"Nodes: {len(index)}", f"Edges: {index.edge_count}", "", "Top fan-in (mais rdeps diretos):"]
+            lines += [f"  {len(index.neighbors(n, reverse=True)):>6}  {index.labels[n]}" for n in fan_in]
+            return "\n".join(lines)
+
+        if not label:
+            raise Exception(f"'{kind}' requer --label")
+        if kind in ("deps", "rdeps"):
+            return "\n".join(index.closure(label, reverse=kind == "rdeps", depth=depth))
+        if kind in ("path", "somepath"):
+            if not to_label:
+                raise Exception(f"'{kind}' requer --to-label")
+            path = index.shortest_path(label, to_label) if kind == "path" else index.some_path(label, to_label)
+            return "\n".join(path) if path else f"Nenhum caminho entre {label} e {to_label}."
+        raise Exception(f"Tipo de consulta desconhecido: {kind}")
+
+    @function
+    async def graph_diff(
+        self,
+        left: Annotated[File, Doc("Grafo base (ex: dumps/graph_legacy.txt)")],
+        right: Annotated[File, Doc("Grafo comparado (ex: dumps/graph_bzlmod.txt)")],
+        input_format: Annotated[str, Doc("Formato dos arquivos ou 'auto'")] = "auto",
+        normalize_repos: Annotated[bool, Doc("Converte nomes canônicos do bzlmod para o nome aparente")] = True,
+        report_format: Annotated[str, Doc("Formato do relatório: 'markdown' ou 'json'")] = "markdown"
+    ) -> File:
+        """
+        Diff estrutural entre dois grafos (ex: bzlmod vs WORKSPACE): nós e arestas
+        presentes só de um lado.
+        """
+        left_index, right_index = await asyncio.gather(
+            self._load_graph(left, input_format, normalize_repos),
+            self._load_graph(right, input_format, normalize_repos),
+        )
+        diff = diff_graphs(left_index, right_index)
+
+        if report_format == "json":
+            return dag.directory().with_new_file("graph_diff.json", json.dumps(diff, indent=2)).file("graph_diff.json")
+
+        md_lines = [
+            "## Bazel Graph Diff",
+            "",
+            "| | Left | Right |",
+            "| :--- | ---: | ---: |",
+            f"| Nodes | {diff['left']['nodes']} | {diff['right']['nodes']} |",
+            f"| Edges | {diff['left']['edges']} | {diff['right']['edges']} |",
+        ]
+        for title, key, fmt in (
+            ("Nodes only in left", "only_left_nodes", str),
+            ("Nodes only in right", "only_right_nodes", str),
+            ("Edges only in left", "only_left_edges", lambda e: f"{e[0]} -> {e[1]}"),
+            ("Edges only in right", "only_right_edges", lambda e: f"{e[0]} -> {e[1]}"),
+        ):
+            md_lines += ["", f"### {title} ({len(diff[key])})"]
+            md_lines += [f"- `{fmt(item)}`" for item in diff[key]]
+        return dag.directory().with_new_file("graph_diff.md", "\n".join(md_lines)).file("graph_diff.md")
+
+    @function
+    async def prune_caches(
+        self,
+        source: Annotated[Optional[Directory], Doc("Repo raiz (usa o .bazelversion quando --bazel-version não é dado)"), Ignore(["*", "!.bazelversion"])] = None,
+        max_disk_cache_gb: Annotated[int, Doc("Tamanho máximo do disk cache (GB)")] = 50,
+        max_repository_cache_gb: Annotated[int, Doc("Tamanho máximo do repository cache (GB)")] = 20,
+        max_output_base_age_days: Annotated[int, Doc("Remove output bases sem uso há mais de N dias")] = 14,
+        bzlmod: Annotated[bool, Doc("Bzlmod flag (seleciona o output base)")] = True,
+        bazel_version: Annotated[Optional[str], Doc("Versão específica (seleciona o output base)")] = None,
+        build_args: Annotated[list[str], Doc("Flags de build (seleciona o output base)")] = []
+    ) -> str:
+        """
+        Garbage collection LRU dos cache volumes: remove os arquivos menos usados do
+        disk/repository cache até o limite e os output bases ociosos da configuração dada.
+        """
+        # Mesma versão que o _setup_env usa na chave, senão o volume podado seria outro
+        version = await self._resolve_version(source, bazel_version) if source else bazel_version
+        key = self._output_base_key(version, bzlmod, build_args)
+        output_root = "/home/developer/.cache/bazel"
+        script = f"""
+        set -e
+        lru_trim() {{
+            dir=$1; max_kb=$(($2 * 1024 * 1024))
+            used=$(du -sk "$dir" | cut -f1)
+            echo "$dir: $((used / 1024)) MB (limite $(($max_kb / 1024)) MB)"
+            [ "$used" -le "$max_kb" ] && return 0
+            find "$dir" -type f -printf '%T@ %k %p\\n' | sort -n | while read -r _ kb path; do
+                [ "$used" -le "$max_kb" ] && break
+                rm -f "$path"; used=$((used - kb))
+            done
+            find "$dir" -mindepth 1 -type d -empty -delete
+            echo "$dir: podado para $(($(du -sk "$dir" | cut -f1) / 1024)) MB"
+        }}
+        lru_trim {DISK_CACHE_DIR} {max_disk_cache_gb}
+        lru_trim {REPOSITORY_CACHE_DIR} {max_repository_cache_gb}
+        # Output bases: o command.log é reescrito a cada comando, então serve de "último uso"
+        for base in {output_root}/_bazel_developer/*/; do
+            [ -f "$base/command.log" ] || continue
+            if [ -n "$(find "$base/command.log" -mtime +{max_output_base_age_days})" ]; then
+                echo "Removendo output base ocioso: $base"; rm -rf "$base"
+            fi
+        done
+        """
+        return await (
+            (await self.base())
+            .with_mounted_cache(output_root, dag.cache_volume(f"bazel-output-base-{key}"), sharing=CacheSharingMode.LOCKED, owner="developer")
+            .with_mounted_cache(REPOSITORY_CACHE_DIR, dag.cache_volume("bazel-repository-cache"), owner="developer")
+            .with_mounted_cache(DISK_CACHE_DIR, dag.cache_volume("bazel-disk-cache"), owner="developer")
+            # Sempre reexecuta: o resultado depende do estado atual dos volumes
+            .with_env_variable("CACHE_BUSTER", str(time.time()))
+            .with_exec(["bash", "-c", script])
+            .stdout()
+        )
 
     # --- Internals ---
 
@@ -219,28 +948,367 @@ class Bazel:
         try: return int(version.split('.')[0]) >= 7
         except: return True
 
-    async def _run_bazel(self, source: Directory, args: list[str], version: Optional[str], ssh_key: Optional[Secret], ssh_dir: Optional[Secret], netrc: Optional[Secret]) -> str:
-        return await (
-            self._setup_env(source, version, ssh_dir, netrc)
-            .with_exec(["bazel"] + args)
+    def _output_base_key(self, version: Optional[str], bzlmod: bool, config_flags: list[str]) -> str:
+        """Chave do output base: versão do Bazel, bzlmod e flags que alteram a configuração."""
+        raw = json.dumps([version or "default", bzlmod, sorted(config_flags)])
+        return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+    def _supports_vendor(self, version: Optional[str]) -> bool:
+        """`bazel vendor` existe a partir do Bazel 7.1."""
+        if not version: return True
+        try: return tuple(int(p) for p in version.split(".")[:2]) >= (7, 1)
+        except ValueError: return False
+
+    def _disable_download_flag(self, version: Optional[str]) -> str:
+        """Proíbe downloads de repositórios externos; a flag deixou de ser experimental no Bazel 7.1."""
+        return "--repository_disable_download" if self._supports_vendor(version) else "--experimental_repository_disable_download"
+
+    async def _resolve_version(self, source: Directory, bazel_version: Optional[str]) -> Optional[str]:
+        """Versão pedida ou a do .bazelversion (None = bazelisk decide)."""
+        if bazel_version:
+            return bazel_version
+        if await source.exists(".bazelversion"):
+            return (await source.file(".bazelversion").contents()).strip()
+        return None
+
+    async def _vendor_key(self, source: Directory, version: Optional[str], bzlmod: bool) -> str:
+        """Digest das definições de dependências externas: MODULE.bazel(.lock) ou WORKSPACE + .bzl."""
+        if bzlmod and await source.exists("MODULE.bazel.lock"):
+            include = ["MODULE.bazel", "MODULE.bazel.lock"]
+        else:
+            include = sorted(GLOBAL_FILES - {".bazelrc", ".bazelversion"}) + ["**/*.bzl"]
+        raw = json.dumps([await source.filter(include=include).digest(), version or "default", bzlmod])
+        return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+    async def _offline_snapshot(
+        self,
+        source: Directory,
+        bzlmod: bool,
+        bazel_version: Optional[str],
+        ssh_key: Optional[Secret],
+        ssh_dir: Optional[Directory],
+        netrc: Optional[Secret],
+        vendor_snapshot: Optional[Directory],
+        offline: bool
+    ) -> Optional[Directory]:
+        """
+        Snapshot para o modo offline: o informado, ou o do cache volume gerado por prefetch_deps.
+        Offline nunca baixa: sem snapshot para o digest atual, falha imediatamente.
+        """
+        if vendor_snapshot or not offline:
+            return vendor_snapshot
+        version = await self._resolve_version(source, bazel_version)
+        key = await self._vendor_key(source, version, bzlmod)
+        lookup = (
+            dag.container()
+            .from_("alpine:latest")
+            .with_mounted_cache(VENDOR_CACHE_DIR, dag.cache_volume("bazel-vendor-snapshots"), sharing=CacheSharingMode.LOCKED)
+            # O conteúdo do volume muda fora do grafo do Dagger: nunca reaproveitar o resultado do exec
+            .with_env_variable("CACHE_BUSTER", str(time.time()))
+            .with_exec(
+                ["sh", "-c", f"test -f {VENDOR_CACHE_DIR}/{key}/.complete && cp -a {VENDOR_CACHE_DIR}/{key} /tmp/bazel-vendor"],
+                expect=ReturnType.ANY,
+            )
+        )
+        if await lookup.exit_code() != 0:
+            raise Exception(
+                f"Modo offline sem snapshot de dependências para o digest {key}: "
+                "rode prefetch-deps antes ou passe --vendor-snapshot"
+            )
+        return lookup.directory("/tmp/bazel-vendor")
+
+    def _bzlmod_flags(self, bzlmod: bool, version: Optional[str]) -> list[str]:
+        if not bzlmod and self._is_version_ge_7(version):
+            return ["--noenable_bzlmod"]
+        return []
+
+    async def _run_bazel(self, ctr: Container, args: list[str], cache_report: bool = False) -> str:
+        if not cache_report:
+            return await ctr.with_exec(["bazel"] + args).stdout()
+
+        # Com remote cache, lemos o BEP da invocação para reportar o hit rate
+        bep_file = "/tmp/invocation_bep.json"
+        ctr = ctr.with_exec(["bazel"] + args + [f"--build_event_json_file={bep_file}"])
+        output = await ctr.stdout()
+        report = await self._read_bep(ctr.file(bep_file))
+        if report is None:
+            return output
+        return f"{output}\n{report.cache_summary()}\n"
+
+    async def _load_graph(self, graph: File, input_format: str, normalize: bool) -> GraphIndex:
+        builder = GraphBuilder(normalize=normalize)
+        fmt = input_format
+        if fmt == "auto":
+            try:
+                fmt = detect_format(await graph.contents(limit_lines=1))
+            except Exception:
+                fmt = "proto"
+
+        if fmt == "proto":
+            # Binário: exporta para o filesystem do módulo e decodifica os bytes
+            with tempfile.TemporaryDirectory() as tmp:
+                path = await graph.export(os.path.join(tmp, "graph.pb"))
+                with open(path, "rb") as f:
+                    builder.feed_proto(f.read())
+        else:
+            async for line in iter_lines(graph):
+                builder.feed_line(line, fmt)
+        return builder.build()
+
+    async def _read_bep(self, bep: File) -> Optional[BepReport]:
+        """Agrega um arquivo BEP JSON em streaming. Retorna None se o arquivo não existe."""
+        report = BepReport()
+        try:
+            async for line in iter_lines(bep):
+                report.feed_line(line)
+        except Exception:
+            return None
+        return report
+
+    async def _aggregate_junit(self, ctr: Container, aggregator: JUnitAggregator, junit_dir: str = "/tmp/junit") -> None:
+        """Empacota os XMLs num único tar (uma transferência) e os agrega em streaming no host."""
+        tar = ctr.with_exec(["tar", "-C", junit_dir, "-cf", "/tmp/junit.tar", "."]).file("/tmp/junit.tar")
+        with tempfile.TemporaryDirectory() as tmp:
+            aggregator.feed_tar(await tar.export(os.path.join(tmp, "junit.tar")))
+
+    def _junit_file(self, aggregator: JUnitAggregator) -> File:
+        """Grava o junit.xml no workdir do módulo e o carrega como File, sem montá-lo em memória."""
+        with open("junit.xml", "w", encoding="utf-8") as out:
+            aggregator.write_junit_xml(out)
+        aggregator.close()
+        return dag.current_module().workdir_file("junit.xml")
+
+    def _history_container(self) -> Container:
+        # LOCKED: leitura e escrita do histórico não se intercalam entre pipelines
+        return (
+            dag.container()
+            .from_("alpine:latest")
+            .with_mounted_cache(TEST_HISTORY_DIR, dag.cache_volume("bazel-test-history"), sharing=CacheSharingMode.LOCKED)
+            .with_env_variable("CACHE_BUSTER", str(time.time()))
+        )
+
+    async def _load_test_history(self, key: str) -> TestHistory:
+        path = f"{TEST_HISTORY_DIR}/{key}.json"
+        raw = await self._history_container().with_exec(["sh", "-c", f"cat {path} 2>/dev/null || echo '{{}}'"]).stdout()
+        try:
+            return TestHistory(json.loads(raw))
+        except json.JSONDecodeError:
+            print(f"Aviso: histórico de testes '{key}' inválido, recomeçando do zero")
+            return TestHistory()
+
+    async def _save_test_history(self, key: str, history: TestHistory) -> None:
+        await (
+            self._history_container()
+            .with_new_file("/tmp/test_history.json", json.dumps(history.to_dict()))
+            .with_exec(["cp", "/tmp/test_history.json", f"{TEST_HISTORY_DIR}/{key}.json"])
+            .sync()
+        )
+
+    async def _query_cache_key(self, source: Directory, bazel_version: Optional[str], bzlmod: bool, query_args: list[str]) -> str:
+        """
+        Chave do cache de query: digest dos arquivos de definição do build (BUILD, .bzl,
+        MODULE/WORKSPACE, .bazelrc e os rc que ele importa, .bazelignore), lista de arquivos
+        do repo (afeta `glob()`), versão do Bazel, bzlmod e a expressão/flags da query.
+        Não inicia o Bazel.
+        """
+        definitions = source.filter(include=(
+            [f"**/{name}" for name in sorted(BUILD_FILES)] + ["**/*.bzl"] + sorted(GLOBAL_FILES)
+            + [".bazelignore"] + await self._workspace_rc_files(source)
+        ))
+        files = await source.filter(exclude=[".git"]).glob("**/*")
+        raw = json.dumps([
+            await definitions.digest(),
+            hashlib.sha256("\n".join(sorted(files)).encode()).hexdigest(),
+            bazel_version or "default",
+            bzlmod,
+            query_args,
+        ])
+        return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+    async def _workspace_rc_files(self, source: Directory) -> list[str]:
+        """O .bazelrc e os arquivos que ele importa (import/try-import %workspace%/...), recursivamente."""
+        found, pending = set(), [".bazelrc"]
+        while pending:
+            path = pending.pop()
+            if path in found:
+                continue
+            found.add(path)
+            if await source.exists(path):
+                pending += rc_imports(await source.file(path).contents())
+        return sorted(found)
+
+    def _query_cache_container(self) -> Container:
+        return (
+            dag.container()
+            .from_("alpine:latest")
+            .with_mounted_cache(QUERY_CACHE_DIR, dag.cache_volume("bazel-query-cache"))
+            # O conteúdo do volume muda fora do grafo do Dagger: nunca reaproveitar o resultado do exec
+            .with_env_variable("CACHE_BUSTER", str(time.time()))
+        )
+
+    async def _cached_query(self, key: str, name: str) -> Optional[File]:
+        """Retorna o resultado em cache (como /tmp/<name>) ou None num miss."""
+        entry = f"{QUERY_CACHE_DIR}/{key}"
+        lookup = self._query_cache_container().with_exec(
+            ["sh", "-c", f'test -f {entry} && touch {entry} && cp {entry} "/tmp/{name}"'],
+            expect=ReturnType.ANY,
+        )
+        if await lookup.exit_code() != 0:
+            return None
+        return lookup.file(f"/tmp/{name}")
+
+    async def _store_query(self, key: str, result: File) -> None:
+        """Grava o resultado e mantém só as QUERY_CACHE_MAX_ENTRIES entradas usadas mais recentemente."""
+        await (
+            self._query_cache_container()
+            .with_mounted_file("/tmp/query_result", result)
+            .with_exec(["sh", "-c", (
+                f"cp /tmp/query_result {QUERY_CACHE_DIR}/{key}.tmp && mv {QUERY_CACHE_DIR}/{key}.tmp {QUERY_CACHE_DIR}/{key}; "
+                f"cd {QUERY_CACHE_DIR} && ls -1t | tail -n +{QUERY_CACHE_MAX_ENTRIES + 1} | xargs -r rm -f"
+            )])
+            .sync()
+        )
+
+    def _remote_cache_flags(self, enabled: bool) -> list[str]:
+        if not enabled:
+            return []
+        return [f"--remote_cache=grpc://{REMOTE_CACHE_HOST}:9092", "--remote_upload_local_results=true"]
+
+    async def _affected_targets(
+        self,
+        ctr: Container,
+        source: Directory,
+        base_ref: str,
+        universe: list[str],
+        extra_flags: list[str],
+        tests_only: bool
+    ) -> Optional[list[str]]:
+        """
+        Calcula os targets afetados desde o merge-base com 'base_ref'.
+        Retorna None quando a mudança exige o grafo inteiro (ex: MODULE.bazel).
+        O diff roda no `source` recebido, antes do filtro de .gitignore/.bazelignore do `ctr`.
+        """
+        # 1. Arquivos alterados (commits + working tree) em relação ao merge-base
+        diff = await (
+            (await self.base())
+            .with_mounted_directory("/src", source)
+            .with_workdir("/src")
+            .with_env_variable("BASE_REF", base_ref)
+            .with_exec(["sh", "-c", CHANGED_FILES_CMD])
             .stdout()
         )
+        changed, deleted = parse_name_status(diff)
+        if not changed:
+            return []
 
-    def _setup_env(
+        # 2. Pacotes existentes, para mapear arquivo -> pacote dono
+        packages_out = await ctr.with_exec(["bazel", "query", "//...", "--output=package"] + extra_flags).stdout()
+        packages = {p.strip() for p in packages_out.splitlines() if p.strip()}
+        root_build = await ctr.with_exec(["sh", "-c", "ls BUILD BUILD.bazel 2>/dev/null || true"]).stdout()
+        if root_build.strip():
+            packages.add("")  # pacote raiz (BUILD na raiz do repo)
+
+        changes = classify_changes(changed, deleted, packages)
+        if changes.full_rebuild:
+            print(f"Affected: grafo inteiro ({changes.reason})")
+            return None
+        if changes.empty:
+            return []
+
+        # 3. Arquivos .bzl: pacotes cujos BUILD carregam (direta ou indiretamente) o arquivo
+        seeds = set(changes.labels) | {package_pattern(p) for p in changes.packages}
+        if changes.bzl_files:
+            rbuild = await ctr.with_exec(
+                ["bazel", "query", "--universe_scope=//...", "--order_output=no",
+                 f"rbuildfiles({', '.join(sorted(changes.bzl_files))})"] + extra_flags
+            ).stdout()
+            for label in rbuild.splitlines():
+                if label.startswith("//") and ":" in label:
+                    seeds.add(package_pattern(label[2:].split(":", 1)[0]))
+
+        # 4. rdeps dentro do universo pedido. Arquivos que não são targets são
+        # ignorados via --keep_going (exit code 3 = resultado parcial).
+        expr = f"rdeps(set({' '.join(universe)}), set({' '.join(sorted(seeds))}))"
+        expr = f"tests({expr})" if tests_only else f"kind(rule, {expr})"
+        result = ctr.with_exec(
+            ["bazel", "query", expr, "--keep_going", "--output=label"] + extra_flags,
+            expect=ReturnType.ANY,
+        )
+        if await result.exit_code() not in (0, 3):
+            raise Exception(f"bazel query falhou:\n{await result.stderr()}")
+        return [t.strip() for t in (await result.stdout()).splitlines() if t.strip()]
+
+    async def _run_test_shard(
+        self,
+        ctr: Container,
+        index: int,
+        targets: list[str],
+        test_output: str,
+        extra_flags: list[str]
+    ) -> tuple[int, BepReport, Container]:
+        """
+        Roda um shard num container próprio. Repository/disk cache são compartilhados;
+        o output base é montado com sharing PRIVATE, então cada shard concorrente
+        recebe sua própria instância e não disputa o lock do servidor Bazel.
+        """
+        targets_file = f"/tmp/shard_{index}_targets.txt"
+        bep_file = "/tmp/shard_bep.json"
+        cmd = (
+            f"bazel test --target_pattern_file={targets_file} "
+            f"--test_output={test_output} {' '.join(extra_flags)} "
+            f"--build_event_json_file={bep_file} --curses=no; rc=$?; "
+            f"{TESTLOGS_COLLECT_CMD}; exit $rc"
+        )
+        shard = (
+            ctr
+            .with_new_file(targets_file, "\n".join(targets))
+            .with_exec(["sh", "-c", cmd], expect=ReturnType.ANY)
+        )
+        exit_code = await shard.exit_code()
+
+        report = await self._read_bep(shard.file(bep_file))
+        if report is None:
+            print(f"Aviso: shard {index} não gerou BEP")
+            report = BepReport()
+        return exit_code, report, shard
+
+    async def _setup_env(
         self, 
         source: Directory, 
         bazel_version: Optional[str],
         ssh_key: Optional[Secret],
         ssh_dir: Optional[Directory],
-        netrc: Optional[Secret]
+        netrc: Optional[Secret],
+        remote_cache: bool = False,
+        offline: bool = False,
+        bzlmod: bool = True,
+        config_flags: list[str] = [],
+        vendor_snapshot: Optional[Directory] = None
     ) -> Container:
         home_dir = "/home/developer"
+        source = await prepare_source(source, "bazel", bazelignore=True)
+
+        # A versão pedida (ou a do .bazelversion) é pré-carregada na imagem base
+        version = await self._resolve_version(source, bazel_version)
+        prefetch = [version] if version and RELEASE_VERSION.match(version) else []
+
         ctr = (
-            self.base()
+            (await self.base(bazel_versions=prefetch, offline=offline))
             .with_workdir("/src")
             .with_mounted_directory("/src", source)
-            .with_mounted_cache("/home/developer/.cache/bazel", dag.cache_volume("bazel-repo-cache"), owner="developer")
+            # Output base (servidor, analysis cache) isolado por configuração. PRIVATE: pipelines
+            # concorrentes com a mesma chave recebem outra instância em vez de disputar o lock.
+            .with_mounted_cache(
+                f"{home_dir}/.cache/bazel",
+                dag.cache_volume(f"bazel-output-base-{self._output_base_key(version, bzlmod, config_flags)}"),
+                sharing=CacheSharingMode.PRIVATE,
+                owner="developer",
+            )
+            # Repository cache e disk cache são endereçados por conteúdo: seguros para compartilhar
+            .with_mounted_cache(REPOSITORY_CACHE_DIR, dag.cache_volume("bazel-repository-cache"), owner="developer")
+            .with_mounted_cache(DISK_CACHE_DIR, dag.cache_volume("bazel-disk-cache"), owner="developer")
             .with_mounted_cache("/home/developer/.cache/bazelisk", dag.cache_volume("bazelisk-cache"), owner="developer")
+            .with_new_file(f"{home_dir}/.bazelrc", CACHE_BAZELRC, owner="developer")
         )
         # Configure SSH DIR
         if ssh_dir:
@@ -265,5 +1333,24 @@ class Bazel:
         # 3. Configuração de Versão
         if bazel_version:
             ctr = ctr.with_env_variable("USE_BAZEL_VERSION", bazel_version)
+
+        # 4. Remote cache embutido (as flags --remote_cache vão no comando build/test)
+        if remote_cache:
+            ctr = ctr.with_service_binding(REMOTE_CACHE_HOST, self.remote_cache_service())
+
+        # 5. Snapshot de dependências (prefetch_deps): repository cache e vendor dir apontam
+        # para o snapshot, então nenhum download é necessário. Offline, um snapshot incompleto
+        # falha no repositório que falta em vez de ir para a rede.
+        if vendor_snapshot:
+            bazelrc = CACHE_BAZELRC + f"common --repository_cache={VENDOR_MOUNT}/repository_cache\n"
+            if await vendor_snapshot.exists("vendor"):
+                bazelrc += f"common --vendor_dir={VENDOR_MOUNT}/vendor\n"
+            if offline:
+                bazelrc += f"common {self._disable_download_flag(version)}\n"
+            ctr = (
+                ctr
+                .with_mounted_directory(VENDOR_MOUNT, vendor_snapshot, owner="developer")
+                .with_new_file(f"{home_dir}/.bazelrc", bazelrc, owner="developer")
+            )
             
         return ctr
\ No newline at end of file
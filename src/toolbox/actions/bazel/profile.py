@@ -0,0 +1,166 @@
+"""
+Análise incremental do JSON trace profile do Bazel (`--profile`).
+
+O Bazel grava um evento por linha dentro de `traceEvents`, então o arquivo é
+consumido linha a linha: só agregados (fases, mnemonics, categorias) e um heap
+com as N actions mais lentas ficam em memória.
+"""
+import heapq
+import json
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+# Categorias (ProfilerTask.description) relevantes para o breakdown
+ACTION_CATEGORIES = {"action processing"}
+CRITICAL_PATH_CATEGORY = "critical path component"
+PHASE_MARKER_CATEGORY = "build phase marker"
+
+# Fases reportadas no resumo, a partir dos marcadores de fase do Bazel
+PHASE_GROUPS = {
+    "Launch Blaze": "startup",
+    "Initialize command": "startup",
+    "Load and analyze dependencies": "analysis",
+    "Analyze licenses": "analysis",
+    "Prepare for build": "execution",
+    "Build artifacts": "execution",
+    "Complete build": "finish",
+}
+
+
+def _breakdown_bucket(category: str) -> Optional[str]:
+    category = category.lower()
+    if "fetch" in category or "repository" in category:
+        return "fetch"
+    if "remote" in category:
+        return "remote"
+    if "local" in category or "sandbox" in category or "subprocess" in category or "worker" in category:
+        return "local"
+    return None
+
+
+@dataclass
+class ProfileReport:
+    top_n: int = 20
+    other_data: dict = field(default_factory=dict)
+    slowest: list = field(default_factory=list)  # heap de (dur_us, seq, name, mnemonic, target)
+    mnemonics: dict[str, list[int]] = field(default_factory=dict)  # mnemonic -> [count, total_us]
+    categories: dict[str, int] = field(default_factory=dict)  # categoria -> total_us
+    breakdown: dict[str, int] = field(default_factory=dict)  # fetch/remote/local -> total_us
+    critical_path: list[tuple[int, str]] = field(default_factory=list)
+    phase_markers: list[tuple[int, str]] = field(default_factory=list)
+    end_us: int = 0
+    events: int = 0
+    _seq: int = 0
+
+    def feed_lines(self, lines: Iterable[str]) -> "ProfileReport":
+        for line in lines:
+            self.feed_line(line)
+        return self
+
+    def feed_line(self, line: str) -> None:
+        line = line.strip().rstrip(",")
+        if not line or line in ("]", "]}", "}"):
+            return
+        if line.startswith('{"otherData"'):
+            # Cabeçalho: '{"otherData":{...},"traceEvents":[' (pode trazer o 1º evento junto)
+            head, _, rest = line.partition('"traceEvents":[')
+            try:
+                self.other_data = json.loads(head.rstrip(",") + "}").get("otherData", {})
+            except json.JSONDecodeError:
+                pass
+            if rest.strip():
+                self.feed_line(rest)
+            return
+        try:
+            event = json.loads(line)
+        except json.JSONDecodeError:
+            return
+        if isinstance(event, dict):
+            self.feed_event(event)
+
+    def feed_event(self, event: dict) -> None:
+        self.events += 1
+        category = event.get("cat", "")
+        ts = int(event.get("ts", 0))
+        dur = int(event.get("dur", 0))
+        self.end_us = max(self.end_us, ts + dur)
+
+        if category == PHASE_MARKER_CATEGORY:
+            self.phase_markers.append((ts, event.get("name", "")))
+            return
+        if event.get("ph") != "X":
+            return
+
+        self.categories[category] = self.categories.get(category, 0) + dur
+        bucket = _breakdown_bucket(category)
+        if bucket:
+            self.breakdown[bucket] = self.breakdown.get(bucket, 0) + dur
+
+        if category == CRITICAL_PATH_CATEGORY:
+            self.critical_path.append((dur, event.get("name", "")))
+        elif category in ACTION_CATEGORIES:
+            args = event.get("args", {})
+            name = event.get("name", "")
+            mnemonic = args.get("mnemonic") or (name.split(" ", 1)[0] if name else "?")
+            stats = self.mnemonics.setdefault(mnemonic, [0, 0])
+            stats[0] += 1
+            stats[1] += dur
+            self._seq += 1
+            item = (dur, self._seq, name, mnemonic, args.get("target", ""))
+            if len(self.slowest) < self.top_n:
+                heapq.heappush(self.slowest, item)
+            elif dur > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, item)
+
+    # --- Saídas ---
+
+    def phases(self) -> dict[str, int]:
+        """Duração (us) de startup/analysis/execution/finish a partir dos marcadores."""
+        markers = sorted(self.phase_markers)
+        totals: dict[str, int] = {}
+        for i, (ts, name) in enumerate(markers):
+            end = markers[i + 1][0] if i + 1 < len(markers) else self.end_us
+            group = PHASE_GROUPS.get(name, name)
+            totals[group] = totals.get(group, 0) + max(end - ts, 0)
+        return totals
+
+    def to_dict(self) -> dict:
+        return {
+            "build_id": self.other_data.get("build_id"),
+            "events": self.events,
+            "phases_ms": {k: v // 1000 for k, v in self.phases().items()},
+            "breakdown_ms": {k: v // 1000 for k, v in self.breakdown.items()},
+            "critical_path": [{"duration_ms": d // 1000, "name": n} for d, n in self.critical_path],
+            "slowest_actions": [
+                {"duration_ms": d // 1000, "name": n, "mnemonic": m, "target": t}
+                for d, _, n, m, t in sorted(self.slowest, reverse=True)
+            ],
+            "mnemonics": [
+                {"mnemonic": m, "count": c, "total_ms": t // 1000}
+                for m, (c, t) in self._top_mnemonics()
+            ],
+        }
+
+    def to_markdown(self) -> str:
+        md_lines = ["## Bazel Profile Report", ""]
+
+        md_lines += ["### Phases", "", "| Phase | Time |", "| :--- | ---: |"]
+        md_lines += [f"| {phase} | {us / 1e6:.2f}s |" for phase, us in self.phases().items()]
+
+        md_lines += ["", "### Execution Breakdown", "", "| Kind | Time |", "| :--- | ---: |"]
+        md_lines += [f"| {kind} | {us / 1e6:.2f}s |" for kind, us in sorted(self.breakdown.items())]
+
+        if self.critical_path:
+            total = sum(d for d, _ in self.critical_path)
+            md_lines += ["", f"### Critical Path ({total / 1e6:.2f}s)", "", "| Time | Action |", "| ---: | :--- |"]
+            md_lines += [f"| {d / 1e6:.2f}s | {n} |" for d, n in self.critical_path]
+
+        md_lines += ["", f"### Top {self.top_n} Slowest Actions", "", "| Time | Mnemonic | Action |", "| ---: | :--- | :--- |"]
+        md_lines += [f"| {d / 1e6:.2f}s | {m} | {n} |" for d, _, n, m, _ in sorted(self.slowest, reverse=True)]
+
+        md_lines += ["", "### Mnemonics", "", "| Mnemonic | Count | Total |", "| :--- | ---: | ---: |"]
+        md_lines += [f"| {m} | {c} | {t / 1e6:.2f}s |" for m, (c, t) in self._top_mnemonics()]
+        return "\n".join(md_lines)
+
+    def _top_mnemonics(self) -> list:
+        return sorted(self.mnemonics.items(), key=lambda kv: -kv[1][1])[: self.top_n]
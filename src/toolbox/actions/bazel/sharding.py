@@ -0,0 +1,32 @@
+"""
+Divisão de targets de teste em shards balanceados.
+
+Usa o histórico de duração (ms por label) quando disponível; targets sem
+histórico recebem a mediana das durações conhecidas. Sem histórico algum, o
+balanceamento cai para contagem de targets.
+"""
+import heapq
+import statistics
+
+
+def balance_shards(targets: list[str], durations: dict[str, int], shards: int) -> list[list[str]]:
+    """
+    Distribui `targets` em até `shards` grupos com tempo total parecido
+    (heurística LPT: maior duração primeiro, sempre no shard mais leve).
+    """
+    shards = max(1, min(shards, len(targets)))
+    known = [durations[t] for t in targets if durations.get(t, 0) > 0]
+    default = int(statistics.median(known)) if known else 1
+
+    weighted = sorted(((durations.get(t) or default, t) for t in targets), key=lambda w: (-w[0], w[1]))
+    heap = [(0, index) for index in range(shards)]
+    buckets: list[list[str]] = [[] for _ in range(shards)]
+    for weight, target in weighted:
+        load, index = heapq.heappop(heap)
+        buckets[index].append(target)
+        heapq.heappush(heap, (load + weight, index))
+    return [sorted(bucket) for bucket in buckets if bucket]
+
+
+def estimated_ms(shard: list[str], durations: dict[str, int]) -> int:
+    return sum(durations.get(t, 0) for t in shard)
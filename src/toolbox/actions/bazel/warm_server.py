@@ -0,0 +1,82 @@
+"""
+Servidor HTTP mínimo que mantém um Bazel server (JVM + analysis cache) aquecido.
+
+Roda dentro do container do serviço `Bazel.server` (python3 do Ubuntu, só stdlib).
+Protocolo:
+    POST /run  {"command": "query", "args": ["deps(//...)"]}
+        -> {"exit_code": 0, "stdout": "...", "stderr": "...", "duration_ms": 123}
+    GET /health -> {"status": "ok", "requests": N}
+"""
+import json
+import os
+import subprocess
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Sem "run": o serviço fica exposto na porta e não deve executar binários arbitrários do workspace
+ALLOWED_COMMANDS = {"build", "test", "query", "cquery", "aquery", "info"}
+EXTRA_FLAGS = os.environ.get("BAZEL_EXTRA_FLAGS", "").split()
+WORKSPACE = os.environ.get("BAZEL_WORKSPACE", "/src")
+
+# O Bazel server atende um comando por vez; serializamos aqui para não enfileirar no lock dele
+_lock = threading.Lock()
+_requests = 0
+
+
+def run_bazel(command, args):
+    global _requests
+    # Flags logo após o comando: depois dos args elas cairiam após um "--" e virariam alvos
+    cmd = ["bazel", command] + EXTRA_FLAGS + list(args)
+    with _lock:
+        _requests += 1
+        start = time.monotonic()
+        proc = subprocess.run(cmd, cwd=WORKSPACE, capture_output=True, text=True)
+        duration_ms = int((time.monotonic() - start) * 1000)
+    return {"exit_code": proc.returncode, "stdout": proc.stdout, "stderr": proc.stderr, "duration_ms": duration_ms}
+
+
+class Handler(BaseHTTPRequestHandler):
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._reply(200, {"status": "ok", "requests": _requests})
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/run":
+            self._reply(404, {"error": "not found"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            command, args = request["command"], request.get("args", [])
+        except (ValueError, KeyError):
+            self._reply(400, {"error": "esperado JSON {command, args}"})
+            return
+        if command not in ALLOWED_COMMANDS:
+            self._reply(400, {"error": f"comando não permitido: {command}"})
+            return
+        self._reply(200, run_bazel(command, args))
+
+
+def main():
+    # Aquecimento: sobe o servidor Bazel e, opcionalmente, carrega os pacotes
+    run_bazel("info", [])
+    warmup = os.environ.get("WARMUP_QUERY")
+    if warmup:
+        run_bazel("query", [warmup, "--output=label"])
+    port = int(os.environ.get("PORT", "8080"))
+    print(f"Bazel warm server ouvindo na porta {port}", flush=True)
+    ThreadingHTTPServer(("0.0.0.0", port), Handler).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
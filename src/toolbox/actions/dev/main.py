@@ -1,7 +1,9 @@
 import dagger
-from dagger import object_type, function, Directory, Doc
+from dagger import object_type, function, Directory, Doc, Ignore
 from typing import Annotated
 
+from ...common.sources import COMMON_IGNORE
+
 @object_type
 class Dev:
     """
@@ -13,7 +15,7 @@ class Dev:
     async def new_action(
         self,
         name: Annotated[str, Doc("O nome da nova action (snake_case), ex: 'k8s_utils'")],
-        source: Annotated[Directory, Doc("O diretório 'src' do seu toolbox")]
+        source: Annotated[Directory, Doc("O diretório 'src' do seu toolbox"), Ignore(COMMON_IGNORE)]
     ) -> Directory:
         """
         Gera o esqueleto de uma nova action e registra automaticamente no main.py.
@@ -0,0 +1,95 @@
+"""
+Branch health report.
+
+A single `git for-each-ref` walks every local and remote branch; the
+`%(ahead-behind:<main>)` atom (git >= 2.41) computes all ahead/behind counts
+in one traversal using commit-graph generation numbers. A branch with nothing
+ahead of main is merged, so no per-branch `git branch --merged` is needed.
+"""
+import json
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+FIELD_SEP = "\x1f"
+SORT_KEYS = ("behind", "ahead", "date", "name", "author")
+
+
+def for_each_ref_format(main_ref: str) -> str:
+    return "%1f".join([
+        "%(refname)",
+        "%(symref)",
+        "%(committerdate:iso-strict)",
+        "%(authorname)",
+        f"%(ahead-behind:{main_ref})",
+    ])
+
+
+@dataclass(slots=True)
+class BranchInfo:
+    name: str
+    remote: bool
+    date: str
+    author: str
+    ahead: int
+    behind: int
+
+    @property
+    def merged(self) -> bool:
+        return self.ahead == 0
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "merged": self.merged}
+
+
+def parse_ref_line(line: str) -> Optional[BranchInfo]:
+    """One `for-each-ref` line; symbolic refs (origin/HEAD) are skipped."""
+    fields = line.split(FIELD_SEP)
+    if len(fields) != 5 or fields[1]:
+        return None
+    refname, _, date, author, counts = fields
+    ahead, _, behind = counts.partition(" ")
+    if refname.startswith("refs/heads/"):
+        name, remote = refname[len("refs/heads/"):], False
+    elif refname.startswith("refs/remotes/"):
+        name, remote = refname[len("refs/remotes/"):], True
+    else:
+        return None
+    return BranchInfo(name, remote, date, author, int(ahead or 0), int(behind or 0))
+
+
+def sort_branches(branches: list[BranchInfo], sort_by: str = "behind", descending: bool = True) -> list[BranchInfo]:
+    if sort_by not in SORT_KEYS:
+        raise Exception(f"Invalid sort key '{sort_by}' (expected one of: {', '.join(SORT_KEYS)})")
+    return sorted(branches, key=lambda b: (getattr(b, sort_by), b.name), reverse=descending)
+
+
+def report_dict(branches: list[BranchInfo], main_ref: str) -> dict:
+    return {
+        "main": main_ref,
+        "total": len(branches),
+        "merged": sum(1 for b in branches if b.merged),
+        "branches": [b.to_dict() for b in branches],
+    }
+
+
+def report_markdown(branches: list[BranchInfo], main_ref: str, limit: int = 0) -> str:
+    merged = sum(1 for b in branches if b.merged)
+    md_lines = [
+        "## Branch Report",
+        f"**Main:** `{main_ref}` | **Branches:** {len(branches)} | **Merged:** {merged} | **Unmerged:** {len(branches) - merged}",
+        "",
+        "| Branch | Merged | Ahead | Behind | Last Commit | Author |",
+        "| :--- | :---: | ---: | ---: | :--- | :--- |",
+    ]
+    shown = branches[:limit] if limit else branches
+    for b in shown:
+        md_lines.append(
+            f"| `{b.name}` | {'✅' if b.merged else ''} | {b.ahead} | {b.behind} | {b.date[:10]} | {b.author.replace('|', '/')} |"
+        )
+    if len(shown) < len(branches):
+        md_lines += ["", f"_{len(branches) - len(shown)} more branches in branch_report.json._"]
+    return "\n".join(md_lines)
+
+
+def report_json(branches: list[BranchInfo], main_ref: str) -> str:
+    return json.dumps(report_dict(branches, main_ref), indent=2)
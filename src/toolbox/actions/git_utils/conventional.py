@@ -0,0 +1,181 @@
+"""
+Conventional Commits engine.
+
+Commits come from `git log -z` (one NUL-terminated record per commit, fields
+separated by 0x1f). `LOG_TO_LINES` turns that stream into one line per commit
+(newlines inside the message become 0x02, which `str.splitlines` leaves alone), so it can be read with
+`iter_lines` and parsed once into `CommitRecord`s. Records are
+cached by SHA, and lint, changelog and SemVer suggestions all read from the
+same `CommitModel`.
+"""
+import json
+import re
+from dataclasses import dataclass, field, asdict
+from typing import Optional
+
+# Format for `git log -z`: sha, parents, author, author date (ISO), raw message
+LOG_FORMAT = "%H%x1f%P%x1f%an%x1f%aI%x1f%B"
+FIELD_SEP = "\x1f"
+NEWLINE_SEP = "\x02"
+LOG_TO_LINES = "tr '\\n\\000' '\\002\\n'"
+# Bump when CommitRecord or the parser changes: cached records of older versions are ignored
+CACHE_VERSION = 1
+
+TYPES = ("feat", "fix", "docs", "style", "refactor", "perf", "test", "build", "ci", "chore", "revert")
+CHANGELOG_SECTIONS = [
+    ("feat", "✨ Features"),
+    ("fix", "🐛 Bug Fixes"),
+    ("perf", "⚡ Performance"),
+    ("refactor", "♻️ Refactoring"),
+    ("docs", "📝 Documentation"),
+    ("revert", "⏪ Reverts"),
+]
+
+_HEADER = re.compile(r"^(?P<type>[A-Za-z]+)(?:\((?P<scope>[^()\r\n]*)\))?(?P<bang>!)?: (?P<description>\S.*)$")
+_FOOTER = re.compile(r"^(?P<token>BREAKING[ -]CHANGE|[A-Za-z][A-Za-z-]*)(?:: | #)(?P<value>.*)$")
+_SEMVER = re.compile(r"^(?P<prefix>v?)(?P<major>\d+)\.(?P<minor>\d+)\.(?P<patch>\d+)$")
+
+
+@dataclass
+class CommitRecord:
+    sha: str
+    subject: str
+    author: str = ""
+    date: str = ""
+    merge: bool = False
+    type: Optional[str] = None
+    scope: Optional[str] = None
+    description: str = ""
+    breaking: bool = False
+    footers: dict[str, str] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def valid(self) -> bool:
+        return self.error is None
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, line: str) -> "CommitRecord":
+        return cls(**json.loads(line))
+
+
+def _parse_footers(body: str) -> dict[str, str]:
+    """Footers live in the last paragraph; lines that are not a new token continue the previous value."""
+    paragraphs = [p for p in re.split(r"\n\s*\n", body.strip()) if p.strip()]
+    if not paragraphs:
+        return {}
+    footers: dict[str, str] = {}
+    current = None
+    for line in paragraphs[-1].splitlines():
+        match = _FOOTER.match(line)
+        if match:
+            current = match.group("token")
+            footers[current] = match.group("value").strip()
+        elif current:
+            footers[current] += "\n" + line.strip()
+        else:
+            return {}  # not a footer block
+    return footers
+
+
+def parse_commit(sha: str, parents: str, author: str, date: str, message: str) -> CommitRecord:
+    message = message.strip("\n")
+    subject, _, body = message.partition("\n")
+    record = CommitRecord(sha=sha, subject=subject.strip(), author=author, date=date, merge=len(parents.split()) > 1)
+    if record.merge:
+        return record
+
+    match = _HEADER.match(record.subject)
+    if not match:
+        record.error = "header does not match 'type(scope): description'"
+        return record
+    record.type = match.group("type").lower()
+    record.scope = match.group("scope")
+    record.description = match.group("description")
+    record.footers = _parse_footers(body)
+    record.breaking = bool(match.group("bang")) or any(t in record.footers for t in ("BREAKING CHANGE", "BREAKING-CHANGE"))
+    if record.type not in TYPES:
+        record.error = f"unknown type '{record.type}' (allowed: {', '.join(TYPES)})"
+    return record
+
+
+def parse_log_line(line: str) -> Optional[CommitRecord]:
+    """One commit from `git log -z --format=LOG_FORMAT | LOG_TO_LINES`."""
+    text = line.replace(NEWLINE_SEP, "\n").lstrip("\n")
+    if not text.strip():
+        return None
+    fields = text.split(FIELD_SEP, 4)
+    if len(fields) < 5:
+        return None
+    return parse_commit(*fields)
+
+
+def parse_semver(tag: str) -> Optional[tuple[str, int, int, int]]:
+    match = _SEMVER.match(tag.strip())
+    if not match:
+        return None
+    return match.group("prefix"), int(match.group("major")), int(match.group("minor")), int(match.group("patch"))
+
+
+class CommitModel:
+    """Parsed commits of a revision range (newest first)."""
+
+    def __init__(self, records: list[CommitRecord]):
+        self.records = records
+
+    @property
+    def conventional(self) -> list[CommitRecord]:
+        return [r for r in self.records if not r.merge]
+
+    def lint_errors(self) -> list[CommitRecord]:
+        return [r for r in self.conventional if not r.valid]
+
+    def bump(self) -> str:
+        """'major', 'minor' or 'patch' for the range."""
+        commits = [r for r in self.conventional if r.valid]
+        if any(r.breaking for r in commits):
+            return "major"
+        if any(r.type == "feat" for r in commits):
+            return "minor"
+        return "patch"
+
+    def next_version(self, current: Optional[str]) -> Optional[str]:
+        parsed = parse_semver(current or "")
+        if not parsed:
+            return None
+        prefix, major, minor, patch = parsed
+        bump = self.bump()
+        if bump == "major":
+            return f"{prefix}{major + 1}.0.0"
+        if bump == "minor":
+            return f"{prefix}{major}.{minor + 1}.0"
+        return f"{prefix}{major}.{minor}.{patch + 1}"
+
+    def changelog_markdown(self, title: Optional[str] = None) -> str:
+        commits = [r for r in self.conventional if r.valid]
+        md_lines = [f"## {title}"] if title else []
+
+        def entry(r: CommitRecord) -> str:
+            scope = f"**{r.scope}:** " if r.scope else ""
+            return f"- {scope}{r.description} ({r.sha[:7]})"
+
+        breaking = [r for r in commits if r.breaking]
+        if breaking:
+            md_lines += ["", "### ⚠️ Breaking Changes", ""]
+            for r in breaking:
+                note = r.footers.get("BREAKING CHANGE") or r.footers.get("BREAKING-CHANGE")
+                md_lines.append(entry(r) + (f" — {note.splitlines()[0]}" if note else ""))
+        for commit_type, heading in CHANGELOG_SECTIONS:
+            section = [entry(r) for r in commits if r.type == commit_type]
+            if section:
+                md_lines += ["", f"### {heading}", ""] + section
+        others = [entry(r) for r in commits if r.type not in dict(CHANGELOG_SECTIONS)]
+        if others:
+            md_lines += ["", "### 🔧 Other Changes", ""] + others
+        invalid = [f"- {r.subject} ({r.sha[:7]})" for r in self.lint_errors()]
+        if invalid:
+            md_lines += ["", "### Unclassified", ""] + invalid
+        return "\n".join(md_lines).strip()
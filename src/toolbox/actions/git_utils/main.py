@@ -1,7 +1,16 @@
 import dagger
-from dagger import object_type, function, Directory, Container, dag, Doc
+from dagger import object_type, function, Directory, Container, dag, Doc, Ignore, ReturnType
 from typing import Annotated, Optional
-import re
+import shlex
+import time
+
+from ...common.sources import GIT_ONLY, prepare_source
+from ...common.streaming import iter_lines
+from .branches import SORT_KEYS, BranchInfo, for_each_ref_format, parse_ref_line, report_json, report_markdown, sort_branches
+from .conventional import CACHE_VERSION, LOG_FORMAT, LOG_TO_LINES, CommitModel, CommitRecord, parse_log_line
+
+COMMIT_CACHE_DIR = "/commit-cache"
+LAST_TAG_CMD = "git describe --tags --abbrev=0 2>/dev/null || true"
 
 @object_type
 class GitUtils:
@@ -23,28 +32,19 @@ class GitUtils:
     @function
     async def commit_lint(
         self,
-        source: Annotated[Directory, Doc("The repository directory")],
-        commits_count: Annotated[int, Doc("Number of recent commits to check")] = 5
+        source: Annotated[Directory, Doc("The repository directory"), Ignore(GIT_ONLY)],
+        commits_count: Annotated[int, Doc("Number of recent commits to check")] = 5,
+        rev_range: Annotated[Optional[str], Doc("Revision range to check instead (e.g. origin/main..HEAD)")] = None
     ) -> str:
         """
-        Validates recent commit messages against Conventional Commits pattern.
-        """
-        pattern = r"^(feat|fix|docs|style|refactor|perf|test|build|ci|chore|revert)(\(.+\))?!?: .+"
-        
-        # Get logs from container
-        logs = await (
-            self.base()
-            .with_mounted_directory("/src", source)
-            .with_workdir("/src")
-            .with_exec(["git", "log", f"-{commits_count}", "--pretty=format:%s"])
-            .stdout()
-        )
-        
-        errors = []
-        for line in logs.split('\n'):
-            if not re.match(pattern, line):
-                errors.append(f"❌ Invalid commit message: '{line}'")
-        
+        Validates commit messages (header, body and footers) against the Conventional Commits spec.
+        Merge commits are skipped.
+        """
+        model = await self._commit_model(source, rev_range or "HEAD", None if rev_range else commits_count)
+        if not model.records:
+            return "ℹ️ No commits to check."
+
+        errors = [f"❌ Invalid commit message: '{r.subject}' ({r.sha[:7]}: {r.error})" for r in model.lint_errors()]
         if errors:
             return "\n".join(errors) + "\n\nTip: Use 'type(scope): description' format."
         return "✅ All recent commits follow the convention!"
@@ -52,59 +52,185 @@ class GitUtils:
     @function
     async def changelog(
         self,
-        source: Annotated[Directory, Doc("The repository directory")],
+        source: Annotated[Directory, Doc("The repository directory"), Ignore(GIT_ONLY)],
         since_tag: Annotated[Optional[str], Doc("Starting tag. If None, uses last tag")] = None
     ) -> str:
         """
-        Generates a clean changelog since the specified tag.
-        """
-        start = since_tag if since_tag else "$(git describe --tags --abbrev=0 2>/dev/null || git rev-list --max-parents=0 HEAD)"
-        
-        cmd = f"git log {start}..HEAD --oneline --no-merges"
-        
-        return await (
-            self.base()
-            .with_mounted_directory("/src", source)
-            .with_workdir("/src")
-            .with_exec(["sh", "-c", cmd])
-            .stdout()
-        )
+        Generates a changelog since the specified tag, grouped by commit type with breaking changes first.
+        """
+        start = since_tag or await self._last_tag(source)
+        model = await self._commit_model(source, f"{start}..HEAD" if start else "HEAD")
+        if not model.records:
+            return f"ℹ️ No commits since {start}." if start else "ℹ️ No commits yet."
+        return model.changelog_markdown(f"Changes since {start}" if start else "Changes")
 
     @function
     async def detect_merged_branches(
         self,
-        source: Annotated[Directory, Doc("The repository directory")],
+        source: Annotated[Directory, Doc("The repository directory"), Ignore(GIT_ONLY)],
         main_branch: Annotated[str, Doc("The primary branch (main/master)")] = "main"
     ) -> str:
         """
         Identifies local branches that have already been merged into the main branch.
         """
-        cmd = f"git branch --merged {main_branch} | grep -v '^*' | grep -v '{main_branch}'"
-        
-        output = await (
-            self.base()
-            .with_mounted_directory("/src", source)
-            .with_workdir("/src")
-            .with_exec(["sh", "-c", cmd])
-            .stdout()
-        )
-        
-        if not output.strip():
+        _, branches = await self._branches(source, main_branch, include_remote=False)
+        merged = [b.name for b in branches if b.merged]
+
+        if not merged:
             return "✨ No merged branches found. Your local repo is clean!"
-        return f"🗑️ The following branches can be safely deleted:\n{output}"
+        return "🗑️ The following branches can be safely deleted:\n" + "\n".join(f"  {name}" for name in merged)
+
+    @function
+    async def branch_report(
+        self,
+        source: Annotated[Directory, Doc("The repository directory"), Ignore(GIT_ONLY)],
+        main_branch: Annotated[str, Doc("The primary branch (main/master); falls back to origin/<main_branch>")] = "main",
+        include_remote: Annotated[bool, Doc("Include remote-tracking branches")] = True,
+        sort_by: Annotated[str, Doc(f"Sort key: {', '.join(SORT_KEYS)}")] = "behind",
+        descending: Annotated[bool, Doc("Sort in descending order")] = True,
+        limit: Annotated[int, Doc("Max rows in the markdown table (0 = all); the JSON always has every branch")] = 200
+    ) -> Directory:
+        """
+        Merged status, ahead/behind counts, last commit date and author for every branch, computed in one pass.
+        Returns branch_report.md and branch_report.json.
+        """
+        main_ref, branches = await self._branches(source, main_branch, include_remote)
+        branches = sort_branches(branches, sort_by, descending)
+        return (
+            dag.directory()
+            .with_new_file("branch_report.md", report_markdown(branches, main_ref, limit))
+            .with_new_file("branch_report.json", report_json(branches, main_ref))
+        )
 
     @function
     async def suggest_next_version(
         self,
-        source: Annotated[Directory, Doc("The repository directory")]
+        source: Annotated[Directory, Doc("The repository directory"), Ignore(GIT_ONLY)]
     ) -> str:
         """
-        Analyzes recent commits to suggest the next Semantic Version (SemVer).
+        Analyzes the commits since the last tag to suggest the next Semantic Version (SemVer).
+        """
+        tag = await self._last_tag(source)
+        model = await self._commit_model(source, f"{tag}..HEAD" if tag else "HEAD")
+        if not model.records:
+            return f"ℹ️ No commits since {tag}: nothing to release." if tag else "ℹ️ No commits yet: nothing to release."
+        bump = model.bump()
+        next_version = model.next_version(tag)
+        target = f" → {next_version}" if next_version else ""
+
+        if bump == "major":
+            return f"🚀 Suggested: MAJOR{target} (Incompatible API changes detected)"
+        elif bump == "minor":
+            return f"✨ Suggested: MINOR{target} (New features detected)"
+        return f"🔧 Suggested: PATCH{target} (Only bug fixes or chores detected)"
+
+    # --- Branches ---
+
+    async def _branches(self, source: Directory, main_branch: str, include_remote: bool) -> tuple[str, list[BranchInfo]]:
+        """
+        One for-each-ref over all branches; the commit-graph makes the ahead/behind walk
+        use generation numbers instead of visiting every commit per branch.
+        """
+        repo = await self._repo(source)
+        main = shlex.quote(main_branch)
+        main_ref = (await repo.with_exec(["sh", "-c", (
+            f"git rev-parse --symbolic-full-name --verify -q {main} || "
+            f"git rev-parse --symbolic-full-name --verify -q origin/{main} || "
+            f"{{ echo 'Main branch {main} not found' >&2; exit 1; }}"
+        )]).stdout()).strip()
+
+        patterns = "refs/heads refs/remotes" if include_remote else "refs/heads"
+        ctr = repo.with_exec(["sh", "-c", (
+            "git commit-graph write --reachable 2>/dev/null; "
+            f"git for-each-ref --format={shlex.quote(for_each_ref_format(main_ref))} {patterns} > /tmp/refs.txt"
+        )])
+
+        branches = []
+        async for line in iter_lines(ctr.file("/tmp/refs.txt")):
+            branch = parse_ref_line(line)
+            if branch and f"refs/{'remotes' if branch.remote else 'heads'}/{branch.name}" != main_ref:
+                branches.append(branch)
+        return main_ref, branches
+
+    # --- Commit model ---
+
+    async def _repo(self, source: Directory) -> Container:
+        source = await prepare_source(source, "git-utils", gitignore=False)
+        return self.base().with_mounted_directory("/src", source).with_workdir("/src")
+
+    async def _last_tag(self, source: Directory) -> str:
+        repo = await self._repo(source)
+        return (await repo.with_exec(["sh", "-c", LAST_TAG_CMD]).stdout()).strip()
+
+    async def _commit_model(self, source: Directory, rev_range: str, max_count: Optional[int] = None) -> CommitModel:
+        """
+        Parses the commits of `rev_range` once. Records are cached by SHA per repository
+        (keyed by its root commit), so a rerun only reads the messages of new commits.
+        A repository without commits (fresh clone, unborn branch) gives an empty model.
         """
-        logs = await self.changelog(source)
-        
-        if "BREAKING CHANGE" in logs or "!" in logs:
-            return "🚀 Suggested: MAJOR (Incompatible API changes detected)"
-        elif "feat" in logs:
-            return "✨ Suggested: MINOR (New features detected)"
-        return "🔧 Suggested: PATCH (Only bug fixes or chores detected)"
\ No newline at end of file
+        repo = await self._repo(source)
+        count = f"-n {max_count} " if max_count else ""
+        listing = await repo.with_exec(["sh", "-c", (
+            "git rev-parse -q --verify HEAD > /dev/null || exit 0; "
+            "git rev-list --max-parents=0 HEAD | tail -n 1; "
+            f"git rev-list {count}{shlex.quote(rev_range)}"
+        )]).stdout()
+        if not listing.split():
+            return CommitModel([])
+        root, *shas = listing.split()
+
+        records = await self._cached_commits(root, shas)
+        missing = [sha for sha in shas if sha not in records]
+        if missing:
+            log = repo.with_new_file("/tmp/missing.txt", "\n".join(missing) + "\n").with_exec(["sh", "-c", (
+                f"git log -z --no-walk=unsorted --stdin --format='{LOG_FORMAT}' < /tmp/missing.txt "
+                f"| {LOG_TO_LINES} > /tmp/commits.log"
+            )]).file("/tmp/commits.log")
+            new_records = []
+            async for line in iter_lines(log):
+                record = parse_log_line(line)
+                if record:
+                    records[record.sha] = record
+                    new_records.append(record)
+            await self._store_commits(root, new_records)
+        return CommitModel([records[sha] for sha in shas if sha in records])
+
+    def _commit_cache(self) -> Container:
+        return (
+            dag.container()
+            .from_("alpine:latest")
+            .with_mounted_cache(COMMIT_CACHE_DIR, dag.cache_volume("git-commit-cache"))
+            # The volume changes outside the Dagger graph: never reuse an exec result
+            .with_env_variable("CACHE_BUSTER", str(time.time()))
+        )
+
+    def _cache_entry(self, root: str) -> str:
+        return f"{COMMIT_CACHE_DIR}/{root}.v{CACHE_VERSION}.jsonl"
+
+    async def _cached_commits(self, root: str, shas: list[str]) -> dict[str, CommitRecord]:
+        """Reads only the records of the requested SHAs: each line starts with `{"sha":"<sha>"`."""
+        entry = self._cache_entry(root)
+        patterns = "".join(f'{{"sha":"{sha}"\n' for sha in shas)
+        lookup = self._commit_cache().with_new_file("/tmp/wanted.txt", patterns).with_exec(
+            ["sh", "-c", f"test -f {entry} || exit 1; grep -F -f /tmp/wanted.txt {entry} > /tmp/commits.jsonl || true"],
+            expect=ReturnType.ANY,
+        )
+        records: dict[str, CommitRecord] = {}
+        if await lookup.exit_code() != 0:
+            return records
+        async for line in iter_lines(lookup.file("/tmp/commits.jsonl")):
+            if line.strip():
+                record = CommitRecord.from_json(line)
+                records[record.sha] = record
+        return records
+
+    async def _store_commits(self, root: str, records: list[CommitRecord]) -> None:
+        """Appends the newly parsed records; commits are immutable, so entries never need rewriting."""
+        if not records:
+            return
+        await (
+            self._commit_cache()
+            .with_new_file("/tmp/new.jsonl", "\n".join(r.to_json() for r in records) + "\n")
+            .with_exec(["sh", "-c", f"cat /tmp/new.jsonl >> {self._cache_entry(root)}"])
+            .sync()
+        )
@@ -1,12 +1,16 @@
 import dagger
-from dagger import object_type, function, Directory, dag # <--- Adicione 'dag'
+from dagger import object_type, function, Directory, dag, Ignore # <--- Adicione 'dag'
+from typing import Annotated
+
+from ...common.sources import PYTHON_IGNORE, prepare_source
 
 @object_type
 class PythonDev:
     """Pipeline padrão para projetos Python."""
 
     @function
-    async def lint(self, source: Directory) -> str:
+    async def lint(self, source: Annotated[Directory, Ignore(PYTHON_IGNORE)]) -> str:
+        source = await prepare_source(source, "python")
         # CORREÇÃO ABAIXO: Use 'dag.container()'
         return await (
             dag.container()
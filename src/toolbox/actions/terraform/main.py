@@ -1,6 +1,57 @@
 import dagger
-from dagger import object_type, function, Directory, Container, dag, File, Doc, Secret
-from typing import Annotated, Optional
+from dagger import object_type, function, Directory, Container, dag, File, Doc, Ignore, Secret, ReturnType, CacheSharingMode
+from typing import Annotated, Any, Optional
+import asyncio
+import hashlib
+import json
+import re
+import time
+
+from ...common.sources import TERRAFORM_IGNORE, TERRAFORM_KEEP, prepare_source
+from ...common.streaming import iter_lines
+from .plan_analysis import PlanReport
+from .state_ops import (
+    EXIT_BACKEND_FAILED,
+    EXIT_PULL_FAILED,
+    EXIT_PUSH_FAILED,
+    EXIT_REMOTE_CHANGED,
+    RESULTS_FILE,
+    apply_results,
+    batch_script,
+    parse_operations,
+    report_markdown,
+)
+from .state_index import STATE_TO_JSONL, StateIndex, drift_markdown, state_drift
+from .roots import DEPS_FILE, DISCOVER_ROOTS_CMD, RootPlan, normalize_root, parse_deps, parse_roots, plan_order, summary_markdown
+
+DEFAULT_TF_VERSION = "1.9.0"
+PLUGIN_CACHE_DIR = "/root/.terraform.d/plugin-cache"
+PLUGIN_CACHE_VOLUME_ENV = "TF_PLUGIN_CACHE_VOLUME"
+MIRROR_DIR = "/opt/terraform-mirror"
+# CLI config used when a provider mirror is mounted: init never reaches the registry
+MIRROR_CLI_CONFIG = f"""provider_installation {{
+  filesystem_mirror {{
+    path = "{MIRROR_DIR}"
+  }}
+}}
+"""
+DOCS_HASHES_FILE = ".terraform-docs-hashes.json"
+# "<module dir>\t<sha256 of its .tf files and terraform-docs config>" for every directory holding .tf files
+MODULE_HASHES_CMD = (
+    "find . -name '*.tf' -not -path '*/.terraform/*' | sed 's|/[^/]*$||' | sort -u "
+    "| while read -r d; do printf '%s\\t%s\\n' \"$d\" \"$(cat \"$d\"/*.tf \"$d\"/.terraform-docs.yml "
+    "\"$d\"/.config/.terraform-docs.yml 2>/dev/null | sha256sum | cut -d' ' -f1)\"; done"
+)
+PLAN_CACHE_DIR = "/plan-cache"
+PLAN_CACHE_MAX_ENTRIES = 100
+STATE_INDEX_DIR = "/state-index"
+STATE_INDEX_MAX_ENTRIES = 50
+# Serial + lineage from the top of the remote state (only the header is read; the state may be huge)
+STATE_FINGERPRINT_CMD = (
+    "terraform state pull > /tmp/fingerprint.tfstate || exit 1; "
+    "head -c 65536 /tmp/fingerprint.tfstate | tr -d ' \\n' "
+    "| grep -oE '\"(serial|lineage)\":(\"[^\"]*\"|[0-9]+)' | tr '\\n' ' '"
+)
 
 @object_type
 class Terraform:
@@ -12,7 +63,7 @@ class Terraform:
     @function
     def base(
         self,
-        tf_version: Annotated[str, Doc("Terraform version to use")] = "1.9.0"
+        tf_version: Annotated[str, Doc("Terraform version to use")] = DEFAULT_TF_VERSION
     ) -> Container:
         """
         Base container with Terraform and Terraform-docs installed.
@@ -23,7 +74,7 @@ class Terraform:
             dag.container()
             .from_("hashicorp/terraform:" + tf_version)
             # Instala dependências extras para docs e scripts
-            .with_exec(["apk", "add", "--no-cache", "curl", "bash", "git"])
+            .with_exec(["apk", "add", "--no-cache", "curl", "bash", "git", "jq"])
             # Instala terraform-docs
             .with_exec([
                 "curl", "-Lo", "/usr/local/bin/terraform-docs",
@@ -35,53 +86,251 @@ class Terraform:
     @function
     async def plan(
         self,
-        source: Annotated[Directory, Doc("Terraform source code")],
+        source: Annotated[Directory, Doc("Terraform source code"), Ignore(TERRAFORM_IGNORE)],
         env: Annotated[str, Doc("Environment (dev or prod)")] = "dev",
         dev_arn: Annotated[Optional[Secret], Doc("ARN for dev environment")] = None,
         prod_arn: Annotated[Optional[Secret], Doc("ARN for prod environment")] = None,
         cloudflare_token: Annotated[Optional[Secret], Doc("Cloudflare API Token")] = None,
         cloudflare_zone: Annotated[Optional[Secret], Doc("Cloudflare Zone ID")] = None,
+        upgrade: Annotated[bool, Doc("Run 'terraform init -upgrade' (ignore the lock file versions)")] = False,
+        provider_mirror: Annotated[Optional[Directory], Doc("Provider mirror from providers-mirror (offline init)")] = None,
+        tfvars: Annotated[Optional[File], Doc("Extra .tfvars file passed as -var-file")] = None,
+        memoize: Annotated[bool, Doc("Reuse the previous plan when source, tfvars, env and state serial are unchanged")] = True,
     ) -> File:
         """
         Initializes and generates a Terraform execution plan.
+        Plans are memoized by source, tfvars, env, Terraform version and remote state serial.
         """
         container = await self._prepare_env(
-            source, env, dev_arn, prod_arn, cloudflare_token, cloudflare_zone
+            source, env, dev_arn, prod_arn, cloudflare_token, cloudflare_zone, provider_mirror=provider_mirror
         )
-        
-        plan_file = f"tfplan.{env}"
-        
+        result, plan, log = await self._plan_root(container, source, ".", env, upgrade, tfvars, memoize)
+        print(log)
+        if not result.ok:
+            raise Exception(f"Terraform plan failed ({result.detail}):\n{log}")
+        return plan
+
+    @function
+    async def plan_all(
+        self,
+        source: Annotated[Directory, Doc("Terraform monorepo source code"), Ignore(TERRAFORM_IGNORE)],
+        envs: Annotated[list[str], Doc("Environments to plan (dev and/or prod)")] = ["dev"],
+        roots: Annotated[list[str], Doc("Root modules to plan (default: discover backend/cloud blocks and lock files)")] = [],
+        max_parallel: Annotated[int, Doc("Maximum number of concurrent plans")] = 4,
+        dev_arn: Annotated[Optional[Secret], Doc("ARN for dev environment")] = None,
+        prod_arn: Annotated[Optional[Secret], Doc("ARN for prod environment")] = None,
+        cloudflare_token: Annotated[Optional[Secret], Doc("Cloudflare API Token")] = None,
+        cloudflare_zone: Annotated[Optional[Secret], Doc("Cloudflare Zone ID")] = None,
+        upgrade: Annotated[bool, Doc("Run 'terraform init -upgrade' (ignore the lock file versions)")] = False,
+        provider_mirror: Annotated[Optional[Directory], Doc("Provider mirror from providers-mirror (offline init)")] = None,
+        tfvars: Annotated[Optional[File], Doc("Extra .tfvars file passed as -var-file")] = None,
+        memoize: Annotated[bool, Doc("Reuse the previous plan when source, tfvars, env and state serial are unchanged")] = True,
+    ) -> Directory:
+        """
+        Runs init/validate/plan for every root module and environment concurrently.
+        Roots wait for the roots listed in their .terraform-deps file.
+        Returns plans/<root>/tfplan.<env>, logs/<root>/<env>.txt and summary.md/json.
+        """
+        if not roots:
+            listing = await self.base().with_mounted_directory("/src", source).with_workdir("/src").with_exec(
+                ["sh", "-c", DISCOVER_ROOTS_CMD]
+            ).stdout()
+            roots = parse_roots(listing)
+        if not roots:
+            raise Exception("No Terraform root modules found in source.")
+
+        async def read_deps(root: str) -> list[str]:
+            path = f"{root}/{DEPS_FILE}" if root != "." else DEPS_FILE
+            return parse_deps(await source.file(path).contents()) if await source.exists(path) else []
+
+        deps = dict(zip(roots, await asyncio.gather(*[read_deps(r) for r in roots])))
+        order = plan_order(roots, deps)
+
+        # Fails fast on missing secrets before any plan starts
+        for env in envs:
+            await self._prepare_env(source, env, dev_arn, prod_arn)
+        semaphore = asyncio.Semaphore(max_parallel)
+        tasks: dict[tuple[str, str], asyncio.Task] = {}
+        output = dag.directory()
+
+        async def run(root: str, env: str) -> RootPlan:
+            nonlocal output
+            for dep in deps[root]:
+                dep_result = await tasks[(dep, env)]
+                if not dep_result.ok:
+                    return RootPlan(root, env, "skipped", detail=f"dependency {dep} {dep_result.status}")
+            async with semaphore:
+                ctr = await self._prepare_env(
+                    source, env, dev_arn, prod_arn, cloudflare_token, cloudflare_zone,
+                    workdir=root, provider_mirror=provider_mirror,
+                )
+                result, plan, log = await self._plan_root(ctr, source, root, env, upgrade, tfvars, memoize)
+
+            name = root if root != "." else "_root"
+            output = output.with_new_file(f"logs/{name}/{env}.txt", log)
+            if plan is not None:
+                output = output.with_file(f"plans/{name}/tfplan.{env}", plan)
+            return result
+
+        for root in order:
+            for env in envs:
+                tasks[(root, env)] = asyncio.create_task(run(root, env))
+        results = [await tasks[(root, env)] for root in order for env in envs]
+
         return (
-            container
-            .with_exec(["terraform", "init", "-upgrade"])
-            .with_exec(["terraform", "validate"])
-            .with_exec(["terraform", "plan", "-no-color", "-input=false", f"-out={plan_file}"])
-            .file(plan_file)
+            output
+            .with_new_file("summary.md", summary_markdown(results))
+            .with_new_file("summary.json", json.dumps([r.to_dict() for r in results], indent=2))
         )
 
+    @function
+    async def analyze_plan(
+        self,
+        source: Annotated[Directory, Doc("Terraform source code (root module of the plan)"), Ignore(TERRAFORM_IGNORE)],
+        plan: Annotated[File, Doc("Binary plan file generated by plan/plan-all")],
+        workdir: Annotated[str, Doc("Root module path inside source")] = ".",
+        max_diffs: Annotated[int, Doc("Maximum number of resources with attribute-level diffs")] = 200,
+        report_format: Annotated[str, Doc("Report format: 'markdown' or 'json'")] = "markdown",
+        provider_mirror: Annotated[Optional[Directory], Doc("Provider mirror from providers-mirror (offline init)")] = None,
+    ) -> File:
+        """
+        Summarizes a plan per module and action (create/update/delete/replace), lists destructive
+        changes and attribute diffs. The plan JSON is streamed one resource change per line.
+        """
+        ctr = (
+            self.base()
+            .with_mounted_directory("/src", source)
+            .with_workdir("/src" if workdir == "." else f"/src/{workdir}")
+            .with_file("/tmp/tfplan", plan)
+        )
+        ctr = await self._with_provider_cache(ctr, source, workdir, provider_mirror)
+        changes = (
+            # Only the provider schemas are needed to render the plan: no backend, no credentials
+            (await self._init(ctr, ["terraform", "init", "-input=false", "-backend=false", "-no-color"]))
+            .with_exec(["sh", "-c", "terraform show -json /tmp/tfplan | jq -c '.resource_changes[]?' > /tmp/changes.jsonl"])
+            .file("/tmp/changes.jsonl")
+        )
+        report = PlanReport(max_diffs=max_diffs)
+        async for line in iter_lines(changes):
+            report.feed_line(line)
+
+        if report_format == "json":
+            name, contents = "plan_report.json", json.dumps(report.to_dict(), indent=2)
+        else:
+            name, contents = "plan_report.md", report.to_markdown()
+        return dag.directory().with_new_file(name, contents).file(name)
+
+    @function
+    async def state_index(
+        self,
+        source: Annotated[Directory, Doc("Terraform source code"), Ignore(TERRAFORM_IGNORE)],
+        env: Annotated[str, Doc("Environment (dev or prod)")] = "dev",
+        dev_arn: Annotated[Optional[Secret], Doc("ARN for dev environment")] = None,
+        prod_arn: Annotated[Optional[Secret], Doc("ARN for prod environment")] = None,
+        workdir: Annotated[str, Doc("Root module path inside source")] = ".",
+        provider_mirror: Annotated[Optional[Directory], Doc("Provider mirror from providers-mirror (offline init)")] = None,
+    ) -> File:
+        """
+        Pulls the state once and returns it as an index file (one JSON line per resource
+        instance). Indexes are cached by state lineage + serial. Query it with state-query/state-drift.
+        """
+        ctr = await self._init(
+            await self._prepare_env(source, env, dev_arn, prod_arn, workdir=workdir, provider_mirror=provider_mirror),
+            self._init_args() + ["-no-color"],
+        )
+        fingerprint = await (
+            ctr
+            .with_env_variable("CACHE_BUSTER", str(time.time()))
+            .with_exec(["sh", "-c", STATE_FINGERPRINT_CMD], expect=ReturnType.ANY)
+            .stdout()
+        )
+        if not fingerprint.strip():
+            raise Exception(f"No Terraform state found for environment '{env}'.")
+
+        name = "state_index.jsonl"
+        serial = re.search(r'"serial":(\d+)', fingerprint)
+        lineage = re.search(r'"lineage":"([^"]*)"', fingerprint)
+        cached = None
+        if serial and lineage:
+            cached = await self._cached_state_index(self._state_key(serial.group(1), lineage.group(1)), name)
+        if cached is not None:
+            print("State index cache hit")
+            return cached
+
+        index = (
+            ctr
+            .with_env_variable("CACHE_BUSTER", str(time.time()))
+            .with_exec(["sh", "-c", f"terraform state pull | jq -c '{STATE_TO_JSONL}' > /tmp/{name}"])
+            .file(f"/tmp/{name}")
+        )
+        # The key comes from the pulled header: the state may have changed since the fingerprint
+        header = json.loads(await index.contents(limit_lines=1))
+        await self._store_state_index(self._state_key(header.get("serial"), header.get("lineage")), index)
+        return index
+
+    @function
+    async def state_query(
+        self,
+        index: Annotated[File, Doc("Index file generated by state-index")],
+        address: Annotated[str, Doc("Address glob (e.g. 'module.vpc.*', 'aws_instance.web[*]')")] = "*",
+        resource_type: Annotated[Optional[str], Doc("Resource type (e.g. aws_instance)")] = None,
+        module: Annotated[Optional[str], Doc("Module address ('root' for the root module)")] = None,
+        provider: Annotated[Optional[str], Doc("Provider suffix (e.g. hashicorp/aws)")] = None,
+        where: Annotated[list[str], Doc("Attribute filters: path=value, path!=value, path~text")] = [],
+        output: Annotated[str, Doc("'list', 'count' or 'json'")] = "list",
+        count_by: Annotated[str, Doc("Grouping for output=count: type, module or provider")] = "type",
+    ) -> str:
+        """Queries a state index by address, type, module, provider and attributes, without running Terraform."""
+        state = await self._load_state_index(index)
+        records = state.query(address, resource_type, module, provider, where)
+        if output == "count":
+            lines = [f"{n}\t{key}" for key, n in state.counts(records, count_by).items()]
+            return "\n".join(lines + [f"{len(records)}\ttotal"])
+        if output == "json":
+            return json.dumps(
+                [{"address": r.address, "type": r.type, "module": r.module, "provider": r.provider, "attributes": r.masked_attrs()} for r in records],
+                indent=2,
+            )
+        return "\n".join(r.address for r in records)
+
+    @function
+    async def state_drift(
+        self,
+        before: Annotated[File, Doc("Older index file (state-index)")],
+        after: Annotated[File, Doc("Newer index file (state-index)")],
+        report_format: Annotated[str, Doc("Report format: 'markdown' or 'json'")] = "markdown",
+    ) -> File:
+        """Summarizes added, removed and changed resource instances between two state snapshots."""
+        left, right = await asyncio.gather(self._load_state_index(before), self._load_state_index(after))
+        drift = state_drift(left, right)
+        if report_format == "json":
+            name, contents = "state_drift.json", json.dumps(drift, indent=2)
+        else:
+            name, contents = "state_drift.md", drift_markdown(drift)
+        return dag.directory().with_new_file(name, contents).file(name)
+
     @function
     async def apply(
         self,
-        source: Annotated[Directory, Doc("Terraform source code")],
+        source: Annotated[Directory, Doc("Terraform source code"), Ignore(TERRAFORM_IGNORE)],
         plan: Annotated[File, Doc("The plan file generated by the plan function")],
         env: Annotated[str, Doc("Environment (dev or prod)")] = "dev",
         dev_arn: Annotated[Optional[Secret], Doc("ARN for dev environment")] = None,
         prod_arn: Annotated[Optional[Secret], Doc("ARN for prod environment")] = None,
         cloudflare_token: Annotated[Optional[Secret], Doc("Cloudflare API Token")] = None,
         cloudflare_zone: Annotated[Optional[Secret], Doc("Cloudflare Zone ID")] = None,
+        provider_mirror: Annotated[Optional[Directory], Doc("Provider mirror from providers-mirror (offline init)")] = None,
     ) -> str:
         """
         Applies a previously generated Terraform plan.
         """
         plan_file = f"tfplan.{env}"
         container = await self._prepare_env(
-            source, env, dev_arn, prod_arn, cloudflare_token, cloudflare_zone
+            source, env, dev_arn, prod_arn, cloudflare_token, cloudflare_zone, provider_mirror=provider_mirror
         )
         
         return await (
-            container
-            .with_file(plan_file, plan)
-            .with_exec(["terraform", "init"])
+            (await self._init(container.with_file(plan_file, plan), self._init_args()))
             .with_exec(["terraform", "apply", "-no-color", "-input=false", plan_file])
             .stdout()
         )
@@ -89,7 +338,7 @@ class Terraform:
     @function
     async def docs(
         self,
-        source: Annotated[Directory, Doc("Terraform source code")],
+        source: Annotated[Directory, Doc("Terraform source code"), Ignore(TERRAFORM_IGNORE)],
         config_file: Annotated[Optional[File], Doc("Path to .tfdocs-config.yml")] = None
     ) -> File:
         """
@@ -106,26 +355,143 @@ class Terraform:
             .file("README_generated.md")
         )
 
+    @function
+    async def docs_all(
+        self,
+        source: Annotated[Directory, Doc("Terraform source code with many modules"), Ignore(TERRAFORM_IGNORE)],
+        config_file: Annotated[Optional[File], Doc("Path to .tfdocs-config.yml")] = None,
+        output_file: Annotated[str, Doc("README file injected in each module")] = "README.md",
+        max_parallel: Annotated[int, Doc("Concurrent terraform-docs processes")] = 8,
+        force: Annotated[bool, Doc("Regenerate every module, ignoring the previous hashes")] = False,
+    ) -> Directory:
+        """
+        Regenerates docs only for modules whose .tf files or .terraform-docs.yml changed since
+        the previous run (hashes kept in .terraform-docs-hashes.json) and returns the source
+        with the READMEs injected in place.
+        """
+        config_hash = ""
+        prepared = await prepare_source(source, "terraform", keep=TERRAFORM_KEEP)
+        ctr = self.base().with_mounted_directory("/src", prepared).with_workdir("/src")
+        config_args = ""
+        if config_file:
+            config_hash = hashlib.sha256((await config_file.contents()).encode()).hexdigest()
+            ctr = ctr.with_file("/tmp/.tfdocs-config.yml", config_file)
+            config_args = "--config /tmp/.tfdocs-config.yml "
+
+        current = {}
+        for line in (await ctr.with_exec(["sh", "-c", MODULE_HASHES_CMD]).stdout()).splitlines():
+            module, _, digest = line.partition("\t")
+            if digest:
+                # Config changes invalidate every module
+                current[normalize_root(module)] = hashlib.sha256(f"{digest}:{config_hash}".encode()).hexdigest()
+
+        previous = {}
+        if not force and await source.exists(DOCS_HASHES_FILE):
+            previous = json.loads(await source.file(DOCS_HASHES_FILE).contents())
+        changed = sorted(m for m, digest in current.items() if previous.get(m) != digest)
+        print(f"terraform-docs: {len(changed)} of {len(current)} modules changed")
+        if not changed:
+            return source
+
+        generate = ctr.with_new_file("/tmp/changed_modules.txt", "\n".join(changed) + "\n").with_exec(["sh", "-c", (
+            f"xargs -P {max_parallel} -I{{}} sh -c "
+            f"'terraform-docs markdown table {config_args}--output-file {output_file} --output-mode inject \"$1\" >/dev/null "
+            f"|| echo \"FAILED $1\"' _ {{}} < /tmp/changed_modules.txt"
+        )])
+        failed = [line[7:] for line in (await generate.stdout()).splitlines() if line.startswith("FAILED ")]
+        if failed:
+            raise Exception(f"terraform-docs failed for: {', '.join(failed)}")
+
+        readmes = [output_file if m == "." else f"{m}/{output_file}" for m in changed]
+        return (
+            source
+            .with_directory(".", generate.directory("/src").filter(include=readmes))
+            .with_new_file(DOCS_HASHES_FILE, json.dumps(current, indent=2, sort_keys=True) + "\n")
+        )
+
     @function
     async def state_rm(
         self,
-        source: Annotated[Directory, Doc("Terraform source code")],
+        source: Annotated[Directory, Doc("Terraform source code"), Ignore(TERRAFORM_IGNORE)],
         address: Annotated[str, Doc("The resource address to remove from state")],
         env: Annotated[str, Doc("Environment (dev or prod)")],
         dev_arn: Optional[Secret] = None,
         prod_arn: Optional[Secret] = None,
+        provider_mirror: Annotated[Optional[Directory], Doc("Provider mirror from providers-mirror (offline init)")] = None,
     ) -> str:
         """
         Removes an item from the Terraform state.
         """
-        container = await self._prepare_env(source, env, dev_arn, prod_arn)
+        container = await self._prepare_env(source, env, dev_arn, prod_arn, provider_mirror=provider_mirror)
         return await (
-            container
-            .with_exec(["terraform", "init"])
+            (await self._init(container, self._init_args()))
             .with_exec(["terraform", "state", "rm", address])
             .stdout()
         )
 
+    @function
+    async def providers_mirror(
+        self,
+        source: Annotated[Directory, Doc("Terraform source code (root module with .terraform.lock.hcl)"), Ignore(TERRAFORM_IGNORE)],
+        platforms: Annotated[list[str], Doc("Target platforms (os_arch)")] = ["linux_amd64"],
+        tf_version: Annotated[str, Doc("Terraform version to use")] = DEFAULT_TF_VERSION,
+    ) -> Directory:
+        """
+        Builds a filesystem provider mirror with 'terraform providers mirror'.
+        Pass it as --provider-mirror so init installs providers without network access.
+        """
+        platform_args = [f"-platform={p}" for p in platforms]
+        return (
+            self.base(tf_version)
+            .with_mounted_directory("/src", source)
+            .with_workdir("/src")
+            .with_exec(["terraform", "providers", "mirror"] + platform_args + ["/tmp/mirror"])
+            .directory("/tmp/mirror")
+        )
+
+    @function
+    async def state_batch(
+        self,
+        source: Annotated[Directory, Doc("Terraform source code"), Ignore(TERRAFORM_IGNORE)],
+        operations: Annotated[list[str], Doc("Operations: 'rm ADDR', 'mv SRC DST', 'import ADDR ID'")],
+        env: Annotated[str, Doc("Environment (dev or prod)")],
+        dry_run: Annotated[bool, Doc("Run against a local copy of the state and do not push it")] = True,
+        dev_arn: Optional[Secret] = None,
+        prod_arn: Optional[Secret] = None,
+        provider_mirror: Annotated[Optional[Directory], Doc("Provider mirror from providers-mirror (offline init)")] = None,
+    ) -> str:
+        """
+        Runs many state rm/mv/import operations against a pulled copy of the state and pushes it once.
+        Imports run against a local backend override, so a dry run never writes the remote state.
+        Stops at the first failure, and only pushes when every operation succeeded and the remote
+        lineage/serial did not change since the pull. The backend lock is not held for the whole
+        batch (Terraform cannot keep it across commands): a write that races the push makes
+        `terraform state push` fail on the serial check instead of being overwritten.
+        """
+        ops = parse_operations(operations)
+        container = await self._prepare_env(source, env, dev_arn, prod_arn, provider_mirror=provider_mirror)
+        run = (
+            (await self._init(container, self._init_args()))
+            # The remote state changes outside the Dagger graph: always run again
+            .with_env_variable("CACHE_BUSTER", str(time.time()))
+            .with_exec(["sh", "-c", batch_script(ops, dry_run)], expect=ReturnType.ANY)
+        )
+        exit_code = await run.exit_code()
+        if exit_code == EXIT_PULL_FAILED:
+            raise Exception(f"terraform state pull failed:\n{await run.stderr()}")
+        apply_results(ops, await run.file(RESULTS_FILE).contents())
+        pushed = not dry_run and exit_code == 0 and all(op.status == "ok" for op in ops)
+        report = report_markdown(ops, dry_run, pushed)
+        errors = {
+            EXIT_BACKEND_FAILED: "switching to the local backend for import failed",
+            EXIT_REMOTE_CHANGED: "the remote state changed since the pull; nothing was pushed",
+            EXIT_PUSH_FAILED: "terraform state push failed (the remote state may have changed since the pull)",
+        }
+        if exit_code != 0:
+            message = errors.get(exit_code, f"state batch failed (exit {exit_code})")
+            raise Exception(f"{message}:\n{await run.stderr()}\n\n{report}")
+        return report
+
     # --- Private Helper ---
 
     async def _prepare_env(
@@ -136,26 +502,226 @@ class Terraform:
         prod_arn: Optional[Secret] = None,
         cf_token: Optional[Secret] = None,
         cf_zone: Optional[Secret] = None,
+        workdir: str = ".",
+        provider_mirror: Optional[Directory] = None,
     ) -> Container:
-        """Sets up the container with secrets and environment variables."""
+        """Sets up the container with secrets, environment variables and the provider caches."""
         
         # 1. Select ARN based on environment
         target_arn = dev_arn if env == "dev" else prod_arn
         if not target_arn:
             raise Exception(f"ARN for environment '{env}' must be provided as a Secret.")
+        source = await prepare_source(source, "terraform", keep=TERRAFORM_KEEP)
 
         # 2. Build container
         ctr = (
             self.base()
             .with_mounted_directory("/src", source)
-            .with_workdir("/src")
+            .with_workdir("/src" if workdir == "." else f"/src/{workdir}")
             # Injeta variáveis obrigatórias do Makefile
             .with_secret_variable("TF_VAR_iam_role_arn", target_arn)
         )
 
+        # 3. Provider caches: plugin cache volume per lock file, optional offline mirror
+        ctr = await self._with_provider_cache(ctr, source, workdir, provider_mirror)
+
         if cf_token:
             ctr = ctr.with_secret_variable("CLOUDFLARE_API_TOKEN", cf_token)
         if cf_zone:
             ctr = ctr.with_secret_variable("CLOUDFLARE_ZONE_ID", cf_zone)
 
-        return ctr
\ No newline at end of file
+        return ctr
+
+    async def _plan_root(
+        self,
+        ctr: Container,
+        source: Directory,
+        root: str,
+        env: str,
+        upgrade: bool,
+        tfvars: Optional[File],
+        memoize: bool,
+    ) -> tuple[RootPlan, Optional[File], str]:
+        """init + validate + plan in the container workdir. Returns (result, plan file, log)."""
+        start = time.monotonic()
+        plan_file = f"tfplan.{env}"
+        var_args = ""
+        if tfvars:
+            ctr = ctr.with_file("/tmp/plan.tfvars", tfvars)
+            var_args = " -var-file=/tmp/plan.tfvars"
+
+        init = await self._init(ctr, self._init_args(upgrade) + ["-no-color"], expect=ReturnType.ANY)
+        if await init.exit_code() != 0:
+            log = await init.stdout() + await init.stderr()
+            return RootPlan(root, env, "failed", detail="init failed"), None, log
+
+        key = None
+        if memoize:
+            key, fingerprint = await self._plan_cache_key(init, source, root, env, tfvars)
+            if key:
+                cached = await self._cached_plan(key)
+                if cached is not None:
+                    exit_code = int((await cached.file("exit_code").contents()).strip())
+                    log = await cached.file("log.txt").contents()
+                    result = RootPlan.from_output(root, env, exit_code, log, int((time.monotonic() - start) * 1000))
+                    result.detail = "cached"
+                    return result, cached.file(plan_file), log
+                # The exec must depend on the state, or the engine replays a plan made against an older serial
+                init = init.with_env_variable("TF_STATE_FINGERPRINT", fingerprint)
+        if not key:
+            # Unknown state: plan again and do not memoize
+            init = init.with_env_variable("CACHE_BUSTER", str(time.time()))
+
+        run = init.with_exec(["sh", "-c", (
+            "terraform validate -no-color && "
+            f"terraform plan -no-color -input=false -detailed-exitcode -out={plan_file}{var_args}"
+        )], expect=ReturnType.ANY)
+        exit_code = await run.exit_code()
+        log = await run.stdout() + await run.stderr()
+        result = RootPlan.from_output(root, env, exit_code, log, int((time.monotonic() - start) * 1000))
+        if not result.ok:
+            return result, None, log
+        if key:
+            await self._store_plan(key, run.file(plan_file), plan_file, exit_code, log)
+        return result, run.file(plan_file), log
+
+    async def _plan_cache_key(
+        self, init: Container, source: Directory, root: str, env: str, tfvars: Optional[File]
+    ) -> tuple[Optional[str], Optional[str]]:
+        """
+        (key, state fingerprint): digest of source + tfvars + env + Terraform version + remote
+        state lineage/serial. (None, None) when the state cannot be read: such plans are not memoized.
+        """
+        probe = (
+            init
+            # The state changes outside the Dagger graph: always read it again
+            .with_env_variable("CACHE_BUSTER", str(time.time()))
+            .with_exec(["sh", "-c", STATE_FINGERPRINT_CMD], expect=ReturnType.ANY)
+        )
+        fingerprint = (await probe.stdout()).strip()
+        if await probe.exit_code() != 0 or '"serial"' not in fingerprint or '"lineage"' not in fingerprint:
+            print(f"{root}/{env}: state fingerprint unavailable, plan not memoized")
+            return None, None
+        raw = json.dumps([
+            await source.filter(exclude=[".git", "**/.terraform"]).digest(),
+            hashlib.sha256((await tfvars.contents()).encode()).hexdigest() if tfvars else None,
+            root,
+            env,
+            DEFAULT_TF_VERSION,
+            fingerprint,
+        ])
+        return hashlib.sha256(raw.encode()).hexdigest()[:32], fingerprint
+
+    def _cache_container(self, path: str, volume: str) -> Container:
+        return (
+            dag.container()
+            .from_("alpine:latest")
+            .with_mounted_cache(path, dag.cache_volume(volume))
+            # The volume changes outside the Dagger graph: never reuse an exec result
+            .with_env_variable("CACHE_BUSTER", str(time.time()))
+        )
+
+    async def _cached_plan(self, key: str) -> Optional[Directory]:
+        """Cached entry (plan file, log.txt, exit_code) or None on a miss."""
+        entry = f"{PLAN_CACHE_DIR}/{key}"
+        lookup = self._cache_container(PLAN_CACHE_DIR, "terraform-plan-cache").with_exec(
+            ["sh", "-c", f"test -f {entry}/exit_code && touch {entry} && cp -r {entry} /tmp/plan-hit"],
+            expect=ReturnType.ANY,
+        )
+        if await lookup.exit_code() != 0:
+            return None
+        return lookup.directory("/tmp/plan-hit")
+
+    async def _store_plan(self, key: str, plan: File, plan_file: str, exit_code: int, log: str) -> None:
+        """Stores the entry and keeps only the PLAN_CACHE_MAX_ENTRIES most recently used plans."""
+        entry = (
+            dag.directory()
+            .with_file(plan_file, plan)
+            .with_new_file("log.txt", log)
+            .with_new_file("exit_code", str(exit_code))
+        )
+        await (
+            self._cache_container(PLAN_CACHE_DIR, "terraform-plan-cache")
+            .with_mounted_directory("/tmp/entry", entry)
+            .with_exec(["sh", "-c", (
+                f"rm -rf {PLAN_CACHE_DIR}/{key} && cp -r /tmp/entry {PLAN_CACHE_DIR}/{key}; "
+                f"cd {PLAN_CACHE_DIR} && ls -1t | tail -n +{PLAN_CACHE_MAX_ENTRIES + 1} | xargs -r rm -rf"
+            )])
+            .sync()
+        )
+
+    async def _with_provider_cache(
+        self,
+        ctr: Container,
+        source: Directory,
+        workdir: str,
+        provider_mirror: Optional[Directory],
+    ) -> Container:
+        """Mounts the plugin cache volume keyed by the lock file and, if given, the provider mirror."""
+        lock_path = ".terraform.lock.hcl" if workdir == "." else f"{workdir}/.terraform.lock.hcl"
+        lock_key = "unlocked"
+        if await source.exists(lock_path):
+            lock_key = hashlib.sha256((await source.file(lock_path).contents()).encode()).hexdigest()[:16]
+        volume = f"terraform-plugin-cache-{lock_key}"
+        ctr = (
+            ctr
+            .with_mounted_cache(PLUGIN_CACHE_DIR, dag.cache_volume(volume), sharing=CacheSharingMode.LOCKED)
+            .with_env_variable("TF_PLUGIN_CACHE_DIR", PLUGIN_CACHE_DIR)
+            .with_env_variable(PLUGIN_CACHE_VOLUME_ENV, volume)
+        )
+        if provider_mirror:
+            ctr = (
+                ctr
+                .with_mounted_directory(MIRROR_DIR, provider_mirror)
+                .with_new_file("/root/.terraformrc", MIRROR_CLI_CONFIG)
+                .with_env_variable("TF_CLI_CONFIG_FILE", "/root/.terraformrc")
+            )
+        return ctr
+
+    async def _init(self, ctr: Container, args: list[str], expect: ReturnType = ReturnType.SUCCESS) -> Container:
+        """
+        Runs init with the plugin cache locked, since concurrent inits (plan-all roots sharing a lock
+        file) would write the same provider files. Afterwards the cache is only read, so it is
+        remounted shared and validate/plan of parallel roots do not queue on the lock.
+        """
+        volume = dag.cache_volume(await ctr.env_variable(PLUGIN_CACHE_VOLUME_ENV))
+        return (
+            ctr
+            .with_mounted_cache(PLUGIN_CACHE_DIR, volume, sharing=CacheSharingMode.LOCKED)
+            .with_exec(args, expect=expect)
+            .with_mounted_cache(PLUGIN_CACHE_DIR, volume)
+        )
+
+    def _state_key(self, serial: Any, lineage: Any) -> str:
+        return hashlib.sha256(f"{lineage}:{serial}".encode()).hexdigest()[:32]
+
+    async def _cached_state_index(self, key: str, name: str) -> Optional[File]:
+        entry = f"{STATE_INDEX_DIR}/{key}.jsonl"
+        lookup = self._cache_container(STATE_INDEX_DIR, "terraform-state-index").with_exec(
+            ["sh", "-c", f"test -f {entry} && touch {entry} && cp {entry} /tmp/{name}"],
+            expect=ReturnType.ANY,
+        )
+        if await lookup.exit_code() != 0:
+            return None
+        return lookup.file(f"/tmp/{name}")
+
+    async def _store_state_index(self, key: str, index: File) -> None:
+        await (
+            self._cache_container(STATE_INDEX_DIR, "terraform-state-index")
+            .with_mounted_file("/tmp/index.jsonl", index)
+            .with_exec(["sh", "-c", (
+                f"cp /tmp/index.jsonl {STATE_INDEX_DIR}/{key}.jsonl; "
+                f"cd {STATE_INDEX_DIR} && ls -1t | tail -n +{STATE_INDEX_MAX_ENTRIES + 1} | xargs -r rm -f"
+            )])
+            .sync()
+        )
+
+    async def _load_state_index(self, index: File) -> StateIndex:
+        state = StateIndex()
+        async for line in iter_lines(index):
+            state.feed_line(line)
+        return state
+
+    def _init_args(self, upgrade: bool = False) -> list[str]:
+        """'terraform init' reusing the lock file; -upgrade only when explicitly requested."""
+        return ["terraform", "init", "-input=false"] + (["-upgrade"] if upgrade else [])
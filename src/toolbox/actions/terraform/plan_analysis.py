@@ -0,0 +1,183 @@
+"""
+Incremental analysis of `terraform show -json` plans.
+
+The container emits one resource change per line (`jq -c '.resource_changes[]'`),
+so the plan is consumed line by line: only per-module/per-action counters, the
+destructive changes and a capped number of attribute diffs are kept in memory.
+"""
+import json
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Optional
+
+ACTIONS = ("create", "update", "delete", "replace", "read", "no-op")
+DESTRUCTIVE = ("delete", "replace")
+UNKNOWN = "(known after apply)"
+SENSITIVE = "(sensitive)"
+FLATTEN_DEPTH = 4  # deeper values are shown as one nested value
+
+
+def classify_actions(actions: list[str]) -> str:
+    """Maps the `change.actions` list to a single action (delete+create = replace)."""
+    if "delete" in actions and "create" in actions:
+        return "replace"
+    return actions[0] if actions else "no-op"
+
+
+def flatten(value: Any, prefix: str = "", depth: Optional[int] = FLATTEN_DEPTH) -> dict[str, Any]:
+    """Flattens nested attributes into dotted paths (`tags.Name`, `ingress.0.port`); depth=None has no limit."""
+    if depth != 0 and isinstance(value, dict):
+        items = value.items()
+    elif depth != 0 and isinstance(value, list):
+        items = enumerate(value)
+    else:
+        return {prefix: value} if prefix else {}
+    flat: dict[str, Any] = {}
+    for key, item in items:
+        flat.update(flatten(item, f"{prefix}.{key}" if prefix else str(key), None if depth is None else depth - 1))
+    if not flat and prefix:
+        flat[prefix] = value  # empty dict/list
+    return flat
+
+
+def marked_paths(marks: Any) -> set[str]:
+    """Paths flagged `true` in an `*_unknown` / `*_sensitive` tree, at any depth; "" means the whole value."""
+    if marks is True:
+        return {""}
+    return {k for k, v in flatten(marks or {}, depth=None).items() if v is True}
+
+
+def is_marked(path: str, marked: set[str]) -> bool:
+    """True if `path` is a marked path or nested under one (maps and list indexes alike)."""
+    return any(m == "" or path == m or path.startswith(m + ".") for m in marked)
+
+
+def hides(path: str, marked: set[str]) -> bool:
+    """A flattened path must be masked if it is marked, nested under a marked path or contains one."""
+    return is_marked(path, marked) or any(m.startswith(path + ".") for m in marked)
+
+
+def attribute_diff(change: dict) -> list[tuple[str, Any, Any]]:
+    """(path, before, after) for every attribute that changes; unknown and sensitive values are masked."""
+    before = flatten(change.get("before") or {})
+    after = flatten(change.get("after") or {})
+    unknown = marked_paths(change.get("after_unknown"))
+    sensitive = marked_paths(change.get("before_sensitive")) | marked_paths(change.get("after_sensitive"))
+
+    # Marks may be deeper than the flattened values: they apply to the truncated path
+    unknown_paths = {".".join(p.split(".")[:FLATTEN_DEPTH]) for p in unknown - {""}}
+
+    diffs = []
+    for path in sorted(set(before) | set(after) | unknown_paths):
+        old, new = before.get(path), after.get(path)
+        if hides(path, unknown):
+            new = UNKNOWN
+        elif old == new:
+            continue
+        if hides(path, sensitive):
+            old, new = SENSITIVE, SENSITIVE if new != UNKNOWN else new
+        diffs.append((path, old, new))
+    return diffs
+
+
+@dataclass
+class PlanReport:
+    max_diffs: int = 200
+    modules: dict[str, dict[str, int]] = field(default_factory=dict)  # module -> action -> count
+    actions: dict[str, int] = field(default_factory=dict)
+    destructive: list[dict] = field(default_factory=list)
+    diffs: list[dict] = field(default_factory=list)
+    omitted_diffs: int = 0
+    changes: int = 0
+
+    def feed_lines(self, lines: Iterable[str]) -> "PlanReport":
+        for line in lines:
+            self.feed_line(line)
+        return self
+
+    def feed_line(self, line: str) -> None:
+        line = line.strip()
+        if not line:
+            return
+        try:
+            change = json.loads(line)
+        except json.JSONDecodeError:
+            return
+        if isinstance(change, dict):
+            self.feed_change(change)
+
+    def feed_change(self, resource: dict) -> None:
+        self.changes += 1
+        change = resource.get("change", {})
+        action = classify_actions(change.get("actions", []))
+        module = resource.get("module_address") or "(root)"
+        counts = self.modules.setdefault(module, {})
+        counts[action] = counts.get(action, 0) + 1
+        self.actions[action] = self.actions.get(action, 0) + 1
+        if action in ("no-op", "read"):
+            return
+
+        address = resource.get("address", "")
+        if action in DESTRUCTIVE:
+            replace_paths = [".".join(str(p) for p in path) for path in change.get("replace_paths", [])]
+            self.destructive.append({"address": address, "action": action, "replace_paths": replace_paths})
+        if action in ("update", "replace"):
+            if len(self.diffs) >= self.max_diffs:
+                self.omitted_diffs += 1
+                return
+            self.diffs.append({
+                "address": address,
+                "action": action,
+                "attributes": [{"path": p, "before": b, "after": a} for p, b, a in attribute_diff(change)],
+            })
+
+    # --- Outputs ---
+
+    def to_dict(self) -> dict:
+        return {
+            "resource_changes": self.changes,
+            "actions": self.actions,
+            "modules": self.modules,
+            "destructive": self.destructive,
+            "diffs": self.diffs,
+            "omitted_diffs": self.omitted_diffs,
+        }
+
+    def to_markdown(self) -> str:
+        def count(counts: dict[str, int], action: str) -> int:
+            return counts.get(action, 0)
+
+        md_lines = [
+            "## Terraform Plan Analysis",
+            f"**Resource changes:** {self.changes} | "
+            + " | ".join(f"**{a}:** {count(self.actions, a)}" for a in ACTIONS[:4]),
+        ]
+        if self.destructive:
+            md_lines.append(f"**⚠️ Destructive changes:** {len(self.destructive)}")
+
+        md_lines += ["", "### By Module", "", "| Module | Create | Update | Delete | Replace |", "| :--- | ---: | ---: | ---: | ---: |"]
+        for module, counts in sorted(self.modules.items()):
+            if any(count(counts, a) for a in ACTIONS[:4]):
+                md_lines.append(f"| {module} | " + " | ".join(str(count(counts, a)) for a in ACTIONS[:4]) + " |")
+
+        if self.destructive:
+            md_lines += ["", "### Destructive Changes", "", "| Action | Address | Forces replacement |", "| :--- | :--- | :--- |"]
+            md_lines += [
+                f"| {d['action']} | `{d['address']}` | {', '.join(d['replace_paths'])} |" for d in self.destructive
+            ]
+
+        if self.diffs:
+            md_lines += ["", "### Attribute Changes"]
+            for diff in self.diffs:
+                md_lines += ["", f"#### `{diff['address']}` ({diff['action']})", "", "| Attribute | Before | After |", "| :--- | :--- | :--- |"]
+                md_lines += [
+                    f"| {a['path']} | {_cell(a['before'])} | {_cell(a['after'])} |" for a in diff["attributes"]
+                ]
+            if self.omitted_diffs:
+                md_lines += ["", f"_{self.omitted_diffs} more updated resources omitted (max_diffs={self.max_diffs})._"]
+        return "\n".join(md_lines)
+
+
+def _cell(value: Any) -> str:
+    text = value if isinstance(value, str) else json.dumps(value)
+    text = text.replace("|", "\\|").replace("\n", " ")
+    return f"`{text[:80]}`" + ("…" if len(text) > 80 else "")
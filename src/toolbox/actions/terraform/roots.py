@@ -0,0 +1,117 @@
+"""
+Helpers for multi-root Terraform runs: root discovery output parsing,
+dependency ordering between roots and plan summaries.
+
+A root module may declare the roots it depends on in a `.terraform-deps` file
+(one path per line, relative to the repository root, `#` for comments).
+"""
+import re
+from dataclasses import dataclass, asdict
+
+DEPS_FILE = ".terraform-deps"
+
+# Shell snippet that prints every directory holding a backend/cloud block or a lock file
+DISCOVER_ROOTS_CMD = (
+    "{ find . -name '*.tf' -not -path '*/.terraform/*' "
+    "-exec grep -lE '^[[:space:]]*(backend[[:space:]]+\"|cloud[[:space:]]*\\{)' {} + ; "
+    "find . -name .terraform.lock.hcl -not -path '*/.terraform/*' ; } "
+    "| xargs -r -n1 dirname | sort -u"
+)
+
+_PLAN_SUMMARY = re.compile(r"Plan: (\d+) to add, (\d+) to change, (\d+) to destroy")
+
+
+def normalize_root(path: str) -> str:
+    path = path.strip().strip("/")
+    if path.startswith("./"):
+        path = path[2:]
+    return path or "."
+
+
+def parse_roots(output: str) -> list[str]:
+    return sorted({normalize_root(line) for line in output.splitlines() if line.strip()})
+
+
+def parse_deps(text: str) -> list[str]:
+    deps = []
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if line:
+            deps.append(normalize_root(line))
+    return deps
+
+
+def plan_order(roots: list[str], deps: dict[str, list[str]]) -> list[str]:
+    """Topological order of the roots (Kahn). Raises on unknown dependencies or cycles."""
+    known = set(roots)
+    for root, root_deps in deps.items():
+        missing = [d for d in root_deps if d not in known]
+        if missing:
+            raise Exception(f"Root '{root}' depends on unknown root(s): {', '.join(missing)}")
+
+    pending = {root: set(deps.get(root, [])) for root in roots}
+    order: list[str] = []
+    ready = sorted(root for root, d in pending.items() if not d)
+    while ready:
+        root = ready.pop(0)
+        order.append(root)
+        del pending[root]
+        for other, d in pending.items():
+            if root in d:
+                d.discard(root)
+                if not d:
+                    ready.append(other)
+        ready.sort()
+    if pending:
+        raise Exception(f"Dependency cycle between roots: {', '.join(sorted(pending))}")
+    return order
+
+
+@dataclass
+class RootPlan:
+    root: str
+    env: str
+    status: str  # changes | no-changes | failed | skipped
+    add: int = 0
+    change: int = 0
+    destroy: int = 0
+    duration_ms: int = 0
+    detail: str = ""
+
+    @property
+    def ok(self) -> bool:
+        return self.status in ("changes", "no-changes")
+
+    @classmethod
+    def from_output(cls, root: str, env: str, exit_code: int, stdout: str, duration_ms: int) -> "RootPlan":
+        """Builds the result from a `plan -detailed-exitcode` run (0 = no changes, 2 = changes)."""
+        if exit_code not in (0, 2):
+            return cls(root, env, "failed", duration_ms=duration_ms, detail=f"exit code {exit_code}")
+        match = _PLAN_SUMMARY.search(stdout)
+        counts = [int(n) for n in match.groups()] if match else [0, 0, 0]
+        status = "changes" if exit_code == 2 else "no-changes"
+        return cls(root, env, status, *counts, duration_ms=duration_ms)
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def summary_markdown(results: list[RootPlan]) -> str:
+    icons = {"changes": "📝", "no-changes": "✅", "failed": "❌", "skipped": "⏭️"}
+    failed = [r for r in results if not r.ok]
+    md_lines = [
+        "## Terraform Multi-Root Plan",
+        f"**Result:** {'❌ FAILED' if failed else '✅ OK'}",
+        f"**Plans:** {len(results)} | **With changes:** {sum(1 for r in results if r.status == 'changes')}"
+        f" | **Failed/skipped:** {len(failed)}",
+        f"**Total:** +{sum(r.add for r in results)} ~{sum(r.change for r in results)} -{sum(r.destroy for r in results)}",
+        "",
+        "| Root | Env | Status | Add | Change | Destroy | Time | Details |",
+        "| :--- | :--- | :--- | ---: | ---: | ---: | ---: | :--- |",
+    ]
+    for r in results:
+        md_lines.append(
+            f"| {r.root} | {r.env} | {icons.get(r.status, '')} {r.status} | {r.add} | {r.change} | {r.destroy} "
+            f"| {r.duration_ms / 1000:.1f}s | {r.detail} |"
+        )
+    return "\n".join(md_lines)
@@ -0,0 +1,243 @@
+"""
+Indexed view of a Terraform state.
+
+The raw state (`terraform state pull`) is flattened by jq into one line per
+resource instance, preceded by a header line with lineage/serial. The index
+keeps each instance's attributes as the raw JSON string (parsed only when a
+filter needs them) plus secondary indexes by type, module and provider.
+State stores secrets in plain text: the paths listed in each instance's
+`sensitive_attributes` are kept too, and every output masks them.
+"""
+import fnmatch
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Iterable, Optional
+
+from .plan_analysis import SENSITIVE, flatten, hides, is_marked
+
+ROOT_MODULE = "root"
+
+# jq program: header line + one compact line per resource instance
+STATE_TO_JSONL = (
+    "{lineage, serial, terraform_version}, "
+    "(.resources[]? | . as $r | .instances[]? | {module: $r.module, mode: $r.mode, type: $r.type, "
+    "name: $r.name, provider: $r.provider, index_key: .index_key, attributes: .attributes, "
+    "sensitive: .sensitive_attributes})"
+)
+
+_PROVIDER = re.compile(r'provider\["([^"]+)"\]')
+_WHERE = re.compile(r"^(?P<path>[^!=~]+)(?P<op>!=|=|~)(?P<value>.*)$")
+
+
+@dataclass(slots=True)
+class StateRecord:
+    address: str
+    type: str
+    module: str
+    provider: str
+    attributes: str  # raw JSON, decoded on demand
+    sensitive: tuple[str, ...] = ()  # dotted attribute paths
+
+    def attrs(self) -> dict:
+        return json.loads(self.attributes or "{}")
+
+    def masked_attrs(self) -> dict:
+        return mask_sensitive(self.attrs(), set(self.sensitive))
+
+
+def sensitive_paths(raw: Any) -> tuple[str, ...]:
+    """`sensitive_attributes` steps (`[[{"type": "get_attr", "value": "password"}], ...]`) as dotted paths."""
+    paths = []
+    for steps in raw or []:
+        parts = []
+        for step in steps if isinstance(steps, list) else []:
+            value = step.get("value") if isinstance(step, dict) else None
+            if isinstance(value, dict):  # index step: {"value": 0, "type": "number"}
+                value = value.get("value")
+            if value is not None:
+                parts.append(str(value))
+        if parts:
+            paths.append(".".join(parts))
+    return tuple(sorted(set(paths)))
+
+
+def mask_sensitive(value: Any, marked: set[str], prefix: str = "") -> Any:
+    if not marked:
+        return value
+    if prefix and is_marked(prefix, marked):
+        return SENSITIVE
+    if isinstance(value, dict):
+        return {k: mask_sensitive(v, marked, f"{prefix}.{k}" if prefix else str(k)) for k, v in value.items()}
+    if isinstance(value, list):
+        return [mask_sensitive(v, marked, f"{prefix}.{i}" if prefix else str(i)) for i, v in enumerate(value)]
+    return value
+
+
+def instance_address(item: dict) -> str:
+    parts = [item["module"]] if item.get("module") else []
+    parts.append(("data." if item.get("mode") == "data" else "") + f"{item.get('type')}.{item.get('name')}")
+    address = ".".join(parts)
+    key = item.get("index_key")
+    if key is not None:
+        address += f"[{json.dumps(key)}]"
+    return address
+
+
+def provider_name(raw: str) -> str:
+    """`provider["registry.terraform.io/hashicorp/aws"].east` -> `registry.terraform.io/hashicorp/aws.east`."""
+    match = _PROVIDER.search(raw or "")
+    if not match:
+        return raw or ""
+    alias = raw[match.end():]
+    return match.group(1) + alias
+
+
+def parse_where(expr: str) -> tuple[str, str, str]:
+    """`tags.Env=prod`, `instance_type!=t3.micro`, `arn~:prod:` (contains)."""
+    match = _WHERE.match(expr)
+    if not match:
+        raise Exception(f"Invalid attribute filter '{expr}' (expected path=value, path!=value or path~text)")
+    return match.group("path").strip(), match.group("op"), match.group("value")
+
+
+def _matches(attrs: dict[str, Any], path: str, op: str, value: str) -> bool:
+    actual = attrs.get(path)
+    text = actual if isinstance(actual, str) else json.dumps(actual)
+    if op == "=":
+        return text == value
+    if op == "!=":
+        return text != value
+    return value in text
+
+
+class StateIndex:
+    def __init__(self):
+        self.header: dict = {}
+        self.records: dict[str, StateRecord] = {}
+        self.by_type: dict[str, set[str]] = {}
+        self.by_module: dict[str, set[str]] = {}
+        self.by_provider: dict[str, set[str]] = {}
+
+    @property
+    def serial(self) -> Optional[int]:
+        return self.header.get("serial")
+
+    def feed_lines(self, lines: Iterable[str]) -> "StateIndex":
+        for line in lines:
+            self.feed_line(line)
+        return self
+
+    def feed_line(self, line: str) -> None:
+        line = line.strip()
+        if not line:
+            return
+        item = json.loads(line)
+        if "lineage" in item:
+            self.header = item
+            return
+        record = StateRecord(
+            address=instance_address(item),
+            type=item.get("type", ""),
+            module=item.get("module") or ROOT_MODULE,
+            provider=provider_name(item.get("provider", "")),
+            attributes=json.dumps(item.get("attributes") or {}, sort_keys=True, separators=(",", ":")),
+            sensitive=sensitive_paths(item.get("sensitive")),
+        )
+        self.records[record.address] = record
+        self.by_type.setdefault(record.type, set()).add(record.address)
+        self.by_module.setdefault(record.module, set()).add(record.address)
+        self.by_provider.setdefault(record.provider, set()).add(record.address)
+
+    def query(
+        self,
+        address: str = "*",
+        resource_type: Optional[str] = None,
+        module: Optional[str] = None,
+        provider: Optional[str] = None,
+        where: Iterable[str] = (),
+    ) -> list[StateRecord]:
+        """Address glob + type/module/provider (secondary indexes) + attribute filters."""
+        candidates: Optional[set[str]] = None
+        if resource_type:
+            candidates = set(self.by_type.get(resource_type, ()))
+        if module:
+            found = self.by_module.get(module, set())
+            candidates = found if candidates is None else candidates & found
+        if provider:
+            found = set().union(*(a for p, a in self.by_provider.items() if p.endswith(provider)))
+            candidates = found if candidates is None else candidates & found
+        addresses = sorted(self.records if candidates is None else candidates)
+        if address != "*":
+            addresses = fnmatch.filter(addresses, address)
+
+        filters = [parse_where(w) for w in where]
+        result = []
+        for addr in addresses:
+            record = self.records[addr]
+            if filters:
+                attrs = flatten(record.attrs())
+                if not all(_matches(attrs, *f) for f in filters):
+                    continue
+            result.append(record)
+        return result
+
+    def counts(self, records: Iterable[StateRecord], by: str = "type") -> dict[str, int]:
+        totals: dict[str, int] = {}
+        for record in records:
+            key = getattr(record, by)
+            totals[key] = totals.get(key, 0) + 1
+        return dict(sorted(totals.items(), key=lambda kv: (-kv[1], kv[0])))
+
+
+def state_drift(before: StateIndex, after: StateIndex, max_attributes: int = 20) -> dict:
+    """Added/removed instances and changed attributes between two snapshots."""
+    added = sorted(a for a in after.records if a not in before.records)
+    removed = sorted(a for a in before.records if a not in after.records)
+    changed = []
+    for address, record in before.records.items():
+        other = after.records.get(address)
+        # Attributes are serialized with sorted keys: equal strings mean equal values
+        if other is None or other.attributes == record.attributes:
+            continue
+        old, new = flatten(record.attrs()), flatten(other.attrs())
+        paths = sorted(p for p in set(old) | set(new) if old.get(p) != new.get(p))
+        # Changes to sensitive values are reported, their values are not
+        marked = set(record.sensitive) | set(other.sensitive)
+        changed.append({
+            "address": address,
+            "attributes": [
+                {"path": p, "before": SENSITIVE, "after": SENSITIVE} if hides(p, marked)
+                else {"path": p, "before": old.get(p), "after": new.get(p)}
+                for p in paths[:max_attributes]
+            ],
+            "omitted": max(len(paths) - max_attributes, 0),
+        })
+    changed.sort(key=lambda c: c["address"])
+    return {
+        "before": {"serial": before.serial, "instances": len(before.records)},
+        "after": {"serial": after.serial, "instances": len(after.records)},
+        "added": added,
+        "removed": removed,
+        "changed": changed,
+    }
+
+
+def drift_markdown(drift: dict) -> str:
+    md_lines = [
+        "## Terraform State Drift",
+        f"**Serial:** {drift['before']['serial']} → {drift['after']['serial']} | "
+        f"**Instances:** {drift['before']['instances']} → {drift['after']['instances']}",
+        f"**Added:** {len(drift['added'])} | **Removed:** {len(drift['removed'])} | **Changed:** {len(drift['changed'])}",
+    ]
+    for title, addresses in (("Added", drift["added"]), ("Removed", drift["removed"])):
+        if addresses:
+            md_lines += ["", f"### {title}", ""] + [f"- `{a}`" for a in addresses]
+    if drift["changed"]:
+        md_lines += ["", "### Changed", "", "| Address | Attribute | Before | After |", "| :--- | :--- | :--- | :--- |"]
+        for change in drift["changed"]:
+            for attr in change["attributes"]:
+                md_lines.append(
+                    f"| `{change['address']}` | {attr['path']} | `{json.dumps(attr['before'])[:60]}` | `{json.dumps(attr['after'])[:60]}` |"
+                )
+    return "\n".join(md_lines)
@@ -0,0 +1,134 @@
+"""
+Batched state operations (rm / mv / import).
+
+The state is pulled once into a local file, every operation runs against
+that file (`-state=`), and the result is pushed back in a single
+`terraform state push`. `terraform import` ignores `-state=` on remote
+backends, so when the batch has imports a `local` backend override pointing
+at the work file is installed for the operations and removed before the push.
+Terraform offers no way to hold the backend lock across several commands,
+so the batch is not one locked transaction. Instead it is optimistic:
+right before pushing, the remote lineage/serial is read again and the push
+is aborted if either changed since the pull. The work file's serial is then
+set to the pulled serial + 1, so a write that lands after that re-check
+leaves the remote at the same or a higher serial and `terraform state push`
+(no `-force`) rejects the push under its own lock instead of overwriting it.
+A dry run never touches the remote state, so the report shows exactly what
+would happen.
+"""
+import shlex
+from dataclasses import dataclass, asdict
+
+WORK_STATE = "/tmp/work.tfstate"
+RESULTS_FILE = "/tmp/state_ops_results.tsv"
+BACKEND_OVERRIDE = "zz_state_batch_override.tf"
+
+# Exit codes of batch_script
+EXIT_PULL_FAILED = 10
+EXIT_BACKEND_FAILED = 11
+EXIT_REMOTE_CHANGED = 12
+EXIT_PUSH_FAILED = 13
+
+_FINGERPRINT = "jq -r '\"\\(.lineage):\\(.serial)\"'"
+
+_ARITY = {"rm": 1, "mv": 2, "import": 2}
+
+
+@dataclass
+class StateOperation:
+    index: int
+    kind: str
+    args: list[str]
+    status: str = "pending"  # ok | failed | skipped
+    message: str = ""
+
+    def command(self) -> list[str]:
+        if self.kind == "import":
+            return ["terraform", "import", "-input=false", "-no-color", f"-state={WORK_STATE}"] + self.args
+        return ["terraform", "state", self.kind, f"-state={WORK_STATE}"] + self.args
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def parse_operations(specs: list[str]) -> list[StateOperation]:
+    """`rm ADDR`, `mv SRC DST`, `import ADDR ID` (shell quoting allowed for addresses with keys)."""
+    operations = []
+    for index, spec in enumerate(specs):
+        parts = shlex.split(spec)
+        if not parts or parts[0] not in _ARITY or len(parts) - 1 != _ARITY[parts[0]]:
+            raise Exception(f"Invalid state operation '{spec}' (expected 'rm ADDR', 'mv SRC DST' or 'import ADDR ID')")
+        operations.append(StateOperation(index, parts[0], parts[1:]))
+    return operations
+
+
+def batch_script(operations: list[StateOperation], dry_run: bool) -> str:
+    """Shell script: pull, run each operation (stop at the first failure), re-check the remote, push unless dry run."""
+    local_backend = any(op.kind == "import" for op in operations)
+    lines = [
+        "set -u",
+        f": > {RESULTS_FILE}",
+        f"terraform state pull > {WORK_STATE} || exit {EXIT_PULL_FAILED}",
+        f"pulled=$({_FINGERPRINT} {WORK_STATE})",
+        f"pulled_serial=$(jq -r .serial {WORK_STATE})",
+        "failed=0",
+        'run_op() { idx=$1; shift; '
+        'if [ "$failed" = 1 ]; then printf "%s\\tskipped\\t\\n" "$idx" >> ' + RESULTS_FILE + '; return; fi; '
+        'out=$("$@" 2>&1); rc=$?; msg=$(printf "%s" "$out" | grep -v "^$" | tail -n 1 | tr "\\t" " "); '
+        'if [ $rc = 0 ]; then status=ok; else status=failed; failed=1; fi; '
+        'printf "%s\\t%s\\t%s\\n" "$idx" "$status" "$msg" >> ' + RESULTS_FILE + '; }',
+    ]
+    if local_backend:
+        # import writes to the configured backend: point it at the work file for the operations
+        lines += [
+            f"printf 'terraform {{\\n  backend \"local\" {{\\n    path = \"{WORK_STATE}\"\\n  }}\\n}}\\n' > {BACKEND_OVERRIDE}",
+            f"terraform init -reconfigure -input=false > /dev/null || exit {EXIT_BACKEND_FAILED}",
+        ]
+    lines += [f"run_op {op.index} {shlex.join(op.command())}" for op in operations]
+    if local_backend:
+        lines += [
+            f"rm -f {BACKEND_OVERRIDE}",
+            f"terraform init -reconfigure -input=false > /dev/null || exit {EXIT_BACKEND_FAILED}",
+        ]
+    if dry_run:
+        lines.append('echo "Dry run: state not pushed"')
+    else:
+        lines += [
+            'if [ "$failed" = 0 ]; then',
+            f"  current=$(terraform state pull | {_FINGERPRINT}) || exit {EXIT_PULL_FAILED}",
+            f'  if [ "$current" != "$pulled" ]; then echo "Remote state changed ($pulled -> $current): not pushed" >&2; exit {EXIT_REMOTE_CHANGED}; fi',
+            # One serial above the pull: push refuses it if anything was written since
+            f"  jq --argjson s \"$((pulled_serial + 1))\" '.serial = $s' {WORK_STATE} > {WORK_STATE}.push || exit {EXIT_PUSH_FAILED}",
+            f"  terraform state push {WORK_STATE}.push || exit {EXIT_PUSH_FAILED}",
+            'else echo "Operation failed: state not pushed"; fi',
+        ]
+    return "\n".join(lines)
+
+
+def apply_results(operations: list[StateOperation], results: str) -> None:
+    by_index = {op.index: op for op in operations}
+    for line in results.splitlines():
+        index, _, rest = line.partition("\t")
+        status, _, message = rest.partition("\t")
+        if index.isdigit() and int(index) in by_index:
+            by_index[int(index)].status = status
+            by_index[int(index)].message = message
+
+
+def report_markdown(operations: list[StateOperation], dry_run: bool, pushed: bool) -> str:
+    icons = {"ok": "✅", "failed": "❌", "skipped": "⏭️", "pending": "⏳"}
+    failed = any(op.status != "ok" for op in operations)
+    result = "🔍 DRY RUN" if dry_run else ("✅ PUSHED" if pushed else "❌ NOT PUSHED")
+    md_lines = [
+        "## Terraform State Batch",
+        f"**Result:** {result} | **Operations:** {len(operations)}"
+        + (" | some operations failed, the remote state was left untouched" if failed and not dry_run else ""),
+        "",
+        "| # | Operation | Status | Message |",
+        "| ---: | :--- | :--- | :--- |",
+    ]
+    for op in operations:
+        md_lines.append(
+            f"| {op.index} | `{op.kind} {' '.join(op.args)}` | {icons.get(op.status, '')} {op.status} | {op.message.replace('|', '/')} |"
+        )
+    return "\n".join(md_lines)
@@ -0,0 +1,354 @@
+"""
+Indexed Zuul job graph and change-impact analysis.
+
+The container flattens every config file into one JSON line per item
+(`LOAD_CONFIG_SCRIPT`); this module builds the index from those lines:
+job variants by name, parent links, project/template pipelines. Each
+distinct `files` / `irrelevant-files` list is compiled once into a single
+alternation regex and evaluated once per change set, so thousands of jobs
+sharing a handful of matchers cost a handful of regex runs.
+"""
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+from .lint import ZUUL_YAML_LOADER
+
+BASE_JOB = "base"
+PROJECT_KEYS = {"name", "templates", "default-branch", "merge-mode", "vars", "queue", "description", "branches"}
+
+# Flattens zuul.yaml / .zuul.yaml / zuul.d / .zuul.d into {"file", "type", "body"} lines.
+# Unknown tags (e.g. !encrypted/pkcs1-oaep secrets) are loaded as null.
+LOAD_CONFIG_SCRIPT = ZUUL_YAML_LOADER + """
+import glob, json, os, sys
+
+paths = [p for p in ("zuul.yaml", ".zuul.yaml") if os.path.isfile(p)]
+for d in ("zuul.d", ".zuul.d"):
+    paths += sorted(glob.glob(f"{d}/**/*.yaml", recursive=True) + glob.glob(f"{d}/**/*.yml", recursive=True))
+for path in paths:
+    try:
+        with open(path) as f:
+            items = yaml.load(f, Loader=Loader) or []
+    except yaml.YAMLError as e:
+        print(json.dumps({"file": path, "type": "error", "body": str(e)}))
+        continue
+    for item in items if isinstance(items, list) else []:
+        if isinstance(item, dict) and len(item) == 1:
+            (kind, body), = item.items()
+            print(json.dumps({"file": path, "type": kind, "body": body}, default=str))
+"""
+
+
+def _as_list(value) -> list[str]:
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else [str(v) for v in value]
+
+
+class Matcher:
+    """A `files` / `irrelevant-files` list compiled into one regex."""
+
+    __slots__ = ("patterns", "regex")
+
+    def __init__(self, patterns: tuple[str, ...]):
+        """Raises `re.error` naming the first invalid pattern."""
+        self.patterns = patterns
+        try:
+            self.regex = re.compile("|".join(f"(?:{p})" for p in patterns))
+        except re.error:
+            for p in patterns:
+                try:
+                    re.compile(f"(?:{p})")
+                except re.error as e:
+                    raise re.error(f"invalid pattern '{p}': {e.msg}") from None
+            raise
+
+    def any(self, files: list[str]) -> bool:
+        match = self.regex.match
+        return any(match(f) for f in files)
+
+    def all(self, files: list[str]) -> bool:
+        match = self.regex.match
+        return all(match(f) for f in files)
+
+
+@dataclass
+class JobVariant:
+    name: str
+    file: str
+    parent: Optional[str]
+    implicit_parent: bool = False
+    abstract: bool = False
+    files: Optional[tuple[str, ...]] = None
+    irrelevant_files: Optional[tuple[str, ...]] = None
+    branches: list[str] = field(default_factory=list)
+
+
+@dataclass
+class PipelineJob:
+    """A job reference in a project (or template) pipeline, with its local matcher overrides."""
+    name: str
+    source: str  # project name or "template:<name>"
+    files: Optional[tuple[str, ...]] = None
+    irrelevant_files: Optional[tuple[str, ...]] = None
+
+
+def _matcher_attrs(body: dict) -> tuple[Optional[tuple[str, ...]], Optional[tuple[str, ...]]]:
+    files = tuple(_as_list(body["files"])) if "files" in body else None
+    irrelevant = tuple(_as_list(body["irrelevant-files"])) if "irrelevant-files" in body else None
+    return files, irrelevant
+
+
+def _pipelines(body: dict, source: str) -> dict[str, list[PipelineJob]]:
+    pipelines: dict[str, list[PipelineJob]] = {}
+    for pipeline, config in body.items():
+        if pipeline in PROJECT_KEYS or not isinstance(config, dict):
+            continue
+        jobs = []
+        for entry in config.get("jobs") or []:
+            if isinstance(entry, str):
+                jobs.append(PipelineJob(entry, source))
+            elif isinstance(entry, dict) and len(entry) == 1:
+                (name, overrides), = entry.items()
+                jobs.append(PipelineJob(name, source, *_matcher_attrs(overrides or {})))
+        pipelines[pipeline] = jobs
+    return pipelines
+
+
+class JobGraph:
+    def __init__(self):
+        self.variants: dict[str, list[JobVariant]] = {}
+        self.templates: dict[str, dict[str, list[PipelineJob]]] = {}
+        self.projects: dict[str, dict[str, list[PipelineJob]]] = {}
+        self.project_templates: dict[str, list[str]] = {}
+        self.load_errors: list[dict] = []
+        self._matchers: dict[tuple[str, ...], Matcher] = {}
+
+    # --- Loading ---
+
+    def feed_lines(self, lines: Iterable[str]) -> "JobGraph":
+        for line in lines:
+            self.feed_line(line)
+        return self
+
+    def feed_line(self, line: str) -> None:
+        line = line.strip()
+        if not line:
+            return
+        item = json.loads(line)
+        kind, body, path = item["type"], item["body"], item["file"]
+        if kind == "error":
+            self.load_errors.append({"file": path, "message": body})
+        elif kind == "job" and isinstance(body, dict) and body.get("name"):
+            files, irrelevant = (self._checked(m, path) for m in _matcher_attrs(body))
+            self.variants.setdefault(body["name"], []).append(JobVariant(
+                name=body["name"],
+                file=path,
+                # Without 'parent' a job inherits from the tenant base job; 'parent: null' makes it a base job
+                parent=body["parent"] if "parent" in body else (None if body["name"] == BASE_JOB else BASE_JOB),
+                implicit_parent="parent" not in body,
+                abstract=bool(body.get("abstract")),
+                files=files,
+                irrelevant_files=irrelevant,
+                branches=_as_list(body.get("branches")),
+            ))
+        elif kind == "project-template" and isinstance(body, dict) and body.get("name"):
+            self.templates[body["name"]] = self._checked_pipelines(_pipelines(body, f"template:{body['name']}"), path)
+        elif kind == "project" and isinstance(body, dict):
+            name = body.get("name") or path  # in-repo project stanzas usually omit the name
+            pipelines = self.projects.setdefault(name, {})
+            for pipeline, jobs in self._checked_pipelines(_pipelines(body, name), path).items():
+                pipelines.setdefault(pipeline, []).extend(jobs)
+            self.project_templates.setdefault(name, []).extend(_as_list(body.get("templates")))
+
+    def _checked(self, patterns: Optional[tuple[str, ...]], path: str) -> Optional[tuple[str, ...]]:
+        """
+        Compiles the matcher up front. Zuul rejects a config with an invalid regex: the list is
+        reported in `load_errors` and ignored, so the job is treated as unfiltered (it runs).
+        """
+        if patterns is None:
+            return None
+        try:
+            self._matcher(patterns)
+        except re.error as e:
+            self.load_errors.append({"file": path, "message": str(e)})
+            return None
+        return patterns
+
+    def _checked_pipelines(self, pipelines: dict[str, list[PipelineJob]], path: str) -> dict[str, list[PipelineJob]]:
+        for jobs in pipelines.values():
+            for job in jobs:
+                job.files = self._checked(job.files, path)
+                job.irrelevant_files = self._checked(job.irrelevant_files, path)
+        return pipelines
+
+    # --- Inheritance ---
+
+    def parent(self, name: str) -> Optional[str]:
+        variants = self.variants.get(name)
+        return variants[0].parent if variants else None  # the first variant is the reference definition
+
+    def chain(self, name: str) -> list[str]:
+        """`name` followed by its ancestors; stops at an undefined parent or a cycle."""
+        chain, seen = [], set()
+        current: Optional[str] = name
+        while current and current not in seen:
+            chain.append(current)
+            seen.add(current)
+            if current not in self.variants:
+                break
+            current = self.parent(current)
+        return chain
+
+    def undefined_parents(self) -> dict[str, list[str]]:
+        """
+        Parent name -> jobs referencing it (may live in another config repo). The implicit
+        tenant base job is not reported: untrusted projects never define it.
+        """
+        missing: dict[str, list[str]] = {}
+        for name, variants in self.variants.items():
+            parent = variants[0].parent
+            if parent and parent not in self.variants and not variants[0].implicit_parent:
+                missing.setdefault(parent, []).append(name)
+        return {p: sorted(jobs) for p, jobs in sorted(missing.items())}
+
+    def cycles(self) -> list[list[str]]:
+        """Each inheritance cycle once, starting at its smallest job name."""
+        state: dict[str, int] = {}  # 1 = on the current path, 2 = done
+        found: set[tuple[str, ...]] = set()
+        for start in self.variants:
+            path: list[str] = []
+            current: Optional[str] = start
+            while current in self.variants and state.get(current) != 2:
+                if state.get(current) == 1:
+                    cycle = path[path.index(current):]
+                    pivot = cycle.index(min(cycle))
+                    found.add(tuple(cycle[pivot:] + cycle[:pivot]))
+                    break
+                state[current] = 1
+                path.append(current)
+                current = self.parent(current)
+            for name in path:
+                state[name] = 2
+        return [list(c) for c in sorted(found)]
+
+    # --- Matchers ---
+
+    def _matcher(self, patterns: tuple[str, ...]) -> Matcher:
+        matcher = self._matchers.get(patterns)
+        if matcher is None:
+            matcher = self._matchers[patterns] = Matcher(patterns)
+        return matcher
+
+    def effective_matchers(self, name: str) -> tuple[Optional[tuple[str, ...]], Optional[tuple[str, ...]]]:
+        """
+        Matchers are inherited: the closest job in the chain that sets one wins. Within a job,
+        later variants override earlier ones, as in Zuul, so variants are read last to first.
+        Variant `branches` are not evaluated: every variant is assumed to apply.
+        """
+        files = irrelevant = None
+        for job in self.chain(name):
+            for variant in reversed(self.variants.get(job, [])):
+                if files is None and variant.files is not None:
+                    files = variant.files
+                if irrelevant is None and variant.irrelevant_files is not None:
+                    irrelevant = variant.irrelevant_files
+        return files, irrelevant
+
+    # --- Change impact ---
+
+    def project_jobs(self, project: Optional[str] = None) -> dict[str, list[PipelineJob]]:
+        """Pipeline -> job references of the project(s), templates expanded."""
+        names = [project] if project else sorted(self.projects)
+        if project and project not in self.projects:
+            raise Exception(f"Project '{project}' not found (known: {', '.join(sorted(self.projects)) or 'none'})")
+        result: dict[str, list[PipelineJob]] = {}
+        for name in names:
+            for template in self.project_templates.get(name, []):
+                for pipeline, jobs in self.templates.get(template, {}).items():
+                    result.setdefault(pipeline, []).extend(jobs)
+            for pipeline, jobs in self.projects[name].items():
+                result.setdefault(pipeline, []).extend(jobs)
+        return result
+
+    def impact(self, changed_files: list[str], project: Optional[str] = None) -> dict:
+        """
+        Which jobs the changed files trigger, per pipeline. Without project stanzas every
+        non-abstract job is evaluated under a synthetic "(all jobs)" pipeline.
+        """
+        files = [f for f in changed_files if f and f != "/COMMIT_MSG"]
+        changed = set(files)
+        results: dict[tuple[str, ...], tuple[bool, bool]] = {}  # patterns -> (any, all)
+
+        def evaluate(patterns: tuple[str, ...]) -> tuple[bool, bool]:
+            if patterns not in results:
+                matcher = self._matcher(patterns)
+                results[patterns] = (matcher.any(files), matcher.all(files))
+            return results[patterns]
+
+        if self.projects:
+            pipelines = self.project_jobs(project)
+        else:
+            pipelines = {"(all jobs)": [PipelineJob(n, "") for n, v in sorted(self.variants.items()) if not v[0].abstract]}
+
+        report: dict[str, dict] = {}
+        for pipeline, refs in sorted(pipelines.items()):
+            triggered, skipped = {}, {}
+            for ref in refs:
+                files_m, irrelevant_m = self.effective_matchers(ref.name)
+                if ref.files is not None:
+                    files_m = ref.files
+                if ref.irrelevant_files is not None:
+                    irrelevant_m = ref.irrelevant_files
+                config_files = {v.file for job in self.chain(ref.name) for v in self.variants.get(job, [])}
+
+                if changed & config_files:
+                    triggered[ref.name] = "job configuration changed"
+                elif files_m and not evaluate(files_m)[0]:
+                    skipped[ref.name] = "no file matches 'files'"
+                elif irrelevant_m and files and evaluate(irrelevant_m)[1]:
+                    skipped[ref.name] = "all files match 'irrelevant-files'"
+                elif ref.name not in triggered:
+                    triggered[ref.name] = "files match" if files_m or irrelevant_m else "no file matchers"
+            for name in triggered:
+                skipped.pop(name, None)
+            report[pipeline] = {"triggered": triggered, "skipped": skipped}
+        return {"changed_files": files, "matchers_evaluated": len(results), "pipelines": report}
+
+    def summary(self) -> dict:
+        return {
+            "jobs": len(self.variants),
+            "variants": sum(len(v) for v in self.variants.values()),
+            "projects": len(self.projects),
+            "templates": len(self.templates),
+            "cycles": self.cycles(),
+            "undefined_parents": self.undefined_parents(),
+            "load_errors": self.load_errors,
+        }
+
+
+def graph_markdown(summary: dict, impact: Optional[dict], chains: dict[str, list[str]]) -> str:
+    md_lines = [
+        "## Zuul Job Graph",
+        f"**Jobs:** {summary['jobs']} ({summary['variants']} variants) | **Projects:** {summary['projects']} | "
+        f"**Templates:** {summary['templates']} | **Cycles:** {len(summary['cycles'])} | "
+        f"**Undefined parents:** {len(summary['undefined_parents'])}",
+    ]
+    if summary["load_errors"]:
+        md_lines += ["", "### ❌ Load Errors", ""] + [f"- `{e['file']}`: {e['message'].splitlines()[0]}" for e in summary["load_errors"]]
+    if summary["cycles"]:
+        md_lines += ["", "### ❌ Inheritance Cycles", ""] + [f"- {' → '.join(c + [c[0]])}" for c in summary["cycles"]]
+    if summary["undefined_parents"]:
+        md_lines += ["", "### ⚠️ Undefined Parents", "", "| Parent | Referenced by |", "| :--- | :--- |"]
+        md_lines += [f"| `{p}` | {', '.join(jobs)} |" for p, jobs in summary["undefined_parents"].items()]
+    if impact is not None:
+        md_lines += ["", f"### Change Impact ({len(impact['changed_files'])} files)"]
+        for pipeline, result in impact["pipelines"].items():
+            md_lines += ["", f"#### {pipeline}: {len(result['triggered'])} triggered, {len(result['skipped'])} skipped", "",
+                         "| Job | Result | Reason | Inheritance |", "| :--- | :--- | :--- | :--- |"]
+            for name, reason in sorted(result["triggered"].items()):
+                md_lines.append(f"| `{name}` | ✅ run | {reason} | {' → '.join(chains.get(name, [name]))} |")
+            for name, reason in sorted(result["skipped"].items()):
+                md_lines.append(f"| `{name}` | ⏭️ skip | {reason} | {' → '.join(chains.get(name, [name]))} |")
+    return "\n".join(md_lines)
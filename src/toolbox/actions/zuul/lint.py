@@ -0,0 +1,169 @@
+"""
+Incremental Zuul config and playbook linting.
+
+Each file gets a cache key (its sha256 + lint configuration + roles tree +
+tool versions). Files whose key already has a stored result are skipped;
+the rest are checked in one YAML pass and in parallel ansible-lint groups.
+All results end up as `Finding`s (file, line, rule) in a single report.
+"""
+import hashlib
+import json
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+ZUUL_CONFIG_PATHS = ["zuul.yaml", ".zuul.yaml", "zuul.d", ".zuul.d"]
+PLAYBOOK_PATHS = ["playbooks"]
+LINT_CONFIG_FILES = [".ansible-lint", ".ansible-lint.yml", ".ansible-lint.yaml", ".yamllint", ".yamllint.yml", ".yamllint.yaml"]
+
+# Prints "<kind> <sha256> <path>" for every lintable file, then the config and roles hashes
+HASH_FILES_CMD = (
+    "for kind in zuul playbook; do "
+    f'if [ $kind = zuul ]; then paths="{" ".join(ZUUL_CONFIG_PATHS)}"; else paths="{" ".join(PLAYBOOK_PATHS)}"; fi; '
+    "for p in $paths; do [ -e \"$p\" ] || continue; "
+    "find \"$p\" -type f \\( -name '*.yaml' -o -name '*.yml' \\) | sort | xargs -r sha256sum | sed \"s|^|$kind |\"; done; done; "
+    f"echo \"config $(cat {' '.join(LINT_CONFIG_FILES)} 2>/dev/null | sha256sum | cut -d' ' -f1) -\"; "
+    "echo \"roles $( (find roles -type f 2>/dev/null | sort | xargs -r sha256sum) | sha256sum | cut -d' ' -f1) -\""
+)
+
+# Safe loader shared by the in-container scripts: unknown tags such as
+# !encrypted/pkcs1-oaep (Zuul secrets) are valid config and load as null
+ZUUL_YAML_LOADER = """
+import yaml
+
+class Loader(yaml.SafeLoader):
+    pass
+
+Loader.add_multi_constructor("!", lambda loader, suffix, node: None)
+"""
+
+# Loads every file given on argv and prints one JSON finding per broken file
+YAML_CHECK_SCRIPT = ZUUL_YAML_LOADER + """
+import json, sys
+for path in sys.argv[1:]:
+    try:
+        with open(path) as f:
+            data = yaml.load(f, Loader=Loader)
+        if data is not None and not isinstance(data, list):
+            print(json.dumps({"file": path, "line": 1, "rule": "zuul[structure]", "message": "Zuul config must be a list of items"}))
+    except yaml.YAMLError as e:
+        mark = getattr(e, "problem_mark", None)
+        print(json.dumps({"file": path, "line": mark.line + 1 if mark else 1, "rule": "yaml[syntax]", "message": str(getattr(e, "problem", None) or e)}))
+"""
+_YAML_CHECK_DIGEST = hashlib.sha256(YAML_CHECK_SCRIPT.encode()).hexdigest()
+
+
+@dataclass
+class Finding:
+    file: str
+    line: int
+    rule: str
+    message: str
+    severity: str = "error"
+    tool: str = "yaml"
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+@dataclass
+class LintFile:
+    kind: str  # zuul | playbook
+    path: str
+    sha256: str
+    key: str = ""
+
+
+def parse_hashes(output: str) -> tuple[list[LintFile], str]:
+    """Files from HASH_FILES_CMD plus the environment hash (config + roles) shared by every key."""
+    files, env = [], []
+    for line in output.splitlines():
+        parts = line.split(None, 2)
+        if len(parts) != 3:
+            continue
+        kind, digest, path = parts
+        if kind in ("config", "roles"):
+            env.append(f"{kind}:{digest}")
+        else:
+            files.append(LintFile(kind, path.strip(), digest))
+    return files, "|".join(env)
+
+
+def assign_keys(files: list[LintFile], env_hash: str, tool_versions: str) -> None:
+    for f in files:
+        material = f"{f.kind}|{f.path}|{f.sha256}|{tool_versions}"
+        if f.kind == "zuul":
+            material += f"|{_YAML_CHECK_DIGEST}"  # results change with the checker itself
+        if f.kind == "playbook":
+            material += f"|{env_hash}"  # ansible-lint reads the rules config and resolves roles
+        f.key = hashlib.sha256(material.encode()).hexdigest()
+
+
+def parse_yaml_findings(output: str) -> list[Finding]:
+    findings = []
+    for line in output.splitlines():
+        if line.strip():
+            item = json.loads(line)
+            findings.append(Finding(item["file"], item["line"], item["rule"], item["message"]))
+    return findings
+
+
+def parse_ansible_lint(output: str) -> list[Finding]:
+    """ansible-lint `-f codeclimate` output (a JSON array of issues)."""
+    findings = []
+    for issue in json.loads(output or "[]"):
+        location = issue.get("location", {})
+        lines = location.get("lines", {})
+        line = lines.get("begin", 1)
+        if isinstance(line, dict):
+            line = line.get("line", 1)
+        findings.append(Finding(
+            file=location.get("path", ""),
+            line=int(line or 1),
+            rule=issue.get("check_name", ""),
+            message=issue.get("description", "").strip(),
+            severity="warning" if issue.get("severity") in ("info", "minor") else "error",
+            tool="ansible-lint",
+        ))
+    return findings
+
+
+def group_playbooks(files: list[LintFile], groups: int) -> list[list[LintFile]]:
+    """Keeps each playbook directory together and balances the groups by file count."""
+    by_dir: dict[str, list[LintFile]] = {}
+    for f in files:
+        parts = f.path.split("/")
+        by_dir.setdefault("/".join(parts[:2]) if len(parts) > 2 else f.path, []).append(f)
+    buckets: list[list[LintFile]] = [[] for _ in range(max(1, min(groups, len(by_dir))))]
+    for members in sorted(by_dir.values(), key=len, reverse=True):
+        min(buckets, key=len).extend(members)
+    return [b for b in buckets if b]
+
+
+def report_dict(findings: list[Finding], total: int, cached: int) -> dict:
+    return {
+        "files": total,
+        "cached": cached,
+        "linted": total - cached,
+        "errors": sum(1 for f in findings if f.severity == "error"),
+        "warnings": sum(1 for f in findings if f.severity == "warning"),
+        "findings": [f.to_dict() for f in sorted(findings, key=lambda f: (f.file, f.line, f.rule))],
+    }
+
+
+def report_markdown(findings: list[Finding], total: int, cached: int, max_rows: Optional[int] = 500) -> str:
+    summary = report_dict(findings, total, cached)
+    status = "✅ PASSED" if not summary["errors"] else "❌ FAILED"
+    md_lines = [
+        "## Zuul Lint Report",
+        f"**Status:** {status} | **Files:** {total} ({cached} cached) | "
+        f"**Errors:** {summary['errors']} | **Warnings:** {summary['warnings']}",
+    ]
+    rows = summary["findings"]
+    if rows:
+        md_lines += ["", "| File | Line | Rule | Message |", "| :--- | ---: | :--- | :--- |"]
+        for f in rows[:max_rows] if max_rows else rows:
+            message = f["message"].replace("|", "\\|").replace("\n", " ")
+            md_lines.append(f"| `{f['file']}` | {f['line']} | {f['rule']} | {message} |")
+        if max_rows and len(rows) > max_rows:
+            md_lines += ["", f"_{len(rows) - max_rows} more findings in the JSON report._"]
+    return "\n".join(md_lines)
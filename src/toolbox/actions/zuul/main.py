@@ -1,6 +1,31 @@
 import dagger
-from dagger import object_type, function, Directory, Container, dag, Doc
+from dagger import object_type, function, Directory, Container, dag, Doc, Ignore, ReturnType
 from typing import Annotated, Optional
+import asyncio
+import json
+import shlex
+import time
+
+from ...common.sources import ZUUL_IGNORE, prepare_source
+from ...common.streaming import iter_lines
+from .graph import LOAD_CONFIG_SCRIPT, JobGraph, graph_markdown
+from .lint import (
+    HASH_FILES_CMD,
+    YAML_CHECK_SCRIPT,
+    Finding,
+    LintFile,
+    assign_keys,
+    group_playbooks,
+    parse_ansible_lint,
+    parse_hashes,
+    parse_yaml_findings,
+    report_dict,
+    report_markdown,
+)
+
+LINT_CACHE_DIR = "/lint-cache"
+LINT_CACHE_MAX_ENTRIES = 20000
+TOOL_VERSIONS_CMD = "pip show ansible-lint ansible-core pyyaml 2>/dev/null | grep -E '^(Name|Version):'"
 
 @object_type
 class Zuul:
@@ -16,7 +41,9 @@ class Zuul:
         return (
             dag.container()
             .from_("python:3.11-slim")
-            .with_exec(["pip", "install", "zuul-client", "ansible-lint", "pyyaml"])
+            # The install layer is reused by the engine; the pip cache keeps rebuilds (after a prune) fast
+            .with_mounted_cache("/root/.cache/pip", dag.cache_volume("zuul-pip-cache"))
+            .with_exec(["pip", "install", "--disable-pip-version-check", "zuul-client", "ansible-lint", "pyyaml"])
         )
 
     @function
@@ -24,7 +51,7 @@ class Zuul:
     def generate_job(
         self,
         # O 'source' deve vir primeiro porque não tem valor padrão (=)
-        source: Annotated[Directory, Doc("Target directory to save the yaml")],
+        source: Annotated[Directory, Doc("Target directory to save the yaml"), Ignore(ZUUL_IGNORE)],
         name: Annotated[str, Doc("Name of the Zuul job")],
         parent: Annotated[str, Doc("Parent job (e.g., base, python-test)")] = "base",
         nodeset: Annotated[str, Doc("Nodeset name")] = "ubuntu-jammy",
@@ -60,17 +87,157 @@ class Zuul:
     @function
     async def lint(
         self,
-        source: Annotated[Directory, Doc("The directory containing zuul.d/")]
+        source: Annotated[Directory, Doc("The directory containing zuul.d/"), Ignore(ZUUL_IGNORE)],
+        max_parallel: Annotated[int, Doc("Number of ansible-lint containers running in parallel")] = 4,
+        report_format: Annotated[str, Doc("Report format: markdown or json")] = "markdown",
+        fail_on_error: Annotated[bool, Doc("Raise when errors are found (warnings never fail)")] = True,
+        use_cache: Annotated[bool, Doc("Reuse stored results for unchanged files")] = True
     ) -> str:
         """
-        Validates Zuul YAML syntax and Ansible playbooks.
+        Validates Zuul YAML (zuul.yaml, .zuul.yaml, zuul.d/, .zuul.d/) and Ansible playbooks.
+        Unchanged files reuse their stored result; playbooks are linted in parallel groups.
+        Returns one report with file, line and rule for every finding.
         """
-        return await (
+        if report_format not in ("markdown", "json"):
+            raise Exception(f"Invalid report format '{report_format}' (expected markdown or json)")
+        source = await prepare_source(source, "zuul")
+        ctr = self.base().with_mounted_directory("/src", source).with_workdir("/src")
+
+        # 1. Hash every file; the key also covers lint config, roles and tool versions
+        files, env_hash = parse_hashes(await ctr.with_exec(["sh", "-c", HASH_FILES_CMD]).stdout())
+        tool_versions = await self.base().with_exec(["sh", "-c", TOOL_VERSIONS_CMD]).stdout()
+        assign_keys(files, env_hash, tool_versions)
+
+        # 2. Stored results for unchanged files
+        results: dict[str, list[Finding]] = await self._cached_results([f.key for f in files]) if use_cache else {}
+        pending = [f for f in files if f.key not in results]
+        cached = len(files) - len(pending)
+        print(f"Zuul lint: {len(files)} files, {cached} cached, {len(pending)} to lint")
+
+        # 3. YAML pass over the pending Zuul configs, ansible-lint groups in parallel
+        fresh: dict[str, list[Finding]] = {}
+        extra: list[Finding] = []
+        configs = [f for f in pending if f.kind == "zuul"]
+        if configs:
+            output = await ctr.with_exec(["python3", "-c", YAML_CHECK_SCRIPT] + [f.path for f in configs]).stdout()
+            found = parse_yaml_findings(output)
+            for f in configs:
+                fresh[f.key] = [x for x in found if x.file == f.path]
+
+        semaphore = asyncio.Semaphore(max(1, max_parallel))
+
+        async def lint_group(group: list[LintFile]) -> None:
+            async with semaphore:
+                run = ctr.with_exec(
+                    ["ansible-lint", "-f", "codeclimate", "--offline", "--nocolor", "-q"] + [f.path for f in group],
+                    expect=ReturnType.ANY,
+                )
+                exit_code = await run.exit_code()
+                if exit_code not in (0, 2):
+                    raise Exception(f"ansible-lint failed (exit {exit_code}):\n{await run.stderr()}")
+                found = parse_ansible_lint(await run.stdout())
+            paths = {f.path for f in group}
+            outside = [x for x in found if x.file not in paths]
+            if outside:
+                # Findings in roles or included files: report them, but don't cache this group
+                extra.extend(found)
+                return
+            for f in group:
+                fresh[f.key] = [x for x in found if x.file == f.path]
+
+        playbooks = [f for f in pending if f.kind == "playbook"]
+        await asyncio.gather(*(lint_group(g) for g in group_playbooks(playbooks, max_parallel)))
+
+        if fresh and use_cache:
+            await self._store_results(fresh)
+        results.update(fresh)
+
+        # 4. Single report
+        findings = [x for f in files for x in results.get(f.key, [])] + extra
+        if report_format == "json":
+            report = json.dumps(report_dict(findings, len(files), cached), indent=2)
+        else:
+            report = report_markdown(findings, len(files), cached)
+        if fail_on_error and any(x.severity == "error" for x in findings):
+            raise Exception(report)
+        return report
+
+    @function
+    async def job_graph(
+        self,
+        source: Annotated[Directory, Doc("The directory containing zuul.d/"), Ignore(ZUUL_IGNORE)],
+        changed_files: Annotated[list[str], Doc("Changed file paths (e.g. from 'git diff --name-only'); empty skips the impact analysis")] = [],
+        project: Annotated[Optional[str], Doc("Restrict the impact analysis to one project stanza")] = None,
+        report_format: Annotated[str, Doc("Report format: markdown or json")] = "markdown",
+        fail_on_error: Annotated[bool, Doc("Raise on load errors or inheritance cycles")] = False
+    ) -> str:
+        """
+        Indexes all job, project and project-template definitions into an inheritance graph:
+        parent chains, cycles and undefined parents. With changed_files, reports which jobs
+        each pipeline would run based on the (inherited) files / irrelevant-files matchers.
+        """
+        if report_format not in ("markdown", "json"):
+            raise Exception(f"Invalid report format '{report_format}' (expected markdown or json)")
+        source = await prepare_source(source, "zuul")
+        config = (
             self.base()
             .with_mounted_directory("/src", source)
             .with_workdir("/src")
-            # We use python to validate YAML syntax first
-            .with_exec(["python3", "-c", "import yaml, glob; [yaml.safe_load(open(f)) for f in glob.glob('zuul.d/*.yaml')]"])
-            .with_exec(["ansible-lint", "playbooks/"])
-            .stdout()
-        )
\ No newline at end of file
+            .with_exec(["sh", "-c", f"python3 -c {shlex.quote(LOAD_CONFIG_SCRIPT)} > /tmp/config.jsonl"])
+            .file("/tmp/config.jsonl")
+        )
+
+        graph = JobGraph()
+        async for line in iter_lines(config):
+            graph.feed_line(line)
+
+        summary = graph.summary()
+        impact = graph.impact(changed_files, project) if changed_files else None
+        if report_format == "json":
+            report = json.dumps({**summary, "chains": {n: graph.chain(n) for n in graph.variants}, "impact": impact}, indent=2)
+        else:
+            jobs = {n for p in (impact or {}).get("pipelines", {}).values() for n in (*p["triggered"], *p["skipped"])}
+            report = graph_markdown(summary, impact, {n: graph.chain(n) for n in jobs})
+        if fail_on_error and (summary["cycles"] or summary["load_errors"]):
+            raise Exception(report)
+        return report
+
+    # --- Result cache ---
+
+    def _lint_cache(self) -> Container:
+        return (
+            dag.container()
+            .from_("alpine:latest")
+            .with_mounted_cache(LINT_CACHE_DIR, dag.cache_volume("zuul-lint-cache"))
+            # The volume changes outside the Dagger graph: never reuse an exec result
+            .with_env_variable("CACHE_BUSTER", str(time.time()))
+        )
+
+    async def _cached_results(self, keys: list[str]) -> dict[str, list[Finding]]:
+        """One lookup for every key; hits are touched so the LRU bound keeps them."""
+        if not keys:
+            return {}
+        hits = self._lint_cache().with_new_file("/tmp/keys.txt", "\n".join(keys) + "\n").with_exec(["sh", "-c", (
+            f"cd {LINT_CACHE_DIR} && while read -r k; do "
+            '[ -f "$k.json" ] && touch "$k.json" && printf "%s\\t%s\\n" "$k" "$(cat "$k.json")"; '
+            "done < /tmp/keys.txt > /tmp/hits.tsv; true"
+        )]).file("/tmp/hits.tsv")
+        results: dict[str, list[Finding]] = {}
+        async for line in iter_lines(hits):
+            key, _, payload = line.partition("\t")
+            if payload:
+                results[key] = [Finding(**item) for item in json.loads(payload)]
+        return results
+
+    async def _store_results(self, results: dict[str, list[Finding]]) -> None:
+        """Writes one entry per file and keeps only the LINT_CACHE_MAX_ENTRIES most recent."""
+        lines = [f"{key}\t{json.dumps([x.to_dict() for x in found])}" for key, found in results.items()]
+        await (
+            self._lint_cache()
+            .with_new_file("/tmp/results.tsv", "\n".join(lines) + "\n")
+            .with_exec(["sh", "-c", (
+                f"awk -F'\\t' -v dir={LINT_CACHE_DIR} 'NF == 2 {{ f = dir \"/\" $1 \".json\"; print $2 > f; close(f) }}' /tmp/results.tsv; "
+                f"cd {LINT_CACHE_DIR} && ls -1t | tail -n +{LINT_CACHE_MAX_ENTRIES + 1} | xargs -r rm -f"
+            )])
+            .sync()
+        )
@@ -0,0 +1,117 @@
+"""
+Filtros de upload para os argumentos `source` das actions.
+
+O CLI do Dagger aplica as anotações `Ignore(...)` antes de enviar o diretório
+para o engine, então os conjuntos abaixo evitam subir `bazel-*`,
+`node_modules`, `.terraform` etc. em toda chamada. Como essas anotações são
+estáticas, o `.gitignore`/`.bazelignore` de cada repo é aplicado depois, com
+`Directory.filter`, antes de montar o source nos containers.
+"""
+import time
+from typing import Iterable
+
+from dagger import Directory, dag
+
+# Lixo local que nenhuma action usa
+COMMON_IGNORE = [
+    "**/.DS_Store",
+    "**/node_modules",
+    "**/__pycache__",
+    "**/*.pyc",
+    "**/.venv",
+    "**/venv",
+    "**/.tox",
+    "**/.mypy_cache",
+    "**/.pytest_cache",
+    "**/.ruff_cache",
+    "**/.idea",
+    "**/.vscode",
+]
+
+# Symlinks de saída do Bazel; o .git só é necessário no `affected`
+BAZEL_IGNORE = COMMON_IGNORE + ["bazel-*", ".git"]
+BAZEL_GIT_IGNORE = COMMON_IGNORE + ["bazel-*"]
+
+# Providers baixados e estado local de plugins; o terraform init recria tudo
+TERRAFORM_IGNORE = COMMON_IGNORE + ["**/.terraform", "**/.terragrunt-cache", "**/crash.log", ".git"]
+
+PYTHON_IGNORE = COMMON_IGNORE + ["**/.eggs", "**/*.egg-info", "**/build", "**/dist", ".git"]
+ZUUL_IGNORE = COMMON_IGNORE + [".git"]
+
+# Funções baseadas apenas no histórico: sobe somente o .git
+GIT_ONLY = ["*", "!.git", "!.git/**"]
+
+# Arquivos que um .gitignore costuma listar mas que as actions de Terraform leem
+TERRAFORM_KEEP = ["**/*.tfvars", "**/*.tfvars.json", "**/.terraform.lock.hcl"]
+
+
+def gitignore_patterns(text: str) -> list[str]:
+    """Converte regras de .gitignore em padrões de `Directory.filter(exclude=...)`."""
+    patterns = []
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        negate = line.startswith("!")
+        line = line.lstrip("!").rstrip("/")
+        if not line:
+            continue
+        # Sem barra no meio a regra vale em qualquer nível; com barra é relativa à raiz
+        if line.startswith("/") or "/" in line:
+            pattern = line.lstrip("/")
+        else:
+            pattern = f"**/{line}"
+        patterns.append(("!" if negate else "") + pattern)
+    return patterns
+
+
+def bazelignore_patterns(text: str) -> list[str]:
+    """O .bazelignore lista um diretório (relativo à raiz) por linha."""
+    return [line.strip().strip("/") for line in text.splitlines() if line.strip() and not line.startswith("#")]
+
+
+# Uma chamada de função roda num processo próprio: estes caches valem por chamada
+_prepared: dict[tuple, Directory] = {}
+_reported: set[str] = set()
+
+
+async def prepare_source(
+    source: Directory,
+    label: str,
+    gitignore: bool = True,
+    bazelignore: bool = False,
+    keep: Iterable[str] = (),
+) -> Directory:
+    """
+    Aplica o .gitignore/.bazelignore da raiz do repo. Na primeira vez que um source
+    aparece na chamada, registra quantos arquivos e quanto espaço ele ocupa (o que
+    foi enviado pelo CLI). O tempo do upload em si só aparece no trace do `dagger call`,
+    porque acontece antes da função começar.
+    """
+    start = time.monotonic()
+    digest = await source.digest()
+    elapsed = time.monotonic() - start
+    key = (digest, gitignore, bazelignore, tuple(keep))
+    if key in _prepared:
+        return _prepared[key]
+
+    if digest not in _reported:
+        _reported.add(digest)
+        stats = await (
+            dag.container()
+            .from_("alpine:latest")
+            .with_mounted_directory("/src", source)
+            .with_exec(["sh", "-c", "echo $(find /src -type f | wc -l) $(du -sk /src | cut -f1)"])
+            .stdout()
+        )
+        files, size_kb = (stats.split() + ["0", "0"])[:2]
+        print(f"{label}: source recebido com {files} arquivos, {int(size_kb) / 1024:.1f} MiB (digest no engine em {elapsed:.1f}s)")
+
+    exclude: list[str] = []
+    if gitignore and await source.exists(".gitignore"):
+        exclude += gitignore_patterns(await source.file(".gitignore").contents())
+    if bazelignore and await source.exists(".bazelignore"):
+        exclude += bazelignore_patterns(await source.file(".bazelignore").contents())
+    prepared = source.filter(exclude=exclude + [f"!{p}" for p in keep]) if exclude else source
+    _prepared[key] = prepared
+    return prepared
@@ -0,0 +1,21 @@
+from typing import AsyncIterator
+
+from dagger import File
+
+
+async def iter_lines(file: File, chunk_lines: int = 10_000) -> AsyncIterator[str]:
+    """
+    Lê um File do Dagger em blocos de linhas, sem trazer o arquivo inteiro para a memória.
+
+    Cada bloco é buscado com `contents(offset_lines, limit_lines)`, então o host
+    mantém no máximo `chunk_lines` linhas por vez.
+    """
+    offset = 0
+    while True:
+        chunk = await file.contents(offset_lines=offset, limit_lines=chunk_lines)
+        lines = chunk.splitlines()
+        for line in lines:
+            yield line
+        if len(lines) < chunk_lines:
+            return
+        offset += chunk_lines
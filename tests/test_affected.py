@@ -0,0 +1,44 @@
+import os
+import subprocess
+
+from toolbox.actions.bazel.affected import CHANGED_FILES_CMD, classify_changes, parse_name_status
+
+
+def _git(repo, *args):
+    subprocess.run(["git", "-c", "user.name=t", "-c", "user.email=t@t", *args], cwd=repo, check=True, capture_output=True)
+
+
+def _write(repo, path, text):
+    full = os.path.join(repo, path)
+    os.makedirs(os.path.dirname(full), exist_ok=True)
+    with open(full, "w") as f:
+        f.write(text)
+
+
+def test_tracked_build_under_bazelignore_is_not_a_removal(tmp_path):
+    repo = str(tmp_path)
+    _git(repo, "init", "-q", "-b", "main")
+    _write(repo, ".bazelignore", "examples\n")
+    _write(repo, "examples/ws/BUILD", "")
+    _write(repo, "src/BUILD", "")
+    _write(repo, "src/lib.py", "a = 1\n")
+    _git(repo, "add", "-A")
+    _git(repo, "commit", "-q", "-m", "base")
+    _git(repo, "checkout", "-q", "-b", "feature")
+    _write(repo, "src/lib.py", "a = 2\n")
+    _git(repo, "commit", "-q", "-am", "change")
+
+    def changed_files():
+        diff = subprocess.run(["sh", "-c", CHANGED_FILES_CMD], cwd=repo, env={**os.environ, "BASE_REF": "main"},
+                              check=True, capture_output=True, text=True).stdout
+        return parse_name_status(diff)
+
+    # The unfiltered checkout (what _affected_targets diffs) keeps examples/ on disk
+    changed, deleted = changed_files()
+    assert changed == ["src/lib.py"] and not deleted
+    changes = classify_changes(changed, deleted, {"src"})
+    assert not changes.full_rebuild and changes.labels == {"//src:lib.py"}
+
+    # The .bazelignore-filtered tree would report the tracked BUILD as removed
+    os.remove(os.path.join(repo, "examples/ws/BUILD"))
+    assert classify_changes(*changed_files(), {"src"}).full_rebuild
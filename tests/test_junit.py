@@ -0,0 +1,23 @@
+import io
+import xml.etree.ElementTree as ET
+
+from toolbox.actions.bazel.junit import JUnitAggregator
+
+SUITE = """<testsuites><testsuite name="{name}">
+<testcase classname="pkg" name="ok" time="0.5"/>
+<testcase classname="pkg" name="bad" time="1"><failure message="boom"/></testcase>
+</testsuite></testsuites>"""
+
+
+def test_consolidated_junit_streams_suites():
+    aggregator = JUnitAggregator()
+    aggregator.feed_file("pkg/a_test/test.xml", io.BytesIO(SUITE.format(name="a").encode()))
+    aggregator.feed_file("pkg/b_test/shard_1_of_2/test.xml", io.BytesIO(SUITE.format(name="b").encode()))
+
+    out = io.StringIO()
+    aggregator.write_junit_xml(out)
+    aggregator.close()
+
+    root = ET.fromstring(out.getvalue())
+    assert root.get("tests") == "4" and root.get("failures") == "2"
+    assert [s.get("package") for s in root.iter("testsuite")] == ["//pkg:a_test", "//pkg:b_test"]
@@ -0,0 +1,45 @@
+import json
+
+from toolbox.actions.terraform.plan_analysis import SENSITIVE, PlanReport, attribute_diff
+
+
+def test_nested_sensitive_map_is_masked():
+    change = {
+        "actions": ["update"],
+        "before": {"data": {"PASSWORD": "old-secret"}, "metadata": [{"name": "app"}]},
+        "after": {"data": {"PASSWORD": "new-secret"}, "metadata": [{"name": "app2"}]},
+        "before_sensitive": {"data": True},
+        "after_sensitive": {"data": True, "metadata": [{"name": True}]},
+    }
+
+    diffs = {path: (old, new) for path, old, new in attribute_diff(change)}
+
+    assert diffs["data.PASSWORD"] == (SENSITIVE, SENSITIVE)
+    assert diffs["metadata.0.name"] == (SENSITIVE, SENSITIVE)
+
+    report = PlanReport()
+    report.feed_change({"address": "kubernetes_secret.app", "change": change})
+    rendered = report.to_markdown() + json.dumps(report.to_dict())
+    assert "old-secret" not in rendered and "new-secret" not in rendered
+    assert "app2" not in rendered
+
+
+def test_sensitive_value_below_flatten_depth_is_masked():
+    def deployment(secret):
+        return {"spec": [{"template": [{"spec": [{"container": [{"env": [{"name": "TOKEN", "value": secret}]}]}]}]}]}
+
+    change = {
+        "actions": ["update"],
+        "before": deployment("old-secret"),
+        "after": deployment("new-secret"),
+        "before_sensitive": {"spec": [{"template": [{"spec": [{"container": [{"env": [{"value": True}]}]}]}]}]},
+        "after_sensitive": {"spec": [{"template": [{"spec": [{"container": [{"env": [{"value": True}]}]}]}]}]},
+    }
+
+    diffs = attribute_diff(change)
+    assert diffs == [("spec.0.template.0", SENSITIVE, SENSITIVE)]
+
+    report = PlanReport()
+    report.feed_change({"address": "kubernetes_deployment.app", "change": change})
+    rendered = report.to_markdown() + json.dumps(report.to_dict())
+    assert "old-secret" not in rendered and "new-secret" not in rendered
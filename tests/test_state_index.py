@@ -0,0 +1,32 @@
+import json
+
+from toolbox.actions.terraform.plan_analysis import SENSITIVE
+from toolbox.actions.terraform.state_index import StateIndex, drift_markdown, state_drift
+
+
+def _index(password: str, serial: int) -> StateIndex:
+    instance = {
+        "module": None, "mode": "managed", "type": "aws_db_instance", "name": "main",
+        "provider": 'provider["registry.terraform.io/hashicorp/aws"]', "index_key": None,
+        "attributes": {"password": password, "engine": "postgres", "auth": [{"token": password}]},
+        "sensitive": [
+            [{"type": "get_attr", "value": "password"}],
+            [{"type": "get_attr", "value": "auth"}, {"type": "index", "value": {"value": 0, "type": "number"}}],
+        ],
+    }
+    return StateIndex().feed_lines([json.dumps({"lineage": "l", "serial": serial}), json.dumps(instance)])
+
+
+def test_drift_masks_sensitive_attributes():
+    before, after = _index("old-secret", 1), _index("new-secret", 2)
+
+    drift = state_drift(before, after)
+    [change] = drift["changed"]
+    assert {a["path"] for a in change["attributes"]} == {"password", "auth.0.token"}
+    assert all(a["before"] == a["after"] == SENSITIVE for a in change["attributes"])
+
+    rendered = drift_markdown(drift) + json.dumps(drift)
+    assert "old-secret" not in rendered and "new-secret" not in rendered
+
+    masked = after.records["aws_db_instance.main"].masked_attrs()
+    assert masked == {"password": SENSITIVE, "engine": "postgres", "auth": [SENSITIVE]}
@@ -0,0 +1,30 @@
+import json
+
+from toolbox.actions.zuul.graph import JobGraph
+
+
+def _line(kind: str, body, path: str = "zuul.d/jobs.yaml") -> str:
+    return json.dumps({"file": path, "type": kind, "body": body})
+
+
+def test_later_variant_matchers_win():
+    graph = JobGraph().feed_lines([
+        _line("job", {"name": "unit", "files": ["^docs/.*$"]}),
+        _line("job", {"name": "unit", "files": ["^src/.*$"]}),
+    ])
+
+    assert graph.effective_matchers("unit")[0] == ("^src/.*$",)
+    impact = graph.impact(["src/app.py"])
+    assert "unit" in impact["pipelines"]["(all jobs)"]["triggered"]
+
+
+def test_invalid_regex_is_a_load_error():
+    graph = JobGraph().feed_lines([
+        _line("job", {"name": "lint", "irrelevant-files": ["^docs/(.*$"]}),
+        _line("project", {"check": {"jobs": [{"lint": {"files": ["[unclosed"]}}]}}, "zuul.yaml"),
+    ])
+
+    messages = [e["message"] for e in graph.load_errors]
+    assert len(messages) == 2 and "'^docs/(.*$'" in messages[0] and "'[unclosed'" in messages[1]
+    impact = graph.impact(["docs/index.md"])
+    assert "lint" in impact["pipelines"]["check"]["triggered"]